@@ -0,0 +1,27 @@
+"""composite index for usage report aggregation
+
+Revision ID: 0011_usage_org_recorded_idx
+Revises: 0010_ab1_adl_fields
+Create Date: 2025-09-02
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0011_usage_org_recorded_idx"
+down_revision = "0010_ab1_adl_fields"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Usage reports filter by org and time range, then group by usage type
+    op.create_index(
+        "ix_usage_records_org_recorded_type",
+        "usage_records",
+        ["org_id", "recorded_at", "usage_type"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_usage_records_org_recorded_type", table_name="usage_records")
@@ -0,0 +1,44 @@
+"""unique provider event id on billing_events
+
+Revision ID: 0012_billing_events_ext_unique
+Revises: 0011_usage_org_recorded_idx
+Create Date: 2025-09-03
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0012_billing_events_ext_unique"
+down_revision = "0011_usage_org_recorded_idx"
+branch_labels = None
+depends_on = None
+
+# Redeliveries used to be logged as new rows; keep the oldest per event
+_DELETE_DUPLICATES = """
+    DELETE FROM billing_events
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY provider, external_event_id ORDER BY created_at, id
+            ) AS rn
+            FROM billing_events
+            WHERE external_event_id IS NOT NULL
+        ) ranked
+        WHERE rn > 1
+    )
+"""
+
+
+def upgrade() -> None:
+    # Lets batched audit-log inserts skip redelivered webhooks (ON CONFLICT DO NOTHING)
+    op.execute(_DELETE_DUPLICATES)
+    op.create_index(
+        "ix_billing_events_provider_external_id",
+        "billing_events",
+        ["provider", "external_event_id"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_billing_events_provider_external_id", table_name="billing_events")
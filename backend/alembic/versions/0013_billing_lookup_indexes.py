@@ -0,0 +1,71 @@
+"""billing lookup indexes for webhook and subscription queries
+
+Revision ID: 0013_billing_lookup_indexes
+Revises: 0012_billing_events_ext_unique
+Create Date: 2025-09-03
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0013_billing_lookup_indexes"
+down_revision = "0012_billing_events_ext_unique"
+branch_labels = None
+depends_on = None
+
+_ACTIVE_STATUSES = sa.text("status IN ('active', 'trialing')")
+
+# Each customer row paired with the oldest row for its provider + external ID
+_DUPLICATE_CUSTOMERS = sa.text(
+    "SELECT id, kept_id FROM ("
+    " SELECT id, FIRST_VALUE(id) OVER ("
+    "  PARTITION BY provider, external_customer_id ORDER BY created_at, id"
+    " ) AS kept_id FROM billing_customers"
+    ") ranked WHERE id <> kept_id"
+)
+
+
+def _merge_duplicate_customers() -> None:
+    """Point references at the oldest customer per external ID, drop the rest"""
+    conn = op.get_bind()
+    duplicates = [
+        {"id": row.id, "kept_id": row.kept_id}
+        for row in conn.execute(_DUPLICATE_CUSTOMERS)
+    ]
+    if not duplicates:
+        return
+    for table in ("billing_subscriptions", "billing_events"):
+        conn.execute(
+            sa.text(
+                f"UPDATE {table} SET customer_id = :kept_id WHERE customer_id = :id"
+            ),
+            duplicates,
+        )
+    conn.execute(sa.text("DELETE FROM billing_customers WHERE id = :id"), duplicates)
+
+
+def upgrade() -> None:
+    # Webhooks resolve customers by provider + external ID
+    _merge_duplicate_customers()
+    op.create_index(
+        "ix_billing_customers_provider_ext",
+        "billing_customers",
+        ["provider", "external_customer_id"],
+        unique=True,
+    )
+    # get_subscription_for_org only ever looks at live subscriptions
+    op.create_index(
+        "ix_billing_subscriptions_customer_active",
+        "billing_subscriptions",
+        ["customer_id"],
+        postgresql_where=_ACTIVE_STATUSES,
+        sqlite_where=_ACTIVE_STATUSES,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_billing_subscriptions_customer_active", table_name="billing_subscriptions"
+    )
+    op.drop_index("ix_billing_customers_provider_ext", table_name="billing_customers")
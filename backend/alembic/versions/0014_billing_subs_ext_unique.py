@@ -0,0 +1,53 @@
+"""unique external subscription id for upserts
+
+Revision ID: 0014_billing_subs_ext_unique
+Revises: 0013_billing_lookup_indexes
+Create Date: 2025-09-03
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0014_billing_subs_ext_unique"
+down_revision = "0013_billing_lookup_indexes"
+branch_labels = None
+depends_on = None
+
+# Racing created/updated webhooks could insert a row each; keep the oldest
+_DELETE_DUPLICATES = """
+    DELETE FROM billing_subscriptions
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY external_subscription_id ORDER BY created_at, id
+            ) AS rn
+            FROM billing_subscriptions
+        ) ranked
+        WHERE rn > 1
+    )
+"""
+
+
+def upgrade() -> None:
+    # ON CONFLICT (external_subscription_id) needs a unique index on the column
+    op.execute(_DELETE_DUPLICATES)
+    op.drop_index(
+        "ix_billing_subscriptions_external_id", table_name="billing_subscriptions"
+    )
+    op.create_index(
+        "ix_billing_subscriptions_external_id",
+        "billing_subscriptions",
+        ["external_subscription_id"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_billing_subscriptions_external_id", table_name="billing_subscriptions"
+    )
+    op.create_index(
+        "ix_billing_subscriptions_external_id",
+        "billing_subscriptions",
+        ["external_subscription_id"],
+    )
@@ -0,0 +1,26 @@
+"""payload hash on billing_subscriptions
+
+Revision ID: 0015_billing_subs_payload_hash
+Revises: 0014_billing_subs_ext_unique
+Create Date: 2025-09-04
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0015_billing_subs_payload_hash"
+down_revision = "0014_billing_subs_ext_unique"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Digest of the last applied provider payload; redeliveries skip the UPDATE
+    op.add_column(
+        "billing_subscriptions", sa.Column("payload_hash", sa.String(32), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("billing_subscriptions", "payload_hash")
@@ -0,0 +1,35 @@
+"""composite indexes for budget enforcement lookups
+
+Revision ID: 0016_budgets_active_lookup_idx
+Revises: 0015_billing_subs_payload_hash
+Create Date: 2025-09-04
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0016_budgets_active_lookup_idx"
+down_revision = "0015_billing_subs_payload_hash"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Checked before every metered call: equality columns first, then the
+    # period range
+    op.create_index(
+        "ix_budgets_active_lookup",
+        "budgets",
+        ["org_id", "agent_id", "status", "period_end", "period_start"],
+    )
+    # Budget violation listings filter by org and status, optionally agent
+    op.create_index(
+        "ix_budgets_org_status_agent",
+        "budgets",
+        ["org_id", "status", "agent_id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_budgets_org_status_agent", table_name="budgets")
+    op.drop_index("ix_budgets_active_lookup", table_name="budgets")
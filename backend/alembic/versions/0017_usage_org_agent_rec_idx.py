@@ -0,0 +1,29 @@
+"""composite index for per-agent usage summaries
+
+Revision ID: 0017_usage_org_agent_rec_idx
+Revises: 0016_budgets_active_lookup_idx
+Create Date: 2025-09-04
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0017_usage_org_agent_rec_idx"
+down_revision = "0016_budgets_active_lookup_idx"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Agent usage summaries add agent_id to the org + time range filter
+    op.create_index(
+        "ix_usage_records_org_agent_recorded_type",
+        "usage_records",
+        ["org_id", "agent_id", "recorded_at", "usage_type"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_usage_records_org_agent_recorded_type", table_name="usage_records"
+    )
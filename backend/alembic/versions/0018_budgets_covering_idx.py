@@ -0,0 +1,45 @@
+"""cover budget listing columns in the org/status/agent index
+
+Revision ID: 0018_budgets_covering_idx
+Revises: 0017_usage_org_agent_rec_idx
+Create Date: 2025-09-04
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0018_budgets_covering_idx"
+down_revision = "0017_usage_org_agent_rec_idx"
+branch_labels = None
+depends_on = None
+
+# Columns read by budget warning and enforcement snapshots; on Postgres they
+# are stored in the index leaf so those queries become index-only scans
+_INCLUDE = [
+    "id",
+    "period",
+    "limit_cents",
+    "current_usage_cents",
+    "enforcement_mode",
+    "period_start",
+    "period_end",
+]
+
+
+def upgrade() -> None:
+    op.drop_index("ix_budgets_org_status_agent", table_name="budgets")
+    op.create_index(
+        "ix_budgets_org_status_agent",
+        "budgets",
+        ["org_id", "status", "agent_id"],
+        postgresql_include=_INCLUDE,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_budgets_org_status_agent", table_name="budgets")
+    op.create_index(
+        "ix_budgets_org_status_agent",
+        "budgets",
+        ["org_id", "status", "agent_id"],
+    )
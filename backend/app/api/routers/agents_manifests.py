@@ -14,6 +14,7 @@ except Exception:  # pragma: no cover
 from app.api.deps import require_team
 from app.db.session import get_db
 from app.db import models
+from app.services.manifest_signing import MANIFEST_BATCH_ROOT_TYP
 
 router = APIRouter()
 
@@ -139,12 +140,15 @@ async def verify_agent_manifest(
             if not pem:
                 continue
             payload_json = _jws.verify(token, pem, algorithms=[_ALG.ES256])
+            data = json.loads(payload_json)
+            # Batch roots share the manifest key but are not manifests
+            if isinstance(data, dict) and data.get("typ") == MANIFEST_BATCH_ROOT_TYP:
+                raise HTTPException(
+                    status_code=400, detail="Batch root signatures are not manifests"
+                )
             # Optionally validate expected fields
             exp = payload.get("expect") or {}
             if exp:
-                import json as _json
-
-                data = _json.loads(payload_json)
                 for field, value in exp.items():
                     if data.get(field) != value:
                         raise HTTPException(
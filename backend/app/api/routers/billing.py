@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
@@ -7,6 +7,7 @@ from app.db.session import get_db
 from app.services.billing_orchestrator import BillingOrchestrator
 from app.services.payment.protocol import PaymentProviderError
 from app.api.deps import get_current_org_id
+from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
@@ -61,7 +62,9 @@ async def create_checkout_session(
 
 
 @router.post("/billing/webhooks")
-async def handle_billing_webhook(request: Request, use_async: bool = True):
+async def handle_billing_webhook(
+    request: Request, background_tasks: BackgroundTasks, use_async: bool = True
+):
     """
     Handle billing webhooks from payment providers.
 
@@ -77,7 +80,20 @@ async def handle_billing_webhook(request: Request, use_async: bool = True):
             or ""
         )
 
-        if use_async:
+        if use_async and settings.WEBHOOK_BATCH_VERIFY:
+            # Collect bursts in Redis and verify them together
+            from app.services.billing.async_webhook_service import (
+                queue_webhook_for_batch,
+            )
+
+            task_id = queue_webhook_for_batch(body, signature, "stripe")
+
+            return {
+                "status": "queued",
+                "task_id": task_id,
+                "message": "Webhook queued for batched processing",
+            }
+        elif use_async:
             # Queue for asynchronous processing with Celery
             from app.services.billing.async_webhook_service import (
                 queue_webhook_processing,
@@ -94,7 +110,9 @@ async def handle_billing_webhook(request: Request, use_async: bool = True):
             # Synchronous processing (fallback)
             db = next(get_db())
             billing_orchestrator = BillingOrchestrator(db)
-            success = await billing_orchestrator.process_webhook_event(body, signature)
+            success = await billing_orchestrator.process_webhook_event(
+                body, signature, background_tasks
+            )
 
             if success:
                 return {"status": "success"}
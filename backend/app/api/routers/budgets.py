@@ -12,7 +12,6 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 from app.db.session import get_db
-from app.db import models
 from app.services.budget_service import BudgetService, BudgetPeriod, EnforcementMode
 from app.services.usage_orchestrator import UsageOrchestrator
 from app.services.usage.cost_calculation_service import CostCalculationService
@@ -297,34 +296,7 @@ async def generate_usage_report(
         usage_orchestrator = UsageOrchestrator(db)
 
         # Generate comprehensive report
-        summary = usage_orchestrator.get_usage_summary(org_id, None, start, end)
-        budget_status = usage_orchestrator.get_budget_status(org_id)
-
-        # Get usage by agent
-        agents_query = db.query(models.Agent).filter(models.Agent.org_id == org_id)
-        agents = agents_query.all()
-
-        agent_usage = {}
-        for agent in agents:
-            agent_summary = usage_orchestrator.get_usage_summary(
-                org_id=org_id, agent_id=agent.id, period_start=start, period_end=end
-            )
-            if agent_summary["record_count"] > 0:
-                agent_usage[agent.id] = {
-                    "agent_name": agent.display_name,
-                    **agent_summary,
-                }
-
-        report = {
-            "org_id": org_id,
-            "period": {"start": start.isoformat(), "end": end.isoformat()},
-            "summary": summary,
-            "agent_usage": agent_usage,
-            "budget_status": budget_status,
-            "generated_at": datetime.utcnow().isoformat(),
-        }
-
-        return report
+        return usage_orchestrator.generate_usage_report(org_id, start, end)
 
     except HTTPException:
         raise
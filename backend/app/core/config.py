@@ -56,6 +56,13 @@ class Settings:
         "CELERY_RESULT_BACKEND", "redis://localhost:6379/0"
     )
 
+    # Webhook batching: collect bursts in Redis and verify them together
+    WEBHOOK_BATCH_VERIFY: bool = (
+        os.getenv("WEBHOOK_BATCH_VERIFY", "false").lower() == "true"
+    )
+    WEBHOOK_BATCH_MAX_SIZE: int = int(os.getenv("WEBHOOK_BATCH_MAX_SIZE", "256"))
+    WEBHOOK_BATCH_WINDOW_MS: int = int(os.getenv("WEBHOOK_BATCH_WINDOW_MS", "100"))
+
     # Notification Settings (Apprise)
     SMTP_SERVER: Optional[str] = os.getenv("SMTP_SERVER")
     SMTP_PORT: Optional[int] = (
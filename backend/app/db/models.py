@@ -1,4 +1,15 @@
-from sqlalchemy import Column, String, DateTime, Text, JSON, Integer, Float, ForeignKey
+from sqlalchemy import (
+    Column,
+    String,
+    DateTime,
+    Text,
+    JSON,
+    Integer,
+    Float,
+    ForeignKey,
+    Index,
+)
+from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.db.session import Base
@@ -177,14 +188,23 @@ class BillingCustomer(Base):
     """Internal customer representation - maps to external provider"""
 
     __tablename__ = "billing_customers"
+    # Also created by migration 0013; webhooks resolve customers through it
+    __table_args__ = (
+        Index(
+            "ix_billing_customers_provider_ext",
+            "provider",
+            "external_customer_id",
+            unique=True,
+        ),
+    )
 
-    id = Column(String(64), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(String(64), primary_key=True, default=lambda: uuid.uuid4().hex)
     org_id = Column(String(64), ForeignKey("orgs.id"), nullable=False)
     provider = Column(String(32), nullable=False)  # "stripe", "paypal", etc.
     external_customer_id = Column(String(255), nullable=False)  # Provider's customer ID
     email = Column(String(255), nullable=False)
     name = Column(String(255))
-    metadata_json = Column("metadata", JSON)
+    metadata_json = Column("metadata", MutableDict.as_mutable(JSON))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -193,15 +213,24 @@ class BillingSubscription(Base):
     """Internal subscription representation"""
 
     __tablename__ = "billing_subscriptions"
+    # Also created by migration 0014; the Postgres upsert conflicts on it
+    __table_args__ = (
+        Index(
+            "ix_billing_subscriptions_external_id",
+            "external_subscription_id",
+            unique=True,
+        ),
+    )
 
-    id = Column(String(64), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(String(64), primary_key=True, default=lambda: uuid.uuid4().hex)
     customer_id = Column(String(64), ForeignKey("billing_customers.id"), nullable=False)
     external_subscription_id = Column(String(255), nullable=False)
     plan_id = Column(String(64), nullable=False)
     status = Column(String(32), nullable=False)
     current_period_start = Column(DateTime(timezone=True))
     current_period_end = Column(DateTime(timezone=True))
-    metadata_json = Column("metadata", JSON)
+    metadata_json = Column("metadata", MutableDict.as_mutable(JSON))
+    payload_hash = Column(String(32))  # Last provider payload applied
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -210,8 +239,17 @@ class BillingEvent(Base):
     """Provider-agnostic billing events for audit trail"""
 
     __tablename__ = "billing_events"
+    # Also created by migration 0012; redelivered webhooks conflict on it
+    __table_args__ = (
+        Index(
+            "ix_billing_events_provider_external_id",
+            "provider",
+            "external_event_id",
+            unique=True,
+        ),
+    )
 
-    id = Column(String(64), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(String(64), primary_key=True, default=lambda: uuid.uuid4().hex)
     org_id = Column(String(64), ForeignKey("orgs.id"), nullable=False)
     customer_id = Column(String(64), ForeignKey("billing_customers.id"))
     event_type = Column(
@@ -220,7 +258,7 @@ class BillingEvent(Base):
     provider = Column(String(32), nullable=False)
     external_event_id = Column(String(255))  # Provider's event ID
     amount_cents = Column(Integer)
-    metadata_json = Column("metadata", JSON)
+    metadata_json = Column("metadata", MutableDict.as_mutable(JSON))
     processed_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -267,7 +305,8 @@ class UsageRecord(Base):
     cost_cents = Column(Integer, nullable=False)  # Cost in cents
     recorded_at = Column(DateTime(timezone=True), server_default=func.now())
     billing_period = Column(String(32), nullable=False)  # "2025-01" for monthly billing
-    metadata_json = Column("metadata", JSON)  # Additional usage metadata
+    # Additional usage metadata
+    metadata_json = Column("metadata", MutableDict.as_mutable(JSON))
 
 
 class CapabilityAssessment(Base):
@@ -6,6 +6,9 @@ import os
 
 DATABASE_URL = os.getenv("DATABASE_URL") or "sqlite:///./dev.db"
 
+# Room for every hot select() variant so repeat lookups skip SQL compilation
+QUERY_CACHE_SIZE = 1200
+
 
 class Base(DeclarativeBase):
     pass
@@ -19,15 +22,19 @@ if DATABASE_URL.startswith("sqlite"):
             DATABASE_URL,
             connect_args=connect_args,
             poolclass=StaticPool,
+            query_cache_size=QUERY_CACHE_SIZE,
         )
     else:
         engine = create_engine(
             DATABASE_URL,
             connect_args=connect_args,
             pool_pre_ping=True,
+            query_cache_size=QUERY_CACHE_SIZE,
         )
 else:
-    engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+    engine = create_engine(
+        DATABASE_URL, pool_pre_ping=True, query_cache_size=QUERY_CACHE_SIZE
+    )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -1,5 +1,8 @@
+import hashlib
 import os
-from typing import Any, Dict
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
 from fastapi import HTTPException
 
 try:
@@ -14,6 +17,123 @@ STACK_API_BASE = os.getenv("STACK_API_BASE", "https://api.stack-auth.com/api/v1"
 STACK_PROJECT_ID = os.getenv("STACK_PROJECT_ID", "")
 STACK_SECRET_SERVER_KEY = os.getenv("STACK_SECRET_SERVER_KEY", "")
 
+# Verify Stack-issued JWT access tokens in-process against the project JWKS
+# instead of calling /users/me on every request. Falls back to the remote
+# check when the token is not a JWT or the signature does not verify.
+STACK_AUTH_LOCAL_VERIFY = os.getenv("STACK_AUTH_LOCAL_VERIFY", "0") == "1"
+STACK_JWKS_TTL_SECONDS = int(os.getenv("STACK_JWKS_TTL_SECONDS", "3600"))
+# Stack Auth signs access tokens with ES256 (P-256 keys in the project JWKS);
+# EdDSA is not accepted because python-jose cannot verify it
+STACK_JWT_ALGORITHMS = ["ES256", "RS256"]
+
+_jwks_lock = threading.Lock()
+_jwks_cache: Optional[Dict[str, Any]] = None
+_jwks_fetched_at: float = 0.0
+
+# sha256 of the full token -> (exp, profile); keyed on the whole token so a
+# forged token can never reuse a verified token's entry
+_claims_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_CLAIMS_CACHE_MAX = 10_000
+
+
+def _jwks_url() -> str:
+    return f"{STACK_API_BASE}/projects/{STACK_PROJECT_ID}/.well-known/jwks.json"
+
+
+def get_stack_jwks(force_refresh: bool = False) -> Optional[Dict[str, Any]]:
+    """Return the cached Stack project JWKS, refreshing it once per TTL."""
+    global _jwks_cache, _jwks_fetched_at
+    now = time.monotonic()
+    if (
+        not force_refresh
+        and _jwks_cache is not None
+        and now - _jwks_fetched_at < STACK_JWKS_TTL_SECONDS
+    ):
+        return _jwks_cache
+
+    with _jwks_lock:
+        # Another thread may have refreshed while we waited for the lock
+        if (
+            not force_refresh
+            and _jwks_cache is not None
+            and time.monotonic() - _jwks_fetched_at < STACK_JWKS_TTL_SECONDS
+        ):
+            return _jwks_cache
+        try:
+            r = requests.get(_jwks_url(), timeout=10)
+            if r.status_code == 200:
+                data = r.json()
+                if isinstance(data, dict) and data.get("keys"):
+                    _jwks_cache = data
+                    _jwks_fetched_at = time.monotonic()
+        except Exception:
+            # Keep serving the previous key set (if any) on transient failures
+            pass
+    return _jwks_cache
+
+
+def _claims_to_profile(claims: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape JWT claims like the /users/me payload the callers expect."""
+    profile = dict(claims)
+    profile["id"] = claims.get("sub")
+    if claims.get("selected_team_id"):
+        profile["selectedTeamId"] = claims["selected_team_id"]
+    if claims.get("email") and "primary_email" not in profile:
+        profile["primary_email"] = claims["email"]
+    return profile
+
+
+def _verify_locally(access_token: str) -> Optional[Dict[str, Any]]:
+    """Verify a JWT access token against the project JWKS.
+
+    Returns the profile on success, or None when the caller should fall back
+    to the remote /users/me check (not a JWT, unknown key, bad signature).
+    """
+    if access_token.count(".") != 2:
+        return None
+
+    try:
+        from jose import jwt as jose_jwt
+        from jose.exceptions import JOSEError
+    except Exception:  # pragma: no cover - python-jose is a hard dependency
+        return None
+
+    cache_key = hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+    cached = _claims_cache.get(cache_key)
+    if cached is not None:
+        exp, profile = cached
+        if exp > time.time():
+            return profile
+        _claims_cache.pop(cache_key, None)
+
+    jwks = get_stack_jwks()
+    if not jwks:
+        return None
+
+    try:
+        claims = jose_jwt.decode(
+            access_token,
+            jwks,
+            algorithms=STACK_JWT_ALGORITHMS,
+            audience=STACK_PROJECT_ID,
+        )
+    except jose_jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Invalid or expired access token")
+    except JOSEError:
+        # Possibly a key rotation; let the remote check decide
+        return None
+
+    if not claims.get("sub"):
+        return None
+
+    profile = _claims_to_profile(claims)
+    exp = claims.get("exp")
+    if isinstance(exp, (int, float)):
+        if len(_claims_cache) >= _CLAIMS_CACHE_MAX:
+            _claims_cache.clear()
+        _claims_cache[cache_key] = (float(exp), profile)
+    return profile
+
 
 def verify_stack_access_token(access_token: str) -> Dict[str, Any]:
     if not STACK_PROJECT_ID or not STACK_SECRET_SERVER_KEY:
@@ -22,6 +142,11 @@ def verify_stack_access_token(access_token: str) -> Dict[str, Any]:
             detail="Stack Auth is not configured (missing project/server key)",
         )
 
+    if STACK_AUTH_LOCAL_VERIFY:
+        profile = _verify_locally(access_token)
+        if profile is not None:
+            return profile
+
     url = f"{STACK_API_BASE}/users/me"
     headers = {
         "x-stack-access-type": "server",
@@ -1,12 +1,28 @@
 from __future__ import annotations
 
-from typing import List, Dict, Any, Tuple
+from functools import lru_cache
+from typing import List, Dict, Any, Sequence, Tuple
 from pydantic import ValidationError
 
 from app.schemas.agent_blueprint import AgentBlueprintV1, InstructionsPack
 from app.services.capability_naming import capability_key
 from app.services.learning.tools.registry import ToolRegistry
 
+# Default actions per tool (MVP); tools not listed get "use"
+_DEFAULT_ACTIONS: Dict[str, Tuple[str, ...]] = {
+    "http": ("get", "post"),
+    "fs": ("read", "write"),
+    "graphql": ("query",),
+    "ws": ("connect",),
+    "search": ("query",),
+}
+_FALLBACK_ACTIONS: Tuple[str, ...] = ("use",)
+
+_DEVELOPER_PROMPT = "Follow safety policies and operate in mock mode by default."
+_DEFAULT_EXAMPLES: Tuple[Dict[str, Any], ...] = (
+    {"input": "hello", "output": {"echo": "hello"}},
+)
+
 
 def parse_brief_to_adl(agent_id: str, brief: str) -> AgentBlueprintV1:
     # Minimal heuristic v0: extract role from brief first phrase
@@ -18,7 +34,9 @@ def parse_brief_to_adl(agent_id: str, brief: str) -> AgentBlueprintV1:
     return bp
 
 
-def select_capability_kit(bp: AgentBlueprintV1) -> Tuple[List[str], List[str]]:
+@lru_cache(maxsize=1)
+def _default_capability_kit() -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    # Depends only on the default registry, not the blueprint, so build once
     registry = ToolRegistry()
     tool_names: List[str] = []
     cap_keys: List[str] = []
@@ -26,25 +44,27 @@ def select_capability_kit(bp: AgentBlueprintV1) -> Tuple[List[str], List[str]]:
     for t in registry.tools:
         name = getattr(t, "name", None) or t.__class__.__name__.replace("Tool", "").lower()
         tool_names.append(name)
-        # Default actions per tool (MVP)
-        default_actions = {
-            "http": ["get", "post"],
-            "fs": ["read", "write"],
-            "graphql": ["query"],
-            "ws": ["connect"],
-            "search": ["query"],
-        }.get(name, ["use"])  # fallback "use"
-        for act in default_actions:
+        for act in _DEFAULT_ACTIONS.get(name, _FALLBACK_ACTIONS):
             cap_keys.append(capability_key(name, act))
+    return tuple(tool_names), tuple(cap_keys)
+
+
+def select_capability_kit(bp: AgentBlueprintV1) -> Tuple[List[str], List[str]]:
+    tool_names, cap_keys = _default_capability_kit()
+    # Fresh lists so callers can't mutate the cached kit
+    return list(tool_names), list(cap_keys)
+
 
-    return tool_names, cap_keys
+@lru_cache(maxsize=128)
+def _system_prompt(role: str, tool_names: Tuple[str, ...]) -> str:
+    return f"You are a specialized {role} agent. Use tools: {', '.join(tool_names)}."
 
 
-def render_instructions(bp: AgentBlueprintV1, tool_names: List[str]) -> InstructionsPack:
-    system = f"You are a specialized {bp.role} agent. Use tools: {', '.join(tool_names)}."
-    developer = "Follow safety policies and operate in mock mode by default."
-    examples: List[Dict[str, Any]] = [{"input": "hello", "output": {"echo": "hello"}}]
-    return InstructionsPack(system=system, developer=developer, examples=examples)
+def render_instructions(bp: AgentBlueprintV1, tool_names: Sequence[str]) -> InstructionsPack:
+    system = _system_prompt(bp.role, tuple(tool_names))
+    return InstructionsPack(
+        system=system, developer=_DEVELOPER_PROMPT, examples=list(_DEFAULT_EXAMPLES)
+    )
 
 
 def produce_manifest(capability_keys: List[str]) -> Dict[str, Any]:
@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Union
 import os
 from app.services.http_client import get_http_client
 
@@ -9,7 +9,7 @@ API_BASE = os.getenv(
 
 async def invoke_agent_http(
     agent_id: str,
-    payload: Dict[str, Any],
+    payload: Union[Dict[str, Any], bytes, str],
     *,
     access_token: Optional[str] = None,
     team_id: Optional[str] = None,
@@ -17,6 +17,8 @@ async def invoke_agent_http(
     """Invoke another agent via HTTP using the shared AsyncClient.
 
     This enables cross-agent scenarios and reuses pooled connections.
+    A payload that is already JSON-encoded (bytes or str, e.g. a relayed
+    request body) is sent as-is instead of being decoded and re-encoded.
     """
     client = get_http_client()
     headers: Dict[str, str] = {"Content-Type": "application/json"}
@@ -26,6 +28,9 @@ async def invoke_agent_http(
         headers["X-Team-Id"] = team_id
 
     url = f"{API_BASE}/v1/agents/{agent_id}/invoke"
-    resp = await client.post(url, json=payload, headers=headers)
+    if isinstance(payload, (bytes, str)):
+        resp = await client.post(url, content=payload, headers=headers)
+    else:
+        resp = await client.post(url, json=payload, headers=headers)
     resp.raise_for_status()
     return resp.json()
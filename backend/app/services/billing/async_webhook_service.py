@@ -5,13 +5,29 @@ This service provides reliable, asynchronous webhook processing with
 automatic retries, failure handling, and monitoring.
 """
 
-from celery import Celery
-from typing import Dict, Any
+from celery import Celery, group
+from celery.signals import task_postrun, worker_process_init
+from sqlalchemy.orm import scoped_session
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import asyncio
+import base64
+import json
 import logging
+import uuid
 
+from app.services.billing.webhook_dedupe import (
+    claim_webhook_event,
+    finish_webhook_event,
+    get_redis,
+)
 from app.services.billing.webhook_service import WebhookService
 from app.services.billing_orchestrator import BillingOrchestrator
-from app.db.session import get_db
+from app.services.budget.budget_enforcement_service import BudgetEnforcementService
+from app.services.notifications.alert_service import AlertSeverity, alert_service
+from app.services.payment.factory import PaymentProviderFactory
+from app.services.usage_orchestrator import UsageOrchestrator
+from app.db.session import SessionLocal, engine
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -23,11 +39,20 @@ celery_app = Celery(
     backend=settings.CELERY_RESULT_BACKEND or "redis://localhost:6379/0",
 )
 
+# Dedicated queue for alert delivery, served by its own worker pool
+BUDGET_ALERT_QUEUE = "budget-alerts"
+
 # Celery configuration
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    # msgpack is smaller and faster to decode than JSON; JSON stays accepted
+    # so messages published before the switch still drain
+    task_serializer="msgpack",
+    accept_content=["msgpack", "json"],
+    result_serializer="msgpack",
+    result_accept_content=["msgpack", "json"],
+    # Reports and event payloads can be large; compress them with zstandard
+    task_compression="zstd",
+    result_compression="zstd",
     timezone="UTC",
     enable_utc=True,
     task_track_started=True,
@@ -35,42 +60,155 @@ celery_app.conf.update(
     task_soft_time_limit=240,  # 4 minutes soft limit
     worker_prefetch_multiplier=1,
     task_acks_late=True,
+    # Re-queue (rather than drop) tasks whose worker died mid-execution
+    task_reject_on_worker_lost=True,
+    # With acks_late, Redis re-delivers any unacked message (including
+    # countdown/ETA retries) after the visibility timeout. Keep it well above
+    # the longest retry delay so a scheduled retry is not also re-delivered.
+    broker_transport_options={"visibility_timeout": 3600},
     worker_disable_rate_limits=False,
     task_default_retry_delay=60,  # 1 minute default retry delay
     task_max_retries=3,
+    # Budget alerts do slow network I/O (Apprise); keep them on their own
+    # queue so a scan burst cannot starve webhook processing
+    task_routes={"billing.send_budget_alert": {"queue": BUDGET_ALERT_QUEUE}},
+    # Celery beat schedule for periodic tasks
+    beat_schedule={
+        "check-budget-violations": {
+            "task": "billing.check_budget_violations",
+            "schedule": 900.0,  # Every 15 minutes
+        },
+        "generate-monthly-reports": {
+            "task": "billing.generate_monthly_reports",
+            "schedule": 86400.0,  # Daily
+        },
+    },
 )
 
+# Upper bound for a single retry countdown; must stay below visibility_timeout
+MAX_RETRY_COUNTDOWN_SECONDS = 240
+
+# Redis list holding webhooks waiting for batched verification
+WEBHOOK_BATCH_QUEUE_KEY = "billing:webhooks:pending"
+# Set while a drain of the list is scheduled, so a burst schedules one task
+WEBHOOK_BATCH_SCHEDULED_KEY = "billing:webhooks:drain_scheduled"
+# Raw payloads are parked in Redis under "wh:<uuid>"; only the key goes
+# through the broker. Kept for an hour so retries can still read it.
+WEBHOOK_PAYLOAD_KEY_PREFIX = "wh:"
+WEBHOOK_PAYLOAD_TTL_SECONDS = 3600
+# Payloads that failed every retry move here with no expiry, for replay
+WEBHOOK_DEAD_LETTER_KEY_PREFIX = "wh:dead:"
+
+# Session reused by every task a worker thread runs; removed (rolled back and
+# returned to the pool) after each task instead of built and torn down per call
+WorkerSession = scoped_session(SessionLocal)
+
+
+@worker_process_init.connect
+def _init_worker_db(**kwargs) -> None:
+    # Pooled connections inherited from the parent must not be shared after fork
+    engine.dispose(close=False)
+    WorkerSession.remove()
+
+
+@task_postrun.connect
+def _release_worker_db(**kwargs) -> None:
+    WorkerSession.remove()
+
+
+def _store_webhook_payload(payload: bytes) -> str:
+    """Park a raw webhook payload in Redis and return its key"""
+    key = f"{WEBHOOK_PAYLOAD_KEY_PREFIX}{uuid.uuid4().hex}"
+    get_redis().setex(key, WEBHOOK_PAYLOAD_TTL_SECONDS, payload)
+    return key
+
+
+def _load_webhook_payload(payload_key: str) -> bytes:
+    """Fetch a parked webhook payload (accepts legacy base64 task args)"""
+    if not payload_key.startswith(WEBHOOK_PAYLOAD_KEY_PREFIX):
+        # Tasks queued before payloads moved to Redis carry base64 inline
+        return base64.b64decode(payload_key.encode())
+
+    payload = get_redis().get(payload_key)
+    if payload is None:
+        raise Exception(f"Webhook payload {payload_key} expired or missing")
+    return payload
+
+
+def _discard_webhook_payload(payload_key: str) -> None:
+    if payload_key.startswith(WEBHOOK_PAYLOAD_KEY_PREFIX):
+        try:
+            get_redis().delete(payload_key)
+        except Exception as exc:
+            logger.warning(f"Failed to delete webhook payload {payload_key}: {exc}")
+
+
+def _dead_letter_webhook_payload(payload_key: str) -> str:
+    """Keep a permanently failed payload without expiry and return its key"""
+    if not payload_key.startswith(WEBHOOK_PAYLOAD_KEY_PREFIX):
+        # Legacy base64 task args carry the payload itself
+        return payload_key
+
+    dead_key = WEBHOOK_DEAD_LETTER_KEY_PREFIX + payload_key.rsplit(":", 1)[-1]
+    try:
+        pipe = get_redis().pipeline()
+        pipe.rename(payload_key, dead_key)
+        pipe.persist(dead_key)
+        pipe.execute()
+    except Exception as exc:
+        logger.error(f"Failed to dead-letter webhook payload {payload_key}: {exc}")
+        return payload_key
+    return dead_key
+
 
 @celery_app.task(bind=True, name="billing.process_webhook")
 def process_webhook_async(
-    self, payload_b64: str, signature: str, provider: str = "stripe"
+    self, payload_key: str, signature: str, provider: str = "stripe"
 ) -> Dict[str, Any]:
     """
     Process webhook asynchronously with automatic retries.
 
     Args:
-        payload_b64: Base64 encoded webhook payload
+        payload_key: Redis key holding the raw webhook payload
         signature: Webhook signature for verification
         provider: Payment provider name
 
     Returns:
         Dictionary with processing results
     """
-    import base64
-
+    event_id = None
     try:
-        # Decode payload
-        payload = base64.b64decode(payload_b64.encode())
+        # Fetch payload
+        payload = _load_webhook_payload(payload_key)
 
         # Get database session
-        db = next(get_db())
+        db = WorkerSession()
+        webhook_service = WebhookService(db, None)  # Will use default provider
+
+        # Verify before claiming so unsigned payloads can't claim event IDs
+        event = webhook_service.verify_webhook(payload, signature)
+        if event is None:
+            raise Exception("Webhook verification failed")
+
+        # Skip events another delivery or retry has already handled
+        if not claim_webhook_event(event.id):
+            logger.info(f"Skipping duplicate webhook event {event.id}")
+            _discard_webhook_payload(payload_key)
+            return {
+                "status": "duplicate",
+                "event_id": event.id,
+                "provider": provider,
+                "task_id": self.request.id,
+            }
+        event_id = event.id
 
         # Process webhook
-        webhook_service = WebhookService(db, None)  # Will use default provider
-        success = webhook_service.process_webhook(payload, signature)
+        success = asyncio.run(webhook_service.process_verified_event(event))
 
         if success:
             logger.info(f"Successfully processed webhook from {provider}")
+            finish_webhook_event(event_id, processed=True)
+            _discard_webhook_payload(payload_key)
             return {
                 "status": "success",
                 "provider": provider,
@@ -84,9 +222,12 @@ def process_webhook_async(
         logger.error(
             f"Webhook processing failed (attempt {self.request.retries + 1}): {exc}"
         )
+        # Let the retry (or a later redelivery) claim the event again
+        if event_id:
+            finish_webhook_event(event_id, processed=False)
 
-        # Exponential backoff: 1min, 2min, 4min
-        countdown = 60 * (2**self.request.retries)
+        # Exponential backoff: 1min, 2min, 4min (capped)
+        countdown = min(MAX_RETRY_COUNTDOWN_SECONDS, 60 * (2**self.request.retries))
 
         if self.request.retries < self.max_retries:
             logger.info(f"Retrying webhook processing in {countdown} seconds")
@@ -99,9 +240,9 @@ def process_webhook_async(
 
             # Store failed webhook for manual processing
             try:
-                db = next(get_db())
+                db = WorkerSession()
                 failed_webhook = {
-                    "payload_b64": payload_b64,
+                    "payload_key": _dead_letter_webhook_payload(payload_key),
                     "signature": signature,
                     "provider": provider,
                     "error": str(exc),
@@ -138,7 +279,7 @@ def process_subscription_event_async(
         Processing results
     """
     try:
-        db = next(get_db())
+        db = WorkerSession()
         BillingOrchestrator(db)
 
         event_type = event_data.get("type")
@@ -172,7 +313,7 @@ def process_subscription_event_async(
         logger.error(f"Subscription event processing failed: {exc}")
 
         if self.request.retries < 2:  # Fewer retries for event processing
-            countdown = 30 * (2**self.request.retries)
+            countdown = min(MAX_RETRY_COUNTDOWN_SECONDS, 30 * (2**self.request.retries))
             raise self.retry(exc=exc, countdown=countdown)
 
         return {
@@ -196,10 +337,7 @@ def generate_monthly_usage_report_async(org_id: str, month: str) -> Dict[str, An
         Usage report data
     """
     try:
-        from app.services.usage_orchestrator import UsageOrchestrator
-        from datetime import datetime
-
-        db = next(get_db())
+        db = WorkerSession()
         usage_orchestrator = UsageOrchestrator(db)
 
         # Parse month
@@ -240,22 +378,24 @@ def send_budget_alert_async(
         Alert sending results
     """
     try:
-        from app.services.notifications.alert_service import alert_service
-        from app.services.notifications.alert_service import AlertSeverity
-        from datetime import datetime
-
         success = False
 
         if alert_type == "violation":
             # Handle single violation or list of violations
             violations = alert_data if isinstance(alert_data, list) else [alert_data]
-            success = alert_service.send_budget_violation_alert(
-                org_id=org_id, violations=violations, severity=AlertSeverity.CRITICAL
+            success = asyncio.run(
+                alert_service.send_budget_violation_alert(
+                    org_id=org_id,
+                    violations=violations,
+                    severity=AlertSeverity.CRITICAL,
+                )
             )
         elif alert_type == "warning":
             warnings = alert_data.get("warnings", [])
-            success = alert_service.send_budget_warning_alert(
-                org_id=org_id, warnings=warnings, severity=AlertSeverity.WARNING
+            success = asyncio.run(
+                alert_service.send_budget_warning_alert(
+                    org_id=org_id, warnings=warnings, severity=AlertSeverity.WARNING
+                )
             )
 
         if success:
@@ -280,62 +420,222 @@ def send_budget_alert_async(
         }
 
 
-# Celery beat schedule for periodic tasks
-celery_app.conf.beat_schedule = {
-    "check-budget-violations": {
-        "task": "billing.check_budget_violations",
-        "schedule": 900.0,  # Every 15 minutes
-    },
-    "generate-monthly-reports": {
-        "task": "billing.generate_monthly_reports",
-        "schedule": 86400.0,  # Daily
-    },
-}
-
-
 @celery_app.task(name="billing.check_budget_violations")
 def check_budget_violations_async():
     """Periodic task to check for budget violations"""
     try:
-        from app.services.budget.budget_enforcement_service import (
-            BudgetEnforcementService,
-        )
-        from app.db import models
-
-        db = next(get_db())
+        db = WorkerSession()
         budget_enforcement = BudgetEnforcementService(db)
 
-        # Get all active organizations
-        orgs = db.query(models.Org).filter(models.Org.status == "active").all()
-
-        for org in orgs:
-            violations = budget_enforcement.get_budget_violations(org.id)
-            warnings = budget_enforcement.get_budget_warnings(org.id, threshold=0.8)
+        # One query each across all organizations instead of two per org
+        violations_by_org = budget_enforcement.get_all_budget_violations()
+        warnings_by_org = budget_enforcement.get_all_budget_warnings(
+            warning_threshold=0.8
+        )
 
-            if violations:
-                # Send violation alerts
-                for violation in violations:
-                    send_budget_alert_async.delay(
-                        org.id,
-                        "violation",
+        alerts = []
+        for org_id, violations in violations_by_org.items():
+            alerts.append(
+                send_budget_alert_async.s(
+                    org_id,
+                    "violation",
+                    [
                         {
                             "budget_id": violation.id,
+                            "budget_name": (
+                                f"{'Agent' if violation.agent_id else 'Organization'} "
+                                f"{violation.period} budget"
+                            ),
+                            "agent_id": violation.agent_id,
                             "limit_cents": violation.limit_cents,
                             "current_usage_cents": violation.current_usage_cents,
+                            "utilization_percent": (
+                                violation.current_usage_cents
+                                / violation.limit_cents
+                                * 100
+                                if violation.limit_cents > 0
+                                else 0
+                            ),
                             "enforcement_mode": violation.enforcement_mode,
-                        },
-                    )
+                            "period_end": (
+                                violation.period_end.isoformat()
+                                if violation.period_end
+                                else None
+                            ),
+                        }
+                        for violation in violations
+                    ],
+                )
+            )
+        for org_id, warnings in warnings_by_org.items():
+            alerts.append(
+                send_budget_alert_async.s(org_id, "warning", {"warnings": warnings})
+            )
 
-            if warnings:
-                # Send warning alerts
-                send_budget_alert_async.delay(org.id, "warning", {"warnings": warnings})
+        # One alert task per org, published together so the budget-alerts
+        # workers deliver them in parallel
+        if alerts:
+            group(alerts).apply_async()
 
-        logger.info(f"Checked budget violations for {len(orgs)} organizations")
+        org_count = len(set(violations_by_org) | set(warnings_by_org))
+        logger.info(
+            f"Checked budget violations: queued {len(alerts)} alerts for {org_count} organizations"
+        )
 
     except Exception as exc:
         logger.error(f"Failed to check budget violations: {exc}")
 
 
+@celery_app.task(name="billing.verify_webhook_batch")
+def verify_webhook_batch_async() -> Dict[str, Any]:
+    """
+    Drain pending webhooks from Redis and verify them as a batch.
+
+    Items are grouped by provider so per-secret verification setup is shared
+    across the burst. Verified events are processed in-line; events whose
+    processing fails are handed to billing.process_webhook for retries.
+
+    Returns:
+        Counts of verified, rejected, duplicate and processed webhooks
+    """
+    r = get_redis()
+    batch_size = settings.WEBHOOK_BATCH_MAX_SIZE
+
+    # Clear the flag before draining so anything pushed after this point
+    # schedules a fresh drain instead of being stranded
+    r.delete(WEBHOOK_BATCH_SCHEDULED_KEY)
+    pipe = r.pipeline()
+    pipe.lrange(WEBHOOK_BATCH_QUEUE_KEY, 0, batch_size - 1)
+    pipe.ltrim(WEBHOOK_BATCH_QUEUE_KEY, batch_size, -1)
+    raw_items, _ = pipe.execute()
+
+    if r.llen(WEBHOOK_BATCH_QUEUE_KEY):
+        _schedule_batch_drain(r)
+
+    items_raw = []
+    for raw in raw_items:
+        try:
+            items_raw.append(json.loads(raw))
+        except Exception as exc:
+            logger.error(f"Dropping malformed queued webhook: {exc}")
+
+    # Fetch all parked payloads in one round-trip
+    payloads = r.mget([item["payload_key"] for item in items_raw]) if items_raw else []
+
+    by_provider: Dict[str, List[Dict[str, Any]]] = {}
+    for item, payload in zip(items_raw, payloads):
+        if payload is None:
+            logger.error(f"Webhook payload {item['payload_key']} expired or missing")
+            continue
+        item["payload"] = payload
+        by_provider.setdefault(item.get("provider", "stripe"), []).append(item)
+
+    verified = rejected = processed = duplicates = 0
+    db = WorkerSession()
+    try:
+        for provider_name, items in by_provider.items():
+            try:
+                provider = PaymentProviderFactory.create_provider(provider_name)
+            except Exception:
+                provider = None
+            webhook_service = WebhookService(db, provider)
+
+            events = webhook_service.verify_webhooks(
+                [(item["payload"], item["signature"]) for item in items]
+            )
+
+            async def _process_all(pairs):
+                return [
+                    await webhook_service.process_verified_event(event)
+                    for _, event in pairs
+                ]
+
+            valid = [(item, event) for item, event in zip(items, events) if event]
+            rejected += len(items) - len(valid)
+            verified += len(valid)
+
+            # Rejected payloads are dropped; failed ones stay for the retry task
+            done_keys = [
+                item["payload_key"] for item, event in zip(items, events) if not event
+            ]
+            # Redeliveries of events that were already handled are dropped too
+            fresh = []
+            for item, event in valid:
+                if claim_webhook_event(event.id):
+                    fresh.append((item, event))
+                else:
+                    duplicates += 1
+                    done_keys.append(item["payload_key"])
+
+            results = asyncio.run(_process_all(fresh)) if fresh else []
+            for (item, event), ok in zip(fresh, results):
+                finish_webhook_event(event.id, processed=ok)
+                if ok:
+                    processed += 1
+                    done_keys.append(item["payload_key"])
+                else:
+                    process_webhook_async.delay(
+                        item["payload_key"], item["signature"], provider_name
+                    )
+            if done_keys:
+                r.delete(*done_keys)
+    finally:
+        WorkerSession.remove()
+
+    logger.info(
+        f"Batch-verified {verified} webhooks ({rejected} rejected, "
+        f"{duplicates} duplicate, {processed} processed)"
+    )
+    return {
+        "status": "success",
+        "verified": verified,
+        "rejected": rejected,
+        "duplicates": duplicates,
+        "processed": processed,
+    }
+
+
+def _schedule_batch_drain(r) -> Optional[str]:
+    """Schedule a drain of the pending list unless one is already scheduled"""
+    window_ms = settings.WEBHOOK_BATCH_WINDOW_MS
+    # Expire the flag well after the window in case the drain task is lost
+    if r.set(WEBHOOK_BATCH_SCHEDULED_KEY, 1, nx=True, px=window_ms * 50):
+        task = verify_webhook_batch_async.apply_async(countdown=window_ms / 1000.0)
+        return task.id
+    return None
+
+
+def queue_webhook_for_batch(
+    payload: bytes, signature: str, provider: str = "stripe"
+) -> Optional[str]:
+    """
+    Queue a webhook for batched verification.
+
+    Webhooks arriving within WEBHOOK_BATCH_WINDOW_MS of each other are
+    verified by a single billing.verify_webhook_batch run.
+
+    Args:
+        payload: Raw webhook payload
+        signature: Webhook signature
+        provider: Payment provider name
+
+    Returns:
+        Task ID of the drain task if this call scheduled one, else None
+    """
+    r = get_redis()
+    r.rpush(
+        WEBHOOK_BATCH_QUEUE_KEY,
+        json.dumps(
+            {
+                "payload_key": _store_webhook_payload(payload),
+                "signature": signature,
+                "provider": provider,
+            }
+        ),
+    )
+    return _schedule_batch_drain(r)
+
+
 # Helper function to start webhook processing
 def queue_webhook_processing(
     payload: bytes, signature: str, provider: str = "stripe"
@@ -351,13 +651,11 @@ def queue_webhook_processing(
     Returns:
         Task ID for tracking
     """
-    import base64
-
-    # Encode payload for JSON serialization
-    payload_b64 = base64.b64encode(payload).decode()
+    # Park the raw bytes in Redis; only the key travels through the broker
+    payload_key = _store_webhook_payload(payload)
 
     # Queue the task
-    task = process_webhook_async.delay(payload_b64, signature, provider)
+    task = process_webhook_async.delay(payload_key, signature, provider)
 
     logger.info(f"Queued webhook processing task: {task.id}")
     return task.id
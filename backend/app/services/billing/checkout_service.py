@@ -26,7 +26,7 @@ class CheckoutService:
     def __init__(self, db: Session, payment_provider: Optional[PaymentProvider] = None):
         self.db = db
         self.payment_provider = payment_provider or get_payment_provider()
-        self.customer_service = CustomerService(db, payment_provider)
+        self.customer_service = CustomerService(db, self.payment_provider)
 
     async def create_checkout_session(
         self,
@@ -81,6 +81,50 @@ class CheckoutService:
             )
             raise
 
+    async def create_checkout_session_for_new_customer(
+        self,
+        org_id: str,
+        email: str,
+        plan_id: str,
+        success_url: str,
+        cancel_url: str,
+    ) -> CheckoutSession:
+        """
+        Create a signup checkout for an org that has no billing customer yet.
+
+        The local BillingCustomer is recorded from the checkout.session.completed
+        webhook, so nothing is written here.
+
+        Args:
+            org_id: Organization ID
+            email: Billing email for the new customer
+            plan_id: Plan/price ID from payment provider
+            success_url: URL to redirect on success
+            cancel_url: URL to redirect on cancel
+
+        Returns:
+            CheckoutSession with URL for customer to complete payment
+        """
+        try:
+            checkout_session = (
+                await self.payment_provider.create_checkout_session_for_new_customer(
+                    email=email,
+                    plan_id=plan_id,
+                    success_url=success_url,
+                    cancel_url=cancel_url,
+                    metadata={"org_id": org_id, "plan_id": plan_id},
+                )
+            )
+
+            logger.info(
+                f"Created signup checkout for org {org_id}: {checkout_session.id}"
+            )
+            return checkout_session
+
+        except PaymentProviderError as e:
+            logger.error(f"Failed to create signup checkout for org {org_id}: {e}")
+            raise
+
     async def create_plan_change_checkout(
         self, org_id: str, new_plan_id: str, success_url: str, cancel_url: str
     ) -> CheckoutSession:
@@ -5,17 +5,85 @@ This service handles all customer-related operations including creation,
 retrieval, and updates across different payment providers.
 """
 
-from typing import Optional
-from sqlalchemy.orm import Session
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from sqlalchemy import Row, and_, select
+from sqlalchemy.orm import Session, load_only
 
 from app.services.payment.factory import get_payment_provider
 from app.services.payment.protocol import PaymentProvider, PaymentProviderError
 from app.db import models
 import logging
+import threading
+import time
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# (provider, external_customer_id) -> BillingCustomer.id, so repeat webhooks
+# for the same customer load the row by primary key instead of a WHERE scan
+EXTERNAL_ID_CACHE_TTL_SECONDS = 60
+EXTERNAL_ID_CACHE_MAX_SIZE = 4096
+
+_external_id_cache: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+_external_id_cache_lock = threading.Lock()
+
+# External IDs with no local customer (other deployments, test-mode noise).
+# Kept briefly so bursts of such webhooks don't each cost a SELECT; creating
+# the customer here clears the entry, other workers wait out the TTL.
+MISSING_EXTERNAL_ID_TTL_SECONDS = 30
+
+_missing_external_ids: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+
+
+def _get_cached_customer_id(key: Tuple[str, str]) -> Optional[str]:
+    with _external_id_cache_lock:
+        entry = _external_id_cache.get(key)
+        if entry is None:
+            return None
+        customer_id, expires_at = entry
+        if expires_at < time.monotonic():
+            del _external_id_cache[key]
+            return None
+        _external_id_cache.move_to_end(key)
+        return customer_id
+
+
+def _cache_customer_id(key: Tuple[str, str], customer_id: str) -> None:
+    with _external_id_cache_lock:
+        _external_id_cache[key] = (
+            customer_id,
+            time.monotonic() + EXTERNAL_ID_CACHE_TTL_SECONDS,
+        )
+        _external_id_cache.move_to_end(key)
+        while len(_external_id_cache) > EXTERNAL_ID_CACHE_MAX_SIZE:
+            _external_id_cache.popitem(last=False)
+
+
+def _evict_customer_id(key: Tuple[str, str]) -> None:
+    with _external_id_cache_lock:
+        _external_id_cache.pop(key, None)
+        _missing_external_ids.pop(key, None)
+
+
+def _is_known_missing(key: Tuple[str, str]) -> bool:
+    with _external_id_cache_lock:
+        expires_at = _missing_external_ids.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del _missing_external_ids[key]
+            return False
+        return True
+
+
+def _remember_missing(key: Tuple[str, str]) -> None:
+    with _external_id_cache_lock:
+        _missing_external_ids[key] = time.monotonic() + MISSING_EXTERNAL_ID_TTL_SECONDS
+        _missing_external_ids.move_to_end(key)
+        while len(_missing_external_ids) > EXTERNAL_ID_CACHE_MAX_SIZE:
+            _missing_external_ids.popitem(last=False)
+
 
 class CustomerService:
     """Service for managing billing customers"""
@@ -23,6 +91,10 @@ class CustomerService:
     def __init__(self, db: Session, payment_provider: Optional[PaymentProvider] = None):
         self.db = db
         self.payment_provider = payment_provider or get_payment_provider()
+        self._provider_name = self.payment_provider.get_provider_name()
+        # org_id -> BillingCustomer for the lifetime of this (request-scoped)
+        # service; rows are session-bound, so this never outlives the session
+        self._customer_by_org: Dict[str, models.BillingCustomer] = {}
 
     async def create_customer_for_org(
         self, org_id: str, email: str, name: Optional[str] = None
@@ -46,9 +118,9 @@ class CustomerService:
 
             # Create internal billing customer record
             billing_customer = models.BillingCustomer(
-                id=str(uuid.uuid4()),
+                id=uuid.uuid4().hex,
                 org_id=org_id,
-                provider=self.payment_provider.get_provider_name(),
+                provider=self._provider_name,
                 external_customer_id=provider_customer.id,
                 email=email,
                 name=name,
@@ -56,20 +128,24 @@ class CustomerService:
             )
 
             self.db.add(billing_customer)
-            self.db.commit()
-            self.db.refresh(billing_customer)
 
             # Update org with customer reference (for backward compatibility)
-            org = self.db.query(models.Org).filter(models.Org.id == org_id).first()
-            if org and self.payment_provider.get_provider_name() == "stripe":
-                try:
-                    org.stripe_customer_id = provider_customer.id
-                    self.db.commit()
-                except Exception:
-                    pass
+            if self._provider_name == "stripe":
+                org = self.db.get(models.Org, org_id)
+                if org:
+                    try:
+                        org.stripe_customer_id = provider_customer.id
+                    except Exception:
+                        pass
+
+            # Customer row and org back-reference land in one transaction
+            self.db.commit()
+            self.db.refresh(billing_customer)
+            _evict_customer_id(self._cache_key(provider_customer.id))
+            self._customer_by_org[org_id] = billing_customer
 
             logger.info(
-                f"Created billing customer for org {org_id} with provider {self.payment_provider.get_provider_name()}"
+                f"Created billing customer for org {org_id} with provider {self._provider_name}"
             )
             return billing_customer
 
@@ -82,35 +158,198 @@ class CustomerService:
             self.db.rollback()
             raise
 
+    async def record_customer_for_org(
+        self,
+        org_id: str,
+        external_customer_id: str,
+        email: str,
+        name: Optional[str] = None,
+        commit: bool = True,
+    ) -> models.BillingCustomer:
+        """
+        Record a customer the provider already created (e.g. during checkout).
+
+        Args:
+            org_id: Organization ID
+            external_customer_id: Provider customer ID
+            email: Customer email
+            name: Customer name (optional)
+            commit: Commit the change (False leaves it to the caller)
+
+        Returns:
+            The org's BillingCustomer (existing or newly recorded)
+        """
+        existing = await self.get_customer_by_org(org_id)
+        if existing:
+            return existing
+
+        billing_customer = models.BillingCustomer(
+            id=uuid.uuid4().hex,
+            org_id=org_id,
+            provider=self._provider_name,
+            external_customer_id=external_customer_id,
+            email=email,
+            name=name,
+            metadata_json={"org_id": org_id},
+        )
+        self.db.add(billing_customer)
+        if commit:
+            self.db.commit()
+        _evict_customer_id(self._cache_key(external_customer_id))
+        self._customer_by_org[org_id] = billing_customer
+
+        logger.info(f"Recorded billing customer for org {org_id} from checkout")
+        return billing_customer
+
     async def get_customer_by_org(
         self, org_id: str
     ) -> Optional[models.BillingCustomer]:
         """Get billing customer for an organization"""
-        return (
-            self.db.query(models.BillingCustomer)
-            .filter(models.BillingCustomer.org_id == org_id)
-            .first()
-        )
+        billing_customer = self._customer_by_org.get(org_id)
+        if billing_customer is not None:
+            return billing_customer
+
+        billing_customer = self.db.scalars(
+            select(models.BillingCustomer)
+            .where(models.BillingCustomer.org_id == org_id)
+            .limit(1)
+        ).first()
+        if billing_customer is not None:
+            self._customer_by_org[org_id] = billing_customer
+        return billing_customer
 
     async def get_customer_by_id(
         self, customer_id: str
     ) -> Optional[models.BillingCustomer]:
         """Get billing customer by ID"""
-        return (
-            self.db.query(models.BillingCustomer)
-            .filter(models.BillingCustomer.id == customer_id)
-            .first()
-        )
+        return self.db.get(models.BillingCustomer, customer_id)
 
     async def get_customer_by_external_id(
         self, external_customer_id: str
     ) -> Optional[models.BillingCustomer]:
         """Get billing customer by external provider ID"""
-        return (
-            self.db.query(models.BillingCustomer)
-            .filter(models.BillingCustomer.external_customer_id == external_customer_id)
-            .first()
-        )
+        key = self._cache_key(external_customer_id)
+        if _is_known_missing(key):
+            return None
+        customer_id = _get_cached_customer_id(key)
+        if customer_id:
+            # Identity-map hit within a session, primary-key load otherwise
+            billing_customer = self.db.get(models.BillingCustomer, customer_id)
+            if billing_customer is not None:
+                return billing_customer
+            _evict_customer_id(key)
+
+        billing_customer = self.db.scalars(
+            select(models.BillingCustomer)
+            .where(*self._external_id_filter(external_customer_id))
+            .limit(1)
+        ).first()
+        if billing_customer is not None:
+            _cache_customer_id(key, billing_customer.id)
+        else:
+            _remember_missing(key)
+        return billing_customer
+
+    async def get_customer_ref_by_external_id(
+        self, external_customer_id: str
+    ) -> Optional[Row]:
+        """
+        Get just (id, org_id) for a billing customer by external provider ID.
+
+        Skips the wider columns and ORM instance construction for callers that
+        only need to attribute an event to a customer.
+
+        Args:
+            external_customer_id: Provider customer ID
+
+        Returns:
+            Row with id and org_id, or None if not found
+        """
+        key = self._cache_key(external_customer_id)
+        if _is_known_missing(key):
+            return None
+        row = self.db.execute(
+            select(models.BillingCustomer.id, models.BillingCustomer.org_id)
+            .where(*self._external_id_filter(external_customer_id))
+            .limit(1)
+        ).first()
+        if row is not None:
+            _cache_customer_id(key, row.id)
+        else:
+            _remember_missing(key)
+        return row
+
+    async def get_customer_and_subscription_by_external_ids(
+        self,
+        external_customer_id: str,
+        external_subscription_id: Optional[str] = None,
+    ) -> Tuple[Optional[models.BillingCustomer], Optional[models.BillingSubscription]]:
+        """
+        Get a billing customer and one of its subscriptions in one query.
+
+        Args:
+            external_customer_id: Provider customer ID
+            external_subscription_id: Provider subscription ID (optional)
+
+        Returns:
+            (customer, subscription); either is None if not found
+        """
+        if not external_subscription_id:
+            return await self.get_customer_by_external_id(external_customer_id), None
+        key = self._cache_key(external_customer_id)
+        if _is_known_missing(key):
+            return None, None
+
+        # Webhooks only need the customer's keys; the subscription is mutated
+        row = self.db.execute(
+            select(models.BillingCustomer, models.BillingSubscription)
+            .options(
+                load_only(models.BillingCustomer.id, models.BillingCustomer.org_id)
+            )
+            .outerjoin(
+                models.BillingSubscription,
+                and_(
+                    models.BillingSubscription.customer_id == models.BillingCustomer.id,
+                    models.BillingSubscription.external_subscription_id
+                    == external_subscription_id,
+                ),
+            )
+            .where(*self._external_id_filter(external_customer_id))
+            .limit(1)
+        ).first()
+        if not row:
+            _remember_missing(key)
+            return None, None
+        return row[0], row[1]
+
+    async def get_customer_and_active_subscription_for_org(
+        self, org_id: str
+    ) -> Tuple[Optional[models.BillingCustomer], Optional[models.BillingSubscription]]:
+        """
+        Get an org's billing customer and its live subscription in one query.
+
+        Args:
+            org_id: Organization ID
+
+        Returns:
+            (customer, subscription); subscription is None if none is active
+        """
+        row = self.db.execute(
+            select(models.BillingCustomer, models.BillingSubscription)
+            .outerjoin(
+                models.BillingSubscription,
+                and_(
+                    models.BillingSubscription.customer_id == models.BillingCustomer.id,
+                    models.BillingSubscription.status.in_(["active", "trialing"]),
+                ),
+            )
+            .where(models.BillingCustomer.org_id == org_id)
+            .limit(1)
+        ).first()
+        if not row:
+            return None, None
+        self._customer_by_org[org_id] = row[0]
+        return row[0], row[1]
 
     async def update_customer(
         self,
@@ -150,11 +389,10 @@ class CustomerService:
                 billing_customer.email = email
             if name is not None:
                 billing_customer.name = name
-            if metadata is not None:
-                billing_customer.metadata = metadata
-
-            billing_customer.metadata = provider_customer.metadata
+            # The provider's copy already includes any metadata just sent
+            billing_customer.metadata_json = provider_customer.metadata
             self.db.commit()
+            _evict_customer_id(self._cache_key(billing_customer.external_customer_id))
 
             logger.info(f"Updated customer {customer_id}")
             return billing_customer
@@ -185,15 +423,22 @@ class CustomerService:
         Returns:
             BillingCustomer (existing or newly created)
         """
-        # Try to get existing customer
-        existing_customer = await self.get_customer_by_org(org_id)
+        # Load the org and any existing customer in one round trip
+        row = self.db.execute(
+            select(models.Org, models.BillingCustomer)
+            .outerjoin(
+                models.BillingCustomer, models.BillingCustomer.org_id == models.Org.id
+            )
+            .where(models.Org.id == org_id)
+            .limit(1)
+        ).first()
+        org, existing_customer = row if row else (None, None)
         if existing_customer:
             return existing_customer
 
         # Create new customer
         if not default_email:
-            # Get org details to generate email
-            org = self.db.query(models.Org).filter(models.Org.id == org_id).first()
+            # Use org details to generate email
             if not org:
                 raise ValueError(f"Organization {org_id} not found")
 
@@ -204,13 +449,19 @@ class CustomerService:
             org_id=org_id, email=default_email, name=default_name
         )
 
+    def _cache_key(self, external_customer_id: str) -> Tuple[str, str]:
+        return (self._provider_name, external_customer_id)
+
+    def _external_id_filter(self, external_customer_id: str):
+        # Matches the unique (provider, external_customer_id) index
+        return (
+            models.BillingCustomer.provider == self._provider_name,
+            models.BillingCustomer.external_customer_id == external_customer_id,
+        )
+
     def get_provider_dashboard_url(self, customer_id: str) -> Optional[str]:
         """Get URL to customer dashboard in payment provider"""
-        billing_customer = (
-            self.db.query(models.BillingCustomer)
-            .filter(models.BillingCustomer.id == customer_id)
-            .first()
-        )
+        billing_customer = self.db.get(models.BillingCustomer, customer_id)
 
         if not billing_customer:
             return None
@@ -6,19 +6,28 @@ creation, updates, cancellation, and status tracking.
 """
 
 from typing import Optional, Dict, Any
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from datetime import datetime
+from sqlalchemy import and_, func, select
+from datetime import datetime, timezone
 
 from app.services.payment.factory import get_payment_provider
 from app.services.payment.protocol import PaymentProvider, PaymentProviderError
 from app.db import models
+import hashlib
+import json
 import logging
 import uuid
 
 logger = logging.getLogger(__name__)
 
 
+def _payload_hash(subscription_data: Dict[str, Any]) -> str:
+    """Stable digest of provider subscription data, to spot redeliveries"""
+    encoded = json.dumps(subscription_data, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
 class SubscriptionService:
     """Service for managing subscriptions"""
 
@@ -30,52 +39,45 @@ class SubscriptionService:
         self, org_id: str
     ) -> Optional[models.BillingSubscription]:
         """Get active subscription for an organization"""
-        # First get the billing customer
-        billing_customer = (
-            self.db.query(models.BillingCustomer)
-            .filter(models.BillingCustomer.org_id == org_id)
-            .first()
-        )
-
-        if not billing_customer:
-            return None
-
-        return (
-            self.db.query(models.BillingSubscription)
-            .filter(
+        return self.db.scalars(
+            select(models.BillingSubscription)
+            .join(
+                models.BillingCustomer,
+                models.BillingSubscription.customer_id == models.BillingCustomer.id,
+            )
+            .where(
                 and_(
-                    models.BillingSubscription.customer_id == billing_customer.id,
+                    models.BillingCustomer.org_id == org_id,
                     models.BillingSubscription.status.in_(["active", "trialing"]),
                 )
             )
-            .first()
-        )
+            .limit(1)
+        ).first()
 
     async def get_subscription_by_id(
         self, subscription_id: str
     ) -> Optional[models.BillingSubscription]:
         """Get subscription by internal ID"""
-        return (
-            self.db.query(models.BillingSubscription)
-            .filter(models.BillingSubscription.id == subscription_id)
-            .first()
-        )
+        return self.db.get(models.BillingSubscription, subscription_id)
 
     async def get_subscription_by_external_id(
         self, external_subscription_id: str
     ) -> Optional[models.BillingSubscription]:
         """Get subscription by external provider ID"""
-        return (
-            self.db.query(models.BillingSubscription)
-            .filter(
+        return self.db.scalars(
+            select(models.BillingSubscription)
+            .where(
                 models.BillingSubscription.external_subscription_id
                 == external_subscription_id
             )
-            .first()
-        )
+            .limit(1)
+        ).first()
 
     async def create_or_update_subscription(
-        self, customer_id: str, subscription_data: Dict[str, Any]
+        self,
+        customer_id: str,
+        subscription_data: Dict[str, Any],
+        commit: bool = True,
     ) -> models.BillingSubscription:
         """
         Create or update subscription record from provider data.
@@ -83,15 +85,62 @@ class SubscriptionService:
         Args:
             customer_id: Internal billing customer ID
             subscription_data: Subscription data from payment provider
+            commit: Commit the change (False leaves it to the caller)
 
         Returns:
             Created or updated BillingSubscription
         """
+        if self._supports_on_conflict():
+            return await self._upsert_on_conflict(
+                customer_id, subscription_data, commit=commit
+            )
+
         external_subscription_id = subscription_data.get("id")
 
         # Check if subscription already exists
         existing = await self.get_subscription_by_external_id(external_subscription_id)
 
+        return await self.upsert_subscription(
+            customer_id, existing, subscription_data, commit=commit
+        )
+
+    async def upsert_subscription(
+        self,
+        customer_id: str,
+        existing: Optional[models.BillingSubscription],
+        subscription_data: Dict[str, Any],
+        commit: bool = True,
+    ) -> models.BillingSubscription:
+        """
+        Write provider subscription data when the existing row is already known.
+
+        On Postgres the write is an INSERT ... ON CONFLICT, so a concurrent
+        event that created the row after it was read cannot cause a conflict.
+
+        Args:
+            customer_id: Internal billing customer ID
+            existing: Current subscription record, or None to create one
+            subscription_data: Subscription data from payment provider
+            commit: Commit the change (False leaves it to the caller)
+
+        Returns:
+            Created or updated BillingSubscription
+        """
+        external_subscription_id = subscription_data.get("id")
+        payload_hash = _payload_hash(subscription_data)
+        metadata = subscription_data.get("metadata") or {}
+
+        if existing and existing.payload_hash == payload_hash:
+            # Redelivered event with nothing new to write
+            logger.debug(f"Subscription {existing.id} unchanged, skipping update")
+            return existing
+
+        if self._supports_on_conflict():
+            # A concurrent event may have inserted the row since it was read
+            return await self._upsert_on_conflict(
+                customer_id, subscription_data, commit=commit
+            )
+
         if existing:
             # Update existing subscription
             existing.status = subscription_data.get("status", "active")
@@ -101,16 +150,18 @@ class SubscriptionService:
             existing.current_period_end = self._parse_timestamp(
                 subscription_data.get("current_period_end")
             )
-            existing.metadata = subscription_data.get("metadata", {})
-            existing.updated_at = datetime.utcnow()
+            existing.metadata_json = metadata
+            existing.payload_hash = payload_hash
+            existing.updated_at = datetime.now(timezone.utc)
 
-            self.db.commit()
+            if commit:
+                self.db.commit()
             logger.info(f"Updated subscription {existing.id}")
             return existing
         else:
             # Create new subscription
             subscription = models.BillingSubscription(
-                id=str(uuid.uuid4()),
+                id=uuid.uuid4().hex,
                 customer_id=customer_id,
                 external_subscription_id=external_subscription_id,
                 plan_id=self._extract_plan_id(subscription_data),
@@ -121,16 +172,79 @@ class SubscriptionService:
                 current_period_end=self._parse_timestamp(
                     subscription_data.get("current_period_end")
                 ),
-                metadata=subscription_data.get("metadata", {}),
+                metadata_json=metadata,
+                payload_hash=payload_hash,
             )
 
             self.db.add(subscription)
-            self.db.commit()
-            self.db.refresh(subscription)
+            if commit:
+                self.db.commit()
+                self.db.refresh(subscription)
 
             logger.info(f"Created subscription {subscription.id}")
             return subscription
 
+    def _supports_on_conflict(self) -> bool:
+        return self.db.get_bind().dialect.name == "postgresql"
+
+    async def _upsert_on_conflict(
+        self,
+        customer_id: str,
+        subscription_data: Dict[str, Any],
+        commit: bool = True,
+    ) -> models.BillingSubscription:
+        """Single race-free round trip via the unique external ID index"""
+        subscription = self._upsert_returning(customer_id, subscription_data)
+        if subscription is None:
+            # Unchanged redelivery: the conflict update was skipped
+            return await self.get_subscription_by_external_id(
+                subscription_data.get("id")
+            )
+        if commit:
+            self.db.commit()
+        logger.info(f"Upserted subscription {subscription.id}")
+        return subscription
+
+    def _upsert_returning(
+        self, customer_id: str, subscription_data: Dict[str, Any]
+    ) -> Optional[models.BillingSubscription]:
+        """
+        INSERT ... ON CONFLICT (external_subscription_id) DO UPDATE RETURNING.
+
+        Returns None when the stored row already has this payload's hash.
+        """
+        stmt = pg_insert(models.BillingSubscription).values(
+            id=uuid.uuid4().hex,
+            customer_id=customer_id,
+            external_subscription_id=subscription_data.get("id"),
+            plan_id=self._extract_plan_id(subscription_data),
+            status=subscription_data.get("status", "active"),
+            current_period_start=self._parse_timestamp(
+                subscription_data.get("current_period_start")
+            ),
+            current_period_end=self._parse_timestamp(
+                subscription_data.get("current_period_end")
+            ),
+            metadata_json=subscription_data.get("metadata") or {},
+            payload_hash=_payload_hash(subscription_data),
+        )
+        columns = models.BillingSubscription.__table__.c
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[columns.external_subscription_id],
+            set_={
+                columns.status: stmt.excluded.status,
+                columns.current_period_start: stmt.excluded.current_period_start,
+                columns.current_period_end: stmt.excluded.current_period_end,
+                columns["metadata"]: stmt.excluded["metadata"],
+                columns.payload_hash: stmt.excluded.payload_hash,
+                columns.updated_at: func.now(),
+            },
+            where=columns.payload_hash.is_distinct_from(stmt.excluded.payload_hash),
+        ).returning(models.BillingSubscription)
+        return self.db.scalars(
+            stmt, execution_options={"populate_existing": True}
+        ).one_or_none()
+
     async def cancel_subscription_for_org(self, org_id: str) -> bool:
         """
         Cancel subscription for an organization.
@@ -153,7 +267,7 @@ class SubscriptionService:
 
             # Update local record
             subscription.status = "canceled"
-            subscription.updated_at = datetime.utcnow()
+            subscription.updated_at = datetime.now(timezone.utc)
             self.db.commit()
 
             logger.info(f"Canceled subscription for org {org_id}")
@@ -186,7 +300,7 @@ class SubscriptionService:
 
             # Update local record
             subscription.status = "canceled"
-            subscription.updated_at = datetime.utcnow()
+            subscription.updated_at = datetime.now(timezone.utc)
             self.db.commit()
 
             logger.info(f"Canceled subscription {subscription_id}")
@@ -202,6 +316,8 @@ class SubscriptionService:
         external_subscription_id: str,
         status: str,
         metadata: Optional[Dict[str, Any]] = None,
+        subscription: Optional[models.BillingSubscription] = None,
+        commit: bool = True,
     ) -> Optional[models.BillingSubscription]:
         """
         Update subscription status (typically called from webhooks).
@@ -210,23 +326,30 @@ class SubscriptionService:
             external_subscription_id: External provider subscription ID
             status: New status
             metadata: Optional metadata to update
+            subscription: Already-loaded subscription (skips the lookup)
+            commit: Commit the change (False leaves it to the caller)
 
         Returns:
             Updated subscription or None if not found
         """
-        subscription = await self.get_subscription_by_external_id(
-            external_subscription_id
-        )
+        if subscription is None:
+            subscription = await self.get_subscription_by_external_id(
+                external_subscription_id
+            )
         if not subscription:
             return None
 
         subscription.status = status
-        subscription.updated_at = datetime.utcnow()
+        subscription.updated_at = datetime.now(timezone.utc)
 
         if metadata:
-            subscription.metadata = {**(subscription.metadata or {}), **metadata}
+            subscription.metadata_json = {
+                **(subscription.metadata_json or {}),
+                **metadata,
+            }
 
-        self.db.commit()
+        if commit:
+            self.db.commit()
         logger.info(f"Updated subscription {subscription.id} status to {status}")
         return subscription
 
@@ -241,27 +364,24 @@ class SubscriptionService:
             Usage item ID or None if not found
         """
         subscription = await self.get_subscription_for_org(org_id)
-        if not subscription or not subscription.metadata:
+        if not subscription or not subscription.metadata_json:
             return None
 
-        return subscription.metadata.get("metered_item_id")
+        return subscription.metadata_json.get("metered_item_id")
 
     def _parse_timestamp(self, timestamp: Optional[int]) -> Optional[datetime]:
-        """Parse Unix timestamp to datetime"""
+        """Parse Unix timestamp to an aware UTC datetime"""
         if timestamp is None:
             return None
-        return datetime.fromtimestamp(timestamp)
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc)
 
     def _extract_plan_id(self, subscription_data: Dict[str, Any]) -> str:
         """Extract plan ID from subscription data"""
-        # Handle different provider formats
-        items = subscription_data.get("items", {})
-        if isinstance(items, dict) and "data" in items:
-            items_data = items["data"]
-            if items_data and len(items_data) > 0:
-                price = items_data[0].get("price", {})
-                if isinstance(price, dict):
-                    return price.get("id", "")
-
-        # Fallback
+        # Stripe nests it as items.data[0].price.id; walk the path in one go
+        try:
+            return subscription_data["items"]["data"][0]["price"]["id"]
+        except (KeyError, IndexError, TypeError):
+            pass
+
+        # Fallback for flat provider formats
         return subscription_data.get("plan_id", "")
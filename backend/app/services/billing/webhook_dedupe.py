@@ -0,0 +1,62 @@
+"""
+Webhook redelivery guard.
+
+Payment providers deliver webhooks at least once and redeliver the same event
+ID on timeouts or non-2xx responses. These helpers claim an event ID in Redis
+(SET NX) so a redelivery is skipped without touching the database.
+"""
+
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Provider event IDs already handled. A claim is held for the task time limit
+# while processing and extended to a day once the event has been processed.
+WEBHOOK_SEEN_KEY_PREFIX = "billing:webhooks:seen:"
+WEBHOOK_SEEN_TTL_SECONDS = 86400
+WEBHOOK_CLAIM_TTL_SECONDS = 300
+
+_redis_client = None
+
+
+def get_redis():
+    """Lazily create a Redis client on the broker connection"""
+    global _redis_client
+    if _redis_client is None:
+        import redis
+
+        _redis_client = redis.Redis.from_url(
+            settings.CELERY_BROKER_URL or "redis://localhost:6379/0"
+        )
+    return _redis_client
+
+
+def claim_webhook_event(event_id: str) -> bool:
+    """Claim an event for processing; False if it was already claimed or done"""
+    try:
+        return bool(
+            get_redis().set(
+                f"{WEBHOOK_SEEN_KEY_PREFIX}{event_id}",
+                "1",
+                nx=True,
+                ex=WEBHOOK_CLAIM_TTL_SECONDS,
+            )
+        )
+    except Exception as exc:
+        # Without Redis we cannot dedupe; processing twice beats dropping
+        logger.warning(f"Webhook dedupe unavailable for {event_id}: {exc}")
+        return True
+
+
+def finish_webhook_event(event_id: str, processed: bool) -> None:
+    """Keep the claim for a day after success, release it after failure"""
+    key = f"{WEBHOOK_SEEN_KEY_PREFIX}{event_id}"
+    try:
+        if processed:
+            get_redis().set(key, "1", ex=WEBHOOK_SEEN_TTL_SECONDS)
+        else:
+            get_redis().delete(key)
+    except Exception as exc:
+        logger.warning(f"Failed to update webhook dedupe key for {event_id}: {exc}")
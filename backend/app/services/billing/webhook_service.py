@@ -5,7 +5,9 @@ This service handles webhook events from payment providers,
 processing subscription lifecycle events and other billing updates.
 """
 
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
+from sqlalchemy import insert as core_insert, select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 from datetime import datetime
 
@@ -18,12 +20,190 @@ from app.services.payment.protocol import (
 from app.services.billing.customer_service import CustomerService
 from app.services.billing.subscription_service import SubscriptionService
 from app.db import models
+from app.db.session import SessionLocal
 from app.core.config import settings
+import asyncio
 import logging
 import uuid
 
+if TYPE_CHECKING:
+    from fastapi import BackgroundTasks
+
 logger = logging.getLogger(__name__)
 
+# Invoice events are only logged for now; they could later update subscription
+# status or send confirmation/dunning emails. Keyed by the event type's verb.
+_INVOICE_LOG_MESSAGES = {
+    "payment_succeeded": (logging.INFO, "Payment succeeded for invoice {}"),
+    "payment_failed": (logging.WARNING, "Payment failed for invoice {}"),
+    "created": (logging.INFO, "Invoice created: {}"),
+}
+
+# The subscription.created event handles the actual subscription setup
+_CHECKOUT_LOG_MESSAGES = {
+    "completed": "Checkout session completed: {}",
+    "expired": "Checkout session expired: {}",
+}
+
+# Where different event types carry their amount, in priority order
+_AMOUNT_FIELDS = ("amount_total", "amount_due", "amount_paid", "total")
+
+# Webhook signing secret per provider; the mock provider needs none
+_SECRET_BY_PROVIDER = {
+    "stripe": settings.STRIPE_WEBHOOK_SECRET,
+    "paypal": settings.PAYPAL_WEBHOOK_ID,
+    "square": settings.SQUARE_WEBHOOK_SIGNATURE_KEY,
+}
+
+# Background audit-log writer: flush up to this many rows, or whatever arrived
+# within the window, as one multi-row INSERT
+BILLING_EVENT_BATCH_SIZE = 500
+BILLING_EVENT_FLUSH_SECONDS = 0.05
+
+_billing_event_queue: Optional[asyncio.Queue] = None
+_billing_event_writer_task: Optional[asyncio.Task] = None
+
+_ON_CONFLICT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def insert_billing_events(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert billing event rows, skipping events that were already recorded.
+
+    Duplicates are detected by the unique (provider, external_event_id) index;
+    dialects without ON CONFLICT support fall back to a plain bulk insert.
+
+    Args:
+        db: Session to execute in (the caller commits)
+        rows: Column mappings as built by billing_event_row
+    """
+    if not rows:
+        return
+    insert = _ON_CONFLICT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is None:
+        db.execute(core_insert(models.BillingEvent), rows)
+        return
+    db.execute(insert(models.BillingEvent).on_conflict_do_nothing(), rows)
+
+
+def insert_billing_event(db: Session, row: Dict[str, Any]) -> bool:
+    """
+    Insert one billing event row unless the event was already recorded.
+
+    Args:
+        db: Session to execute in (the caller commits)
+        row: Column mapping as built by billing_event_row
+
+    Returns:
+        True if the row was inserted, False for a redelivered event
+    """
+    insert = _ON_CONFLICT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is None:
+        exists = db.scalar(
+            select(models.BillingEvent.id)
+            .where(
+                models.BillingEvent.provider == row["provider"],
+                models.BillingEvent.external_event_id == row["external_event_id"],
+            )
+            .limit(1)
+        )
+        if exists:
+            return False
+        db.execute(core_insert(models.BillingEvent).values(row))
+        return True
+    result = db.execute(
+        insert(models.BillingEvent).values(row).on_conflict_do_nothing()
+    )
+    return result.rowcount == 1
+
+
+def _flush_billing_events(rows: List[Dict[str, Any]]) -> None:
+    """Write one batch of queued billing events in its own session"""
+    db = SessionLocal()
+    try:
+        insert_billing_events(db, rows)
+        db.commit()
+    except Exception as e:
+        logger.error(f"Failed to write {len(rows)} billing events: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+async def _billing_event_writer(queue: asyncio.Queue) -> None:
+    """Drain the audit-log queue in batches until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        rows = [await queue.get()]
+        deadline = loop.time() + BILLING_EVENT_FLUSH_SECONDS
+        while len(rows) < BILLING_EVENT_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                rows.append(await asyncio.wait_for(queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        await asyncio.to_thread(_flush_billing_events, rows)
+
+
+def start_billing_event_writer() -> None:
+    """Start the batched audit-log writer on the running event loop"""
+    global _billing_event_queue, _billing_event_writer_task
+    if _billing_event_writer_task is not None:
+        return
+    _billing_event_queue = asyncio.Queue()
+    _billing_event_writer_task = asyncio.create_task(
+        _billing_event_writer(_billing_event_queue)
+    )
+
+
+async def stop_billing_event_writer() -> None:
+    """Stop the writer and flush anything still queued"""
+    global _billing_event_queue, _billing_event_writer_task
+    task, queue = _billing_event_writer_task, _billing_event_queue
+    _billing_event_writer_task = _billing_event_queue = None
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    rows = []
+    while not queue.empty():
+        rows.append(queue.get_nowait())
+    if rows:
+        _flush_billing_events(rows)
+
+
+def enqueue_billing_event(row: Dict[str, Any]) -> bool:
+    """Queue a billing event row; False if the writer is not running"""
+    if _billing_event_queue is None:
+        return False
+    _billing_event_queue.put_nowait(row)
+    return True
+
+
+def billing_event_row(event: WebhookEvent, org_id: Optional[str]) -> Dict[str, Any]:
+    """Column mapping for a BillingEvent audit record"""
+    event_data = event.data.get("object", {})
+    return {
+        "id": uuid.uuid4().hex,
+        "org_id": org_id,
+        "event_type": event.type,
+        "provider": event.provider,
+        "external_event_id": event.id,
+        "amount_cents": _extract_amount_cents(event_data),
+        "metadata_json": event.data,
+        "processed_at": datetime.utcnow(),
+    }
+
+
+def _extract_amount_cents(event_data: Dict[str, Any]) -> int:
+    """Extract amount in cents from event data"""
+    return next((event_data[f] for f in _AMOUNT_FIELDS if f in event_data), 0) or 0
+
 
 class WebhookService:
     """Service for processing payment provider webhooks"""
@@ -31,11 +211,18 @@ class WebhookService:
     def __init__(self, db: Session, payment_provider: PaymentProvider = None):
         self.db = db
         self.payment_provider = payment_provider or get_payment_provider()
-        self.customer_service = CustomerService(db, payment_provider)
-        self.subscription_service = SubscriptionService(db, payment_provider)
+        self.customer_service = CustomerService(db, self.payment_provider)
+        self.subscription_service = SubscriptionService(db, self.payment_provider)
+        self._default_webhook_secret = _SECRET_BY_PROVIDER.get(
+            self.payment_provider.get_provider_name(), ""
+        )
 
     async def process_webhook(
-        self, payload: bytes, signature: str, secret: str = None
+        self,
+        payload: bytes,
+        signature: str,
+        secret: str = None,
+        background_tasks: Optional["BackgroundTasks"] = None,
     ) -> bool:
         """
         Process webhook event from payment provider.
@@ -44,22 +231,122 @@ class WebhookService:
             payload: Raw webhook payload
             signature: Webhook signature for verification
             secret: Webhook secret (uses default if not provided)
+            background_tasks: Defer the audit-log insert until after the response
 
         Returns:
             True if event was processed successfully
         """
+        event = self.verify_webhook(payload, signature, secret)
+        if event is None:
+            return False
+
+        return await self.process_verified_event(event, background_tasks)
+
+    def verify_webhook(
+        self, payload: bytes, signature: str, secret: str = None
+    ) -> Optional[WebhookEvent]:
+        """
+        Verify a webhook's signature and parse it into an event.
+
+        Args:
+            payload: Raw webhook payload, exactly as received
+            signature: Webhook signature for verification
+            secret: Webhook secret (uses default if not provided)
+
+        Returns:
+            Parsed WebhookEvent, or None if verification failed
+        """
         try:
-            # Verify and parse webhook event
             webhook_secret = secret or self._get_webhook_secret()
-            event = self.payment_provider.verify_webhook_signature(
+            return self.payment_provider.verify_webhook_signature(
                 payload=payload, signature=signature, secret=webhook_secret
             )
+        except WebhookVerificationError as e:
+            logger.error(f"Webhook verification failed: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Failed to process webhook event: {e}")
+            return None
+
+    def verify_webhooks(
+        self, items: List[Tuple[bytes, str]], secret: str = None
+    ) -> List[Optional[WebhookEvent]]:
+        """
+        Verify a batch of webhooks in one provider call.
+
+        Args:
+            items: (payload, signature) pairs
+            secret: Webhook secret (uses default if not provided)
+
+        Returns:
+            One WebhookEvent per item, None where verification failed
+        """
+        webhook_secret = secret or self._get_webhook_secret()
+        try:
+            return self.payment_provider.verify_webhook_signatures(
+                items, webhook_secret
+            )
+        except Exception as e:
+            # Isolate the bad item(s) by falling back to one-by-one verification
+            logger.warning(f"Batch webhook verification failed, retrying singly: {e}")
+            events: List[Optional[WebhookEvent]] = []
+            for payload, signature in items:
+                try:
+                    events.append(
+                        self.payment_provider.verify_webhook_signature(
+                            payload=payload, signature=signature, secret=webhook_secret
+                        )
+                    )
+                except Exception as item_exc:
+                    logger.error(f"Webhook verification failed: {item_exc}")
+                    events.append(None)
+            return events
+
+    async def process_verified_event(
+        self,
+        event: WebhookEvent,
+        background_tasks: Optional["BackgroundTasks"] = None,
+    ) -> bool:
+        """
+        Log and dispatch an already-verified webhook event.
 
-            # Log the event
-            await self._log_billing_event(event)
+        Args:
+            event: Verified webhook event
+            background_tasks: Defer the audit-log insert until after the response
+
+        Returns:
+            True if event was processed successfully
+        """
+        try:
+            # Resolve the customer (and subscription) once for the whole event
+            billing_customer, subscription = await self._resolve_event_records(event)
+
+            if background_tasks is not None:
+                # Capture org_id now; the customer row expires on commit
+                org_id = self._event_org_id(event, billing_customer)
+            else:
+                # Log the event
+                await self._log_billing_event(event, billing_customer, commit=False)
 
             # Process event based on type
-            success = await self._process_event(event)
+            success = await self._process_event(event, billing_customer, subscription)
+
+            if background_tasks is not None:
+                if success:
+                    self.db.commit()
+                else:
+                    self.db.rollback()
+                # The audit record is written after the response is sent
+                background_tasks.add_task(
+                    self._log_billing_event_detached, event, org_id
+                )
+            elif success:
+                # One commit for the event log and everything the handler wrote
+                self.db.commit()
+            else:
+                # Drop partial handler writes but keep the audit record
+                self.db.rollback()
+                await self._log_billing_event(event)
 
             if success:
                 logger.info(
@@ -72,33 +359,68 @@ class WebhookService:
 
             return success
 
-        except WebhookVerificationError as e:
-            logger.error(f"Webhook verification failed: {e}")
-            return False
         except Exception as e:
             logger.error(f"Failed to process webhook event: {e}")
+            self.db.rollback()
             return False
 
-    async def _process_event(self, event: WebhookEvent) -> bool:
+    async def _resolve_event_records(
+        self, event: WebhookEvent
+    ) -> Tuple[Optional[models.BillingCustomer], Optional[models.BillingSubscription]]:
+        """Load the customer/subscription a customer-scoped event refers to"""
+        event_data = event.data.get("object", {})
+
+        if event.type.startswith("customer.subscription."):
+            customer_id = event_data.get("customer")
+            if not customer_id:
+                return None, None
+            return await self._get_customer_and_subscription(
+                customer_id, event_data.get("id")
+            )
+        if event.type == "customer.updated":
+            customer_id = event_data.get("id")
+            if not customer_id:
+                return None, None
+            customer = await self.customer_service.get_customer_by_external_id(
+                customer_id
+            )
+            return customer, None
+
+        # Other events only need the customer when logging lacks an org_id
+        return None, None
+
+    async def _get_customer_and_subscription(
+        self, customer_id: str, subscription_id: Optional[str]
+    ) -> Tuple[Optional[models.BillingCustomer], Optional[models.BillingSubscription]]:
+        lookup = self.customer_service.get_customer_and_subscription_by_external_ids
+        return await lookup(customer_id, subscription_id)
+
+    async def _process_event(
+        self,
+        event: WebhookEvent,
+        billing_customer: Optional[models.BillingCustomer] = None,
+        subscription: Optional[models.BillingSubscription] = None,
+    ) -> bool:
         """Process a verified webhook event"""
         try:
-            if event.type.startswith("customer.subscription."):
-                return await self._handle_subscription_event(event)
-            elif event.type.startswith("invoice."):
-                return await self._handle_invoice_event(event)
-            elif event.type.startswith("customer."):
-                return await self._handle_customer_event(event)
-            elif event.type.startswith("checkout.session."):
-                return await self._handle_checkout_event(event)
-            else:
+            prefix, _, verb = event.type.rpartition(".")
+            handler = self._HANDLERS.get(prefix)
+            if handler is None:
                 logger.info(f"Unhandled event type: {event.type}")
                 return True  # Don't fail for unknown events
+            return await handler(self, event, verb, billing_customer, subscription)
 
         except Exception as e:
             logger.error(f"Error processing event {event.id}: {e}")
             return False
 
-    async def _handle_subscription_event(self, event: WebhookEvent) -> bool:
+    async def _handle_subscription_event(
+        self,
+        event: WebhookEvent,
+        verb: str,
+        billing_customer: Optional[models.BillingCustomer] = None,
+        subscription: Optional[models.BillingSubscription] = None,
+    ) -> bool:
         """Handle subscription-related webhook events"""
         subscription_data = event.data.get("object", {})
         customer_id = subscription_data.get("customer")
@@ -107,135 +429,200 @@ class WebhookService:
             logger.warning(f"No customer ID in subscription event {event.id}")
             return False
 
-        # Find billing customer
-        billing_customer = await self.customer_service.get_customer_by_external_id(
-            customer_id
-        )
+        # Find billing customer (and subscription) unless already resolved
+        if billing_customer is None:
+            billing_customer, subscription = await self._get_customer_and_subscription(
+                customer_id, subscription_data.get("id")
+            )
         if not billing_customer:
             logger.warning(f"Billing customer not found for external ID {customer_id}")
             return False
 
-        # Handle different subscription events
-        if event.type == "customer.subscription.created":
-            await self.subscription_service.create_or_update_subscription(
-                billing_customer.id, subscription_data
-            )
-        elif event.type == "customer.subscription.updated":
-            await self.subscription_service.create_or_update_subscription(
-                billing_customer.id, subscription_data
-            )
-        elif event.type == "customer.subscription.deleted":
-            await self.subscription_service.update_subscription_status(
-                subscription_data.get("id"), "canceled"
-            )
-        elif event.type == "customer.subscription.trial_will_end":
-            # Handle trial ending notification
-            logger.info(f"Trial ending for subscription {subscription_data.get('id')}")
+        action = self._SUBSCRIPTION_ACTIONS.get(verb)
+        if action:
+            await action(self, billing_customer, subscription, subscription_data)
 
         return True
 
-    async def _handle_invoice_event(self, event: WebhookEvent) -> bool:
-        """Handle invoice-related webhook events"""
-        invoice_data = event.data.get("object", {})
+    async def _upsert_subscription(
+        self,
+        billing_customer: models.BillingCustomer,
+        subscription: Optional[models.BillingSubscription],
+        subscription_data: Dict[str, Any],
+    ):
+        await self.subscription_service.upsert_subscription(
+            billing_customer.id, subscription, subscription_data, commit=False
+        )
+
+    async def _cancel_subscription(
+        self,
+        billing_customer: models.BillingCustomer,
+        subscription: Optional[models.BillingSubscription],
+        subscription_data: Dict[str, Any],
+    ):
+        await self.subscription_service.update_subscription_status(
+            subscription_data.get("id"),
+            "canceled",
+            subscription=subscription,
+            commit=False,
+        )
 
-        if event.type == "invoice.payment_succeeded":
-            logger.info(f"Payment succeeded for invoice {invoice_data.get('id')}")
-            # Could update subscription status, send confirmation emails, etc.
-        elif event.type == "invoice.payment_failed":
-            logger.warning(f"Payment failed for invoice {invoice_data.get('id')}")
-            # Could update subscription status, send dunning emails, etc.
-        elif event.type == "invoice.created":
-            logger.info(f"Invoice created: {invoice_data.get('id')}")
+    async def _log_trial_ending(
+        self,
+        billing_customer: models.BillingCustomer,
+        subscription: Optional[models.BillingSubscription],
+        subscription_data: Dict[str, Any],
+    ):
+        # Handle trial ending notification
+        logger.info(f"Trial ending for subscription {subscription_data.get('id')}")
+
+    async def _handle_invoice_event(
+        self,
+        event: WebhookEvent,
+        verb: str,
+        billing_customer: Optional[models.BillingCustomer] = None,
+        subscription: Optional[models.BillingSubscription] = None,
+    ) -> bool:
+        """Handle invoice-related webhook events"""
+        log_message = _INVOICE_LOG_MESSAGES.get(verb)
+        if log_message:
+            level, template = log_message
+            invoice_id = event.data.get("object", {}).get("id")
+            logger.log(level, template.format(invoice_id))
 
         return True
 
-    async def _handle_customer_event(self, event: WebhookEvent) -> bool:
+    async def _handle_customer_event(
+        self,
+        event: WebhookEvent,
+        verb: str,
+        billing_customer: Optional[models.BillingCustomer] = None,
+        subscription: Optional[models.BillingSubscription] = None,
+    ) -> bool:
         """Handle customer-related webhook events"""
         customer_data = event.data.get("object", {})
 
-        if event.type == "customer.updated":
+        if verb == "updated":
             # Update local customer record if needed
-            billing_customer = await self.customer_service.get_customer_by_external_id(
-                customer_data.get("id")
-            )
+            if billing_customer is None:
+                billing_customer = (
+                    await self.customer_service.get_customer_by_external_id(
+                        customer_data.get("id")
+                    )
+                )
             if billing_customer:
                 billing_customer.email = customer_data.get(
                     "email", billing_customer.email
                 )
                 billing_customer.name = customer_data.get("name", billing_customer.name)
-                billing_customer.metadata = customer_data.get(
-                    "metadata", billing_customer.metadata
+                billing_customer.metadata_json = customer_data.get(
+                    "metadata", billing_customer.metadata_json
                 )
-                self.db.commit()
-        elif event.type == "customer.deleted":
+        elif verb == "deleted":
             logger.info(f"Customer deleted: {customer_data.get('id')}")
 
         return True
 
-    async def _handle_checkout_event(self, event: WebhookEvent) -> bool:
+    async def _handle_checkout_event(
+        self,
+        event: WebhookEvent,
+        verb: str,
+        billing_customer: Optional[models.BillingCustomer] = None,
+        subscription: Optional[models.BillingSubscription] = None,
+    ) -> bool:
         """Handle checkout session events"""
-        session_data = event.data.get("object", {})
-
-        if event.type == "checkout.session.completed":
-            logger.info(f"Checkout session completed: {session_data.get('id')}")
-            # The subscription.created event will handle the actual subscription setup
-        elif event.type == "checkout.session.expired":
-            logger.info(f"Checkout session expired: {session_data.get('id')}")
+        session = event.data.get("object", {})
+        log_message = _CHECKOUT_LOG_MESSAGES.get(verb)
+        if log_message:
+            logger.info(log_message.format(session.get("id")))
+
+        # Signup checkouts create the provider customer; record it locally
+        org_id = (session.get("metadata") or {}).get("org_id")
+        external_customer_id = session.get("customer")
+        if verb == "completed" and org_id and external_customer_id:
+            details = session.get("customer_details") or {}
+            email = details.get("email") or session.get("customer_email")
+            if email:
+                await self.customer_service.record_customer_for_org(
+                    org_id, external_customer_id, email, commit=False
+                )
 
         return True
 
-    async def _log_billing_event(self, event: WebhookEvent):
+    def _event_org_id(
+        self,
+        event: WebhookEvent,
+        billing_customer: Optional[models.BillingCustomer] = None,
+    ) -> Optional[str]:
+        """Org ID from event metadata, else from an already-loaded customer"""
+        metadata = event.data.get("object", {}).get("metadata")
+        if metadata and metadata.get("org_id"):
+            return metadata["org_id"]
+        if billing_customer is not None:
+            return billing_customer.org_id
+        return None
+
+    async def _log_billing_event_detached(
+        self, event: WebhookEvent, org_id: Optional[str] = None
+    ):
+        """Write the audit record via the batch writer or its own session"""
+        if org_id and enqueue_billing_event(billing_event_row(event, org_id)):
+            return
+
+        db = SessionLocal()
+        try:
+            await WebhookService(db, self.payment_provider)._log_billing_event(
+                event, org_id=org_id
+            )
+        except Exception as e:
+            logger.error(f"Failed to log billing event {event.id}: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+    async def _log_billing_event(
+        self,
+        event: WebhookEvent,
+        billing_customer: Optional[models.BillingCustomer] = None,
+        commit: bool = True,
+        org_id: Optional[str] = None,
+    ):
         """Log billing event to database"""
-        # Extract org_id from event metadata
-        org_id = None
         event_data = event.data.get("object", {})
-        if event_data.get("metadata"):
-            org_id = event_data["metadata"].get("org_id")
+        if not org_id:
+            org_id = self._event_org_id(event, billing_customer)
 
-        # Try to get org_id from customer if not in metadata
-        if not org_id and event_data.get("customer"):
-            billing_customer = await self.customer_service.get_customer_by_external_id(
+        # Fall back to looking up the customer's org
+        if not org_id and billing_customer is None and event_data.get("customer"):
+            customer_ref = await self.customer_service.get_customer_ref_by_external_id(
                 event_data["customer"]
             )
-            if billing_customer:
-                org_id = billing_customer.org_id
-
-        billing_event = models.BillingEvent(
-            id=str(uuid.uuid4()),
-            org_id=org_id,
-            event_type=event.type,
-            provider=event.provider,
-            external_event_id=event.id,
-            amount_cents=self._extract_amount_cents(event_data),
-            metadata=event.data,
-            processed_at=datetime.utcnow(),
-        )
-
-        self.db.add(billing_event)
-        self.db.commit()
-
-    def _extract_amount_cents(self, event_data: Dict[str, Any]) -> int:
-        """Extract amount in cents from event data"""
-        # Different event types have amounts in different places
-        amount_cents = 0
-
-        # Try common amount fields
-        for field in ["amount_total", "amount_due", "amount_paid", "total"]:
-            if field in event_data:
-                amount_cents = event_data[field]
-                break
+            if customer_ref:
+                org_id = customer_ref.org_id
 
-        return amount_cents or 0
+        # A redelivered event is already recorded and is skipped
+        insert_billing_events(self.db, [billing_event_row(event, org_id)])
+        if commit:
+            self.db.commit()
 
     def _get_webhook_secret(self) -> str:
         """Get webhook secret for the current provider"""
-        provider_name = self.payment_provider.get_provider_name()
-
-        if provider_name == "stripe":
-            return settings.STRIPE_WEBHOOK_SECRET
-        elif provider_name == "paypal":
-            return settings.PAYPAL_WEBHOOK_ID
-        elif provider_name == "square":
-            return settings.SQUARE_WEBHOOK_SIGNATURE_KEY
-        else:
-            return ""  # Mock provider doesn't need a secret
+        return self._default_webhook_secret
+
+    # Dispatch tables are built once for the class rather than per webhook;
+    # the handlers are plain functions here and take the instance explicitly.
+
+    # Event type minus its last segment -> handler
+    _HANDLERS = {
+        "customer.subscription": _handle_subscription_event,
+        "invoice": _handle_invoice_event,
+        "customer": _handle_customer_event,
+        "checkout.session": _handle_checkout_event,
+    }
+    # customer.subscription.<verb> -> action
+    _SUBSCRIPTION_ACTIONS = {
+        "created": _upsert_subscription,
+        "updated": _upsert_subscription,
+        "deleted": _cancel_subscription,
+        "trial_will_end": _log_trial_ending,
+    }
@@ -5,18 +5,25 @@ This service coordinates complex billing workflows by orchestrating
 multiple smaller billing services.
 """
 
-from typing import Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any
 from sqlalchemy.orm import Session
 
 from app.services.billing.customer_service import CustomerService
 from app.services.billing.subscription_service import SubscriptionService
 from app.services.billing.checkout_service import CheckoutService
+from app.services.billing.webhook_dedupe import (
+    claim_webhook_event,
+    finish_webhook_event,
+)
 from app.services.billing.webhook_service import WebhookService
 from app.services.payment.factory import get_payment_provider
 from app.services.payment.protocol import PaymentProvider, CheckoutSession
 from app.db import models
 import logging
 
+if TYPE_CHECKING:
+    from fastapi import BackgroundTasks
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,6 +38,7 @@ class BillingOrchestrator:
     def __init__(self, db: Session, payment_provider: Optional[PaymentProvider] = None):
         self.db = db
         self.payment_provider = payment_provider or get_payment_provider()
+        self._provider_name = self.payment_provider.get_provider_name()
 
         # Initialize component services
         self.customer_service = CustomerService(db, self.payment_provider)
@@ -112,6 +120,41 @@ class BillingOrchestrator:
         logger.info(f"Created checkout session {checkout_session.id} for org {org_id}")
         return checkout_session
 
+    async def signup_and_checkout(
+        self,
+        org_id: str,
+        email: str,
+        plan_id: str,
+        success_url: str,
+        cancel_url: str,
+    ) -> CheckoutSession:
+        """
+        Start billing for a new organization with a single checkout session.
+
+        Unlike setup_organization_billing followed by
+        create_subscription_checkout, no customer is created up front; it is
+        recorded when the checkout completes.
+
+        Args:
+            org_id: Organization ID
+            email: Billing email
+            plan_id: Plan ID to subscribe to
+            success_url: Success redirect URL
+            cancel_url: Cancel redirect URL
+
+        Returns:
+            CheckoutSession for payment
+        """
+        logger.info(f"Creating signup checkout for org {org_id}, plan {plan_id}")
+
+        return await self.checkout_service.create_checkout_session_for_new_customer(
+            org_id=org_id,
+            email=email,
+            plan_id=plan_id,
+            success_url=success_url,
+            cancel_url=cancel_url,
+        )
+
     async def change_subscription_plan(
         self, org_id: str, new_plan_id: str, success_url: str, cancel_url: str
     ) -> CheckoutSession:
@@ -172,18 +215,39 @@ class BillingOrchestrator:
 
         return success
 
-    async def process_webhook_event(self, payload: bytes, signature: str) -> bool:
+    async def process_webhook_event(
+        self,
+        payload: bytes,
+        signature: str,
+        background_tasks: Optional["BackgroundTasks"] = None,
+    ) -> bool:
         """
         Process webhook event from payment provider.
 
         Args:
             payload: Raw webhook payload
             signature: Webhook signature
+            background_tasks: Defer the audit-log insert until after the response
 
         Returns:
-            True if event was processed successfully
+            True if event was processed successfully (or already had been)
         """
-        return await self.webhook_service.process_webhook(payload, signature)
+        # Verifying first parses the body once and keeps unsigned payloads
+        # from claiming event IDs
+        event = self.webhook_service.verify_webhook(payload, signature)
+        if event is None:
+            return False
+
+        # Redeliveries of an event already handled skip the database entirely
+        if not claim_webhook_event(event.id):
+            logger.info(f"Skipping duplicate webhook event {event.id}")
+            return True
+
+        success = await self.webhook_service.process_verified_event(
+            event, background_tasks
+        )
+        finish_webhook_event(event.id, processed=success)
+        return success
 
     async def get_organization_billing_status(self, org_id: str) -> Dict[str, Any]:
         """
@@ -195,8 +259,13 @@ class BillingOrchestrator:
         Returns:
             Dictionary with billing status information
         """
-        # Get billing customer
-        billing_customer = await self.customer_service.get_customer_by_org(org_id)
+        # Customer and live subscription come back from one joined query
+        (
+            billing_customer,
+            subscription,
+        ) = await self.customer_service.get_customer_and_active_subscription_for_org(
+            org_id
+        )
         if not billing_customer:
             return {
                 "has_billing": False,
@@ -205,12 +274,9 @@ class BillingOrchestrator:
                 "provider": None,
             }
 
-        # Get subscription
-        subscription = await self.subscription_service.get_subscription_for_org(org_id)
-
-        # Get provider dashboard URL
-        dashboard_url = self.customer_service.get_provider_dashboard_url(
-            billing_customer.id
+        # Dashboard URL straight from the loaded customer; no second lookup
+        dashboard_url = self.payment_provider.get_dashboard_url(
+            billing_customer.external_customer_id
         )
 
         return {
@@ -270,13 +336,8 @@ class BillingOrchestrator:
 
     def get_provider_name(self) -> str:
         """Get the name of the current payment provider"""
-        return self.payment_provider.get_provider_name()
+        return self._provider_name
 
     def is_provider_configured(self) -> bool:
         """Check if the payment provider is properly configured"""
-        try:
-            # Try to get provider name - this will fail if not configured
-            provider_name = self.payment_provider.get_provider_name()
-            return bool(provider_name)
-        except Exception:
-            return False
+        return self.payment_provider.is_configured()
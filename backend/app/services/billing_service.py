@@ -5,9 +5,10 @@ This service acts as a bridge between the application's business logic
 and the payment provider, handling data persistence and provider interactions.
 """
 
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, bindparam, select
 
 from app.services.payment.factory import get_payment_provider
 from app.services.payment.protocol import (
@@ -16,14 +17,89 @@ from app.services.payment.protocol import (
     WebhookEvent,
     PaymentProviderError,
 )
+from app.services.billing.customer_service import CustomerService
+from app.services.billing.subscription_service import SubscriptionService
+from app.services.billing.webhook_service import (
+    billing_event_row,
+    insert_billing_event,
+)
 from app.db import models
 from app.core.config import settings
 import logging
+import threading
+import time
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
+# org_id -> metered subscription item ID. Metered usage is reported on every
+# agent invocation while subscriptions rarely change, so skip the lookup for
+# a short while; webhook and cancel paths evict the org's entry.
+USAGE_ITEM_CACHE_TTL_SECONDS = 60
+USAGE_ITEM_CACHE_MAX_SIZE = 10000
+
+_usage_item_cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+_usage_item_cache_lock = threading.Lock()
+
+
+def _get_cached_usage_item(org_id: str) -> Optional[str]:
+    with _usage_item_cache_lock:
+        entry = _usage_item_cache.get(org_id)
+        if entry is None:
+            return None
+        item_id, expires_at = entry
+        if expires_at < time.monotonic():
+            del _usage_item_cache[org_id]
+            return None
+        _usage_item_cache.move_to_end(org_id)
+        return item_id
+
+
+def _cache_usage_item(org_id: str, item_id: str) -> None:
+    with _usage_item_cache_lock:
+        _usage_item_cache[org_id] = (
+            item_id,
+            time.monotonic() + USAGE_ITEM_CACHE_TTL_SECONDS,
+        )
+        _usage_item_cache.move_to_end(org_id)
+        while len(_usage_item_cache) > USAGE_ITEM_CACHE_MAX_SIZE:
+            _usage_item_cache.popitem(last=False)
+
+
+def _evict_usage_item(org_id: Optional[str]) -> None:
+    with _usage_item_cache_lock:
+        _usage_item_cache.pop(org_id, None)
+
+
+# Built once at import; per-call code only supplies the bound parameters
+_CUSTOMER_BY_ORG = (
+    select(models.BillingCustomer)
+    .where(models.BillingCustomer.org_id == bindparam("org_id"))
+    .limit(1)
+)
+_SUBSCRIPTION_BY_EXTERNAL_ID = (
+    select(models.BillingSubscription)
+    .where(
+        models.BillingSubscription.external_subscription_id == bindparam("external_id")
+    )
+    .limit(1)
+)
+_ACTIVE_SUBSCRIPTION_FOR_ORG = (
+    select(models.BillingSubscription)
+    .join(
+        models.BillingCustomer,
+        models.BillingSubscription.customer_id == models.BillingCustomer.id,
+    )
+    .where(
+        and_(
+            models.BillingCustomer.org_id == bindparam("org_id"),
+            models.BillingSubscription.status.in_(["active", "trialing"]),
+        )
+    )
+    .limit(1)
+)
+
 
 class BillingService:
     """
@@ -36,6 +112,11 @@ class BillingService:
     def __init__(self, db: Session, payment_provider: Optional[PaymentProvider] = None):
         self.db = db
         self.payment_provider = payment_provider or get_payment_provider()
+        self._provider_name = self.payment_provider.get_provider_name()
+        self.customer_service = CustomerService(db, self.payment_provider)
+        self.subscription_service = SubscriptionService(db, self.payment_provider)
+        # org_id -> BillingCustomer, memoized for this request's session
+        self._customer_cache: Dict[str, models.BillingCustomer] = {}
 
     async def create_customer_for_org(
         self, org_id: str, email: str, name: Optional[str] = None
@@ -59,9 +140,9 @@ class BillingService:
 
             # Create internal billing customer record
             billing_customer = models.BillingCustomer(
-                id=str(uuid.uuid4()),
+                id=uuid.uuid4().hex,
                 org_id=org_id,
-                provider=self.payment_provider.get_provider_name(),
+                provider=self._provider_name,
                 external_customer_id=provider_customer.id,
                 email=email,
                 name=name,
@@ -69,24 +150,26 @@ class BillingService:
             )
 
             self.db.add(billing_customer)
-            self.db.commit()
-            self.db.refresh(billing_customer)
 
             # Update org with customer reference (for backward compatibility)
-            org = self.db.query(models.Org).filter(models.Org.id == org_id).first()
+            org = self.db.get(models.Org, org_id)
             if org:
                 # Store provider-specific customer ID in org for backward compatibility
-                if self.payment_provider.get_provider_name() == "stripe":
+                if self._provider_name == "stripe":
                     # Back-compat placeholder: store stripe customer on org if field
                     # exists
                     try:
                         org.stripe_customer_id = provider_customer.id
                     except Exception:
                         pass
-                self.db.commit()
+
+            # Customer row and org back-reference land in one transaction
+            self.db.commit()
+            self.db.refresh(billing_customer)
+            self._customer_cache[org_id] = billing_customer
 
             logger.info(
-                f"Created billing customer for org {org_id} with provider {self.payment_provider.get_provider_name()}"
+                f"Created billing customer for org {org_id} with provider {self._provider_name}"
             )
             return billing_customer
 
@@ -103,11 +186,14 @@ class BillingService:
         self, org_id: str
     ) -> Optional[models.BillingCustomer]:
         """Get billing customer for an organization"""
-        return (
-            self.db.query(models.BillingCustomer)
-            .filter(models.BillingCustomer.org_id == org_id)
-            .first()
-        )
+        billing_customer = self._customer_cache.get(org_id)
+        if billing_customer is not None:
+            return billing_customer
+
+        billing_customer = self.db.scalars(_CUSTOMER_BY_ORG, {"org_id": org_id}).first()
+        if billing_customer is not None:
+            self._customer_cache[org_id] = billing_customer
+        return billing_customer
 
     async def create_checkout_session(
         self, org_id: str, plan_id: str, success_url: str, cancel_url: str
@@ -128,7 +214,7 @@ class BillingService:
         billing_customer = await self.get_customer_by_org(org_id)
         if not billing_customer:
             # Get org details to create customer
-            org = self.db.query(models.Org).filter(models.Org.id == org_id).first()
+            org = self.db.get(models.Org, org_id)
             if not org:
                 raise ValueError(f"Organization {org_id} not found")
 
@@ -174,42 +260,29 @@ class BillingService:
                 secret=settings.STRIPE_WEBHOOK_SECRET,  # TODO: Make this provider-agnostic
             )
 
-            # Log the event
-            await self._log_billing_event(event)
+            # Logging the event claims it; redeliveries stop here. This has to
+            # finish before dispatch, so the two are not run concurrently.
+            if not await self._log_billing_event(event):
+                logger.info(f"Skipping already processed webhook event {event.id}")
+                return True
 
-            # Process event based on type
-            if event.type.startswith("customer.subscription."):
-                await self._handle_subscription_event(event)
-            elif event.type.startswith("invoice."):
-                await self._handle_invoice_event(event)
-            elif event.type.startswith("customer."):
-                await self._handle_customer_event(event)
+            await self._dispatch_event(event)
 
+            # The audit row and the handler's writes commit together
+            self.db.commit()
             logger.info(f"Processed webhook event {event.id} of type {event.type}")
             return True
 
         except Exception as e:
             logger.error(f"Failed to process webhook event: {e}")
+            self.db.rollback()
             return False
 
     async def get_subscription_for_org(
         self, org_id: str
     ) -> Optional[models.BillingSubscription]:
         """Get active subscription for an organization"""
-        billing_customer = await self.get_customer_by_org(org_id)
-        if not billing_customer:
-            return None
-
-        return (
-            self.db.query(models.BillingSubscription)
-            .filter(
-                and_(
-                    models.BillingSubscription.customer_id == billing_customer.id,
-                    models.BillingSubscription.status.in_(["active", "trialing"]),
-                )
-            )
-            .first()
-        )
+        return self.db.scalars(_ACTIVE_SUBSCRIPTION_FOR_ORG, {"org_id": org_id}).first()
 
     async def cancel_subscription_for_org(self, org_id: str) -> bool:
         """Cancel subscription for an organization"""
@@ -225,8 +298,9 @@ class BillingService:
 
             # Update local record
             subscription.status = "canceled"
-            subscription.updated_at = datetime.utcnow()
+            subscription.updated_at = datetime.now(timezone.utc)
             self.db.commit()
+            _evict_usage_item(org_id)
 
             logger.info(f"Canceled subscription for org {org_id}")
             return True
@@ -238,12 +312,13 @@ class BillingService:
 
     async def record_usage(self, org_id: str, quantity: int) -> bool:
         """Record usage for metered billing"""
-        subscription = await self.get_subscription_for_org(org_id)
-        if not subscription:
-            logger.warning(f"No active subscription found for org {org_id}")
-            return False
+        subscription_item_id = _get_cached_usage_item(org_id)
+        if subscription_item_id is None:
+            subscription = await self.get_subscription_for_org(org_id)
+            if not subscription:
+                logger.warning(f"No active subscription found for org {org_id}")
+                return False
 
-        try:
             # TODO: Get subscription item ID for metered billing
             # This would need to be stored in the subscription record
             subscription_item_id = (subscription.metadata_json or {}).get(
@@ -253,7 +328,9 @@ class BillingService:
             if not subscription_item_id:
                 logger.warning(f"No metered item ID found for org {org_id}")
                 return False
+            _cache_usage_item(org_id, subscription_item_id)
 
+        try:
             await self.payment_provider.create_usage_record(
                 subscription_item_id=subscription_item_id, quantity=quantity
             )
@@ -267,25 +344,22 @@ class BillingService:
 
     # Private helper methods
 
-    async def _log_billing_event(self, event: WebhookEvent):
-        """Log billing event to database"""
+    async def _log_billing_event(self, event: WebhookEvent) -> bool:
+        """Log billing event to database, returning False if already logged"""
         # Extract org_id from event metadata
         org_id = None
         if event.data.get("object", {}).get("metadata"):
             org_id = event.data["object"]["metadata"].get("org_id")
 
-        billing_event = models.BillingEvent(
-            id=str(uuid.uuid4()),
-            org_id=org_id,
-            event_type=event.type,
-            provider=event.provider,
-            external_event_id=event.id,
-            metadata_json=event.data,
-            processed_at=datetime.utcnow(),
-        )
+        # The unique (provider, external_event_id) index makes this the claim;
+        # the caller commits it together with the event's own writes
+        return insert_billing_event(self.db, billing_event_row(event, org_id))
 
-        self.db.add(billing_event)
-        self.db.commit()
+    async def _dispatch_event(self, event: WebhookEvent):
+        """Route a claimed event to its handler based on type"""
+        handler = self._HANDLERS.get(event.type.rpartition(".")[0])
+        if handler:
+            await handler(self, event)
 
     async def _handle_subscription_event(self, event: WebhookEvent):
         """Handle subscription-related webhook events"""
@@ -296,11 +370,9 @@ class BillingService:
             logger.warning(f"No customer ID in subscription event {event.id}")
             return
 
-        # Find billing customer
-        billing_customer = (
-            self.db.query(models.BillingCustomer)
-            .filter(models.BillingCustomer.external_customer_id == customer_id)
-            .first()
+        # Find billing customer; unknown IDs are negatively cached there
+        billing_customer = await self.customer_service.get_customer_by_external_id(
+            customer_id
         )
 
         if not billing_customer:
@@ -308,16 +380,9 @@ class BillingService:
             return
 
         # Handle different subscription events
-        if event.type == "customer.subscription.created":
-            await self._create_or_update_subscription(
-                billing_customer, subscription_data
-            )
-        elif event.type == "customer.subscription.updated":
-            await self._create_or_update_subscription(
-                billing_customer, subscription_data
-            )
-        elif event.type == "customer.subscription.deleted":
-            await self._cancel_subscription(billing_customer, subscription_data)
+        action = self._SUBSCRIPTION_ACTIONS.get(event.type)
+        if action:
+            await action(self, billing_customer, subscription_data)
 
     async def _create_or_update_subscription(
         self,
@@ -325,51 +390,12 @@ class BillingService:
         subscription_data: Dict[str, Any],
     ):
         """Create or update subscription record"""
-        subscription_id = subscription_data.get("id")
-
-        # Check if subscription already exists
-        existing = (
-            self.db.query(models.BillingSubscription)
-            .filter(
-                models.BillingSubscription.external_subscription_id == subscription_id
-            )
-            .first()
+        _evict_usage_item(billing_customer.org_id)
+        # One INSERT ... ON CONFLICT DO UPDATE on Postgres; committed by the caller
+        await self.subscription_service.create_or_update_subscription(
+            billing_customer.id, subscription_data, commit=False
         )
 
-        if existing:
-            # Update existing subscription
-            existing.status = subscription_data.get("status", "active")
-            existing.current_period_start = datetime.fromtimestamp(
-                subscription_data.get("current_period_start", 0)
-            )
-            existing.current_period_end = datetime.fromtimestamp(
-                subscription_data.get("current_period_end", 0)
-            )
-            existing.metadata_json = subscription_data.get("metadata", {})
-            existing.updated_at = datetime.utcnow()
-        else:
-            # Create new subscription
-            subscription = models.BillingSubscription(
-                id=str(uuid.uuid4()),
-                customer_id=billing_customer.id,
-                external_subscription_id=subscription_id,
-                plan_id=subscription_data.get("items", {})
-                .get("data", [{}])[0]
-                .get("price", {})
-                .get("id", ""),
-                status=subscription_data.get("status", "active"),
-                current_period_start=datetime.fromtimestamp(
-                    subscription_data.get("current_period_start", 0)
-                ),
-                current_period_end=datetime.fromtimestamp(
-                    subscription_data.get("current_period_end", 0)
-                ),
-                metadata_json=subscription_data.get("metadata", {}),
-            )
-            self.db.add(subscription)
-
-        self.db.commit()
-
     async def _cancel_subscription(
         self,
         billing_customer: models.BillingCustomer,
@@ -378,18 +404,14 @@ class BillingService:
         """Cancel subscription record"""
         subscription_id = subscription_data.get("id")
 
-        subscription = (
-            self.db.query(models.BillingSubscription)
-            .filter(
-                models.BillingSubscription.external_subscription_id == subscription_id
-            )
-            .first()
-        )
+        subscription = self.db.scalars(
+            _SUBSCRIPTION_BY_EXTERNAL_ID, {"external_id": subscription_id}
+        ).first()
 
         if subscription:
             subscription.status = "canceled"
-            subscription.updated_at = datetime.utcnow()
-            self.db.commit()
+            subscription.updated_at = datetime.now(timezone.utc)
+            _evict_usage_item(billing_customer.org_id)
 
     async def _handle_invoice_event(self, event: WebhookEvent):
         """Handle invoice-related webhook events"""
@@ -400,3 +422,18 @@ class BillingService:
         """Handle customer-related webhook events"""
         # TODO: Implement customer event handling
         logger.info(f"Customer event {event.type} received but not yet implemented")
+
+    # Webhook routing, same shape as WebhookService; entries take self explicitly
+
+    # Event type minus its last segment -> handler
+    _HANDLERS = {
+        "customer.subscription": _handle_subscription_event,
+        "invoice": _handle_invoice_event,
+        "customer": _handle_customer_event,
+    }
+    # Exact subscription event type -> action
+    _SUBSCRIPTION_ACTIONS = {
+        "customer.subscription.created": _create_or_update_subscription,
+        "customer.subscription.updated": _create_or_update_subscription,
+        "customer.subscription.deleted": _cancel_subscription,
+    }
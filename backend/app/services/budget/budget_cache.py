@@ -0,0 +1,299 @@
+"""
+Process-local cache of active budgets.
+
+Budget checks run before every metered call, so each worker keeps a
+short-lived snapshot of the active budgets per (org, agent). Usage recorded
+by this worker is added to the snapshots as it is written; usage recorded
+elsewhere shows up once the entry expires. Hard budgets are the exception:
+their usage is re-read by primary key before every check, so usage from
+other workers can never slip past a blocking limit.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, select, update
+from sqlalchemy.orm import Session
+
+from app.db import models
+
+BUDGET_CACHE_TTL_SECONDS = 30
+BUDGET_CACHE_MAX_SIZE = 4096
+
+BudgetKey = Tuple[str, Optional[str]]
+
+# Columns a snapshot is built from; selecting just these as plain rows skips
+# ORM instance construction on every load
+SNAPSHOT_COLUMNS = (
+    models.Budget.id,
+    models.Budget.org_id,
+    models.Budget.agent_id,
+    models.Budget.period,
+    models.Budget.limit_cents,
+    models.Budget.current_usage_cents,
+    models.Budget.enforcement_mode,
+    models.Budget.status,
+    models.Budget.period_end,
+)
+
+
+@dataclass
+class BudgetSnapshot:
+    """Copy of the budget fields needed for enforcement"""
+
+    id: str
+    org_id: str
+    agent_id: Optional[str]
+    period: str
+    limit_cents: int
+    current_usage_cents: int
+    enforcement_mode: str
+    status: str
+
+    @classmethod
+    def from_model(cls, budget: Any) -> "BudgetSnapshot":
+        """Build from a Budget instance or a row of SNAPSHOT_COLUMNS"""
+        return cls(
+            id=budget.id,
+            org_id=budget.org_id,
+            agent_id=budget.agent_id,
+            period=budget.period,
+            limit_cents=budget.limit_cents,
+            current_usage_cents=budget.current_usage_cents,
+            enforcement_mode=budget.enforcement_mode,
+            status=budget.status,
+        )
+
+
+_budget_cache: "OrderedDict[BudgetKey, Tuple[List[BudgetSnapshot], float]]" = (
+    OrderedDict()
+)
+_budget_cache_lock = threading.Lock()
+
+# Most orgs configure no budgets at all; remembering that per org lets checks
+# for any of their agents skip the database
+_org_has_budgets: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+
+
+def org_has_active_budgets(db: Session, org_id: str, now: datetime) -> bool:
+    """
+    Whether the org has any budget in force, cached per org.
+
+    Args:
+        db: Session to query on a cache miss
+        org_id: Organization ID
+        now: Current time
+
+    Returns:
+        True if any active or exceeded budget covers now
+    """
+    with _budget_cache_lock:
+        entry = _org_has_budgets.get(org_id)
+        if entry is not None and entry[1] >= time.monotonic():
+            _org_has_budgets.move_to_end(org_id)
+            return entry[0]
+
+    has_budgets = (
+        db.scalar(
+            select(models.Budget.id)
+            .where(
+                models.Budget.org_id == org_id,
+                models.Budget.status.in_(["active", "exceeded"]),
+                models.Budget.period_start <= now,
+                models.Budget.period_end > now,
+            )
+            .limit(1)
+        )
+        is not None
+    )
+
+    with _budget_cache_lock:
+        _org_has_budgets[org_id] = (
+            has_budgets,
+            time.monotonic() + BUDGET_CACHE_TTL_SECONDS,
+        )
+        _org_has_budgets.move_to_end(org_id)
+        while len(_org_has_budgets) > BUDGET_CACHE_MAX_SIZE:
+            _org_has_budgets.popitem(last=False)
+    return has_budgets
+
+
+def get_cached_budgets(
+    org_id: str, agent_ids: List[Optional[str]]
+) -> Optional[List[BudgetSnapshot]]:
+    """
+    Return the cached budgets for each (org, agent) in order.
+
+    Args:
+        org_id: Organization ID
+        agent_ids: Agent IDs to look up (None for org-level budgets)
+
+    Returns:
+        Snapshots for all requested keys, or None if any of them is missing
+    """
+    now = time.monotonic()
+    budgets = []
+    with _budget_cache_lock:
+        for agent_id in agent_ids:
+            key = (org_id, agent_id)
+            entry = _budget_cache.get(key)
+            if entry is None:
+                return None
+            if entry[1] < now:
+                del _budget_cache[key]
+                return None
+            _budget_cache.move_to_end(key)
+            budgets.extend(entry[0])
+    return budgets
+
+
+def _as_naive_utc(value: datetime) -> datetime:
+    """Drop tzinfo after converting to UTC; Postgres returns aware values"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def cache_budgets(
+    org_id: str,
+    agent_ids: List[Optional[str]],
+    budgets: Iterable[Any],
+    now: datetime,
+) -> List[BudgetSnapshot]:
+    """
+    Snapshot freshly loaded budgets and cache them per (org, agent).
+
+    Args:
+        org_id: Organization ID
+        agent_ids: Agent IDs the budgets were loaded for
+        budgets: Active budgets (rows of SNAPSHOT_COLUMNS) just read
+        now: Time the budgets were loaded for
+
+    Returns:
+        The cached snapshots, grouped in agent_ids order
+    """
+    now = _as_naive_utc(now)
+    grouped = {agent_id: [] for agent_id in agent_ids}
+    ttls = {agent_id: float(BUDGET_CACHE_TTL_SECONDS) for agent_id in agent_ids}
+    for budget in budgets:
+        grouped[budget.agent_id].append(BudgetSnapshot.from_model(budget))
+        # An entry never outlives the period of a budget it holds
+        if budget.period_end is not None:
+            remaining = _as_naive_utc(budget.period_end) - now
+            ttls[budget.agent_id] = min(
+                ttls[budget.agent_id], remaining.total_seconds()
+            )
+
+    loaded_at = time.monotonic()
+    with _budget_cache_lock:
+        for agent_id, snapshots in grouped.items():
+            key = (org_id, agent_id)
+            _budget_cache[key] = (snapshots, loaded_at + ttls[agent_id])
+            _budget_cache.move_to_end(key)
+        while len(_budget_cache) > BUDGET_CACHE_MAX_SIZE:
+            _budget_cache.popitem(last=False)
+    return [budget for agent_id in agent_ids for budget in grouped[agent_id]]
+
+
+def refresh_hard_budgets(
+    db: Session, budgets: List[BudgetSnapshot], statuses: List[str]
+) -> List[BudgetSnapshot]:
+    """
+    Re-read the usage of cached hard budgets by primary key.
+
+    Soft budgets only warn, so their snapshots are trusted until they expire.
+
+    Args:
+        db: Session to query
+        budgets: Cached snapshots, updated in place
+        statuses: Budget statuses still in force
+
+    Returns:
+        The budgets, minus hard ones that are no longer in force
+    """
+    hard = {
+        budget.id: budget for budget in budgets if budget.enforcement_mode == "hard"
+    }
+    if not hard:
+        return budgets
+
+    rows = db.execute(
+        select(
+            models.Budget.id,
+            models.Budget.limit_cents,
+            models.Budget.current_usage_cents,
+            models.Budget.status,
+        ).where(models.Budget.id.in_(list(hard)), models.Budget.status.in_(statuses))
+    ).all()
+
+    in_force = set()
+    with _budget_cache_lock:
+        for row in rows:
+            budget = hard[row.id]
+            budget.limit_cents = row.limit_cents
+            budget.current_usage_cents = row.current_usage_cents
+            budget.status = row.status
+            in_force.add(row.id)
+    return [
+        budget for budget in budgets if budget.id not in hard or budget.id in in_force
+    ]
+
+
+def add_usage(
+    db: Session,
+    budgets: List[BudgetSnapshot],
+    cost_cents: int,
+    statuses: List[str],
+) -> None:
+    """
+    Add usage to budgets in the database and in their cached snapshots.
+
+    The increment and the exceeded check run inside a single UPDATE, so
+    concurrent workers never overwrite each other's usage.
+
+    Args:
+        db: Session to execute the UPDATE in (the caller commits)
+        budgets: Budgets the usage counts against
+        cost_cents: Cost in cents to add
+        statuses: Budget statuses still allowed to accrue usage
+    """
+    new_usage = models.Budget.current_usage_cents + cost_cents
+    db.execute(
+        update(models.Budget)
+        .where(
+            models.Budget.id.in_([budget.id for budget in budgets]),
+            models.Budget.status.in_(statuses),
+        )
+        .values(
+            current_usage_cents=new_usage,
+            status=case(
+                (new_usage > models.Budget.limit_cents, "exceeded"),
+                else_=models.Budget.status,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    with _budget_cache_lock:
+        for budget in budgets:
+            budget.current_usage_cents += cost_cents
+            if budget.current_usage_cents > budget.limit_cents:
+                budget.status = "exceeded"
+
+
+def evict_budgets(org_id: str, agent_id: Optional[str]) -> None:
+    """Drop the cached budgets for (org, agent) after a budget changes"""
+    with _budget_cache_lock:
+        _budget_cache.pop((org_id, agent_id), None)
+        _org_has_budgets.pop(org_id, None)
+
+
+def clear_budget_cache() -> None:
+    """Drop every cached budget"""
+    with _budget_cache_lock:
+        _budget_cache.clear()
+        _org_has_budgets.clear()
@@ -5,13 +5,24 @@ This service handles budget validation, enforcement, and alerting
 to ensure spending limits are respected.
 """
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, case, or_, select, update
+from sqlalchemy.engine import Row
 from datetime import datetime
 from enum import Enum
 
 from app.db import models
+from app.services.budget.budget_cache import (
+    SNAPSHOT_COLUMNS,
+    BudgetSnapshot,
+    add_usage,
+    cache_budgets,
+    evict_budgets,
+    get_cached_budgets,
+    org_has_active_budgets,
+    refresh_hard_budgets,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -44,6 +55,27 @@ class BudgetExceededException(Exception):
         )
 
 
+def _agent_filter(agent_ids: List[Optional[str]]):
+    """Match budgets for any of the agent IDs; None matches org-level budgets"""
+    clauses = []
+    named = [agent_id for agent_id in agent_ids if agent_id is not None]
+    if named:
+        clauses.append(models.Budget.agent_id.in_(named))
+    if None in agent_ids:
+        clauses.append(models.Budget.agent_id.is_(None))
+    return or_(*clauses)
+
+
+def _warning_filter(warning_threshold: float):
+    """Match active budgets whose utilization has reached the threshold"""
+    return and_(
+        models.Budget.status == BudgetStatus.ACTIVE.value,
+        models.Budget.limit_cents > 0,
+        models.Budget.current_usage_cents
+        >= models.Budget.limit_cents * warning_threshold,
+    )
+
+
 class BudgetEnforcementService:
     """Service for budget enforcement and validation"""
 
@@ -51,7 +83,11 @@ class BudgetEnforcementService:
         self.db = db
 
     def check_budget_before_usage(
-        self, org_id: str, estimated_cost_cents: int, agent_id: Optional[str] = None
+        self,
+        org_id: str,
+        estimated_cost_cents: int,
+        agent_id: Optional[str] = None,
+        now: Optional[datetime] = None,
     ) -> bool:
         """
         Check if usage would exceed budget limits.
@@ -60,6 +96,8 @@ class BudgetEnforcementService:
             org_id: Organization ID
             estimated_cost_cents: Estimated cost of the operation
             agent_id: Agent ID (if applicable)
+            now: Time to check at; pass the caller's so one request uses one
+                timestamp (defaults to the current UTC time)
 
         Returns:
             True if usage is allowed, False if blocked by hard budget
@@ -67,27 +105,11 @@ class BudgetEnforcementService:
         Raises:
             BudgetExceededException: If hard budget would be exceeded
         """
-        now = datetime.utcnow()
+        now = now or datetime.utcnow()
 
-        # Check agent-level budget first (if applicable)
-        if agent_id:
-            agent_budgets = self._get_active_budgets(org_id, agent_id, now)
-            for budget in agent_budgets:
-                if self._would_exceed_budget(budget, estimated_cost_cents):
-                    if budget.enforcement_mode == EnforcementMode.HARD.value:
-                        raise BudgetExceededException(
-                            budget.id,
-                            budget.limit_cents,
-                            budget.current_usage_cents + estimated_cost_cents,
-                        )
-                    else:
-                        logger.warning(
-                            f"Soft budget limit exceeded for budget {budget.id}"
-                        )
-
-        # Check org-level budgets
-        org_budgets = self._get_active_budgets(org_id, None, now)
-        for budget in org_budgets:
+        # Agent-level budgets come first (if applicable), then org-level ones
+        budgets = self._get_active_budgets(org_id, agent_id, now, revalidate_hard=True)
+        for budget in budgets:
             if self._would_exceed_budget(budget, estimated_cost_cents):
                 if budget.enforcement_mode == EnforcementMode.HARD.value:
                     raise BudgetExceededException(
@@ -101,8 +123,13 @@ class BudgetEnforcementService:
         return True
 
     def update_budgets_for_usage(
-        self, org_id: str, cost_cents: int, agent_id: Optional[str] = None
-    ) -> List[models.Budget]:
+        self,
+        org_id: str,
+        cost_cents: int,
+        agent_id: Optional[str] = None,
+        commit: bool = True,
+        now: Optional[datetime] = None,
+    ) -> List[BudgetSnapshot]:
         """
         Update budget usage counters after usage is recorded.
 
@@ -110,32 +137,24 @@ class BudgetEnforcementService:
             org_id: Organization ID
             cost_cents: Cost in cents to add to budgets
             agent_id: Agent ID (if applicable)
+            commit: Commit the update; pass False to commit with other writes
+            now: Time the usage happened (defaults to the current UTC time)
 
         Returns:
-            List of updated budgets
+            Snapshots of the updated budgets
         """
-        now = datetime.utcnow()
-        updated_budgets = []
-
-        # Update agent-level budgets
-        if agent_id:
-            agent_budgets = self._get_active_budgets(org_id, agent_id, now)
-            for budget in agent_budgets:
-                budget.current_usage_cents += cost_cents
-                if budget.current_usage_cents > budget.limit_cents:
-                    budget.status = BudgetStatus.EXCEEDED.value
-                updated_budgets.append(budget)
-
-        # Update org-level budgets
-        org_budgets = self._get_active_budgets(org_id, None, now)
-        for budget in org_budgets:
-            budget.current_usage_cents += cost_cents
-            if budget.current_usage_cents > budget.limit_cents:
-                budget.status = BudgetStatus.EXCEEDED.value
-            updated_budgets.append(budget)
+        now = now or datetime.utcnow()
+        updated_budgets = self._get_active_budgets(org_id, agent_id, now)
 
         if updated_budgets:
-            self.db.commit()
+            add_usage(
+                self.db,
+                updated_budgets,
+                cost_cents,
+                [BudgetStatus.ACTIVE.value, BudgetStatus.EXCEEDED.value],
+            )
+            if commit:
+                self.db.commit()
             logger.info(f"Updated {len(updated_budgets)} budgets for org {org_id}")
 
         return updated_budgets
@@ -183,30 +202,81 @@ class BudgetEnforcementService:
             List of budget warning information
         """
         now = datetime.utcnow()
-        budgets = self._get_active_budgets(org_id, agent_id, now)
+        stmt = select(*SNAPSHOT_COLUMNS).where(
+            models.Budget.org_id == org_id,
+            _agent_filter([agent_id]),
+            _warning_filter(warning_threshold),
+            models.Budget.period_start <= now,
+            models.Budget.period_end > now,
+        )
 
-        warnings = []
-        for budget in budgets:
-            if budget.limit_cents > 0:
-                utilization = budget.current_usage_cents / budget.limit_cents
-                if (
-                    utilization >= warning_threshold
-                    and budget.status != BudgetStatus.EXCEEDED.value
-                ):
-                    warnings.append(
-                        {
-                            "budget_id": budget.id,
-                            "budget_name": f"{'Agent' if budget.agent_id else 'Organization'} {budget.period} budget",
-                            "agent_id": budget.agent_id,
-                            "utilization_percent": utilization * 100,
-                            "current_usage_cents": budget.current_usage_cents,
-                            "limit_cents": budget.limit_cents,
-                            "remaining_cents": budget.limit_cents
-                            - budget.current_usage_cents,
-                            "enforcement_mode": budget.enforcement_mode,
-                        }
-                    )
+        return [
+            self._warning_info(budget, budget.current_usage_cents / budget.limit_cents)
+            for budget in self.db.execute(stmt)
+        ]
+
+    def get_all_budget_violations(
+        self, batch_size: int = 1000
+    ) -> Dict[str, List[models.Budget]]:
+        """
+        Get exceeded budgets for every organization in one query.
+
+        Args:
+            batch_size: Rows fetched per round-trip while streaming results
+
+        Returns:
+            Mapping of org_id to its exceeded budgets
+        """
+        query = (
+            self.db.query(models.Budget)
+            .join(models.Org, models.Org.id == models.Budget.org_id)
+            .filter(models.Budget.status == BudgetStatus.EXCEEDED.value)
+            .order_by(models.Budget.org_id)
+            .yield_per(batch_size)
+        )
+
+        violations: Dict[str, List[models.Budget]] = {}
+        for budget in query:
+            violations.setdefault(budget.org_id, []).append(budget)
+        return violations
 
+    def get_all_budget_warnings(
+        self, warning_threshold: float = 0.8, batch_size: int = 1000
+    ) -> Dict[str, List[dict]]:
+        """
+        Get org-level budgets approaching their limits for every organization.
+
+        Same rules as get_budget_warnings, evaluated over a single query.
+
+        Args:
+            warning_threshold: Threshold percentage (0.8 = 80%)
+            batch_size: Rows fetched per round-trip while streaming results
+
+        Returns:
+            Mapping of org_id to its budget warning information
+        """
+        now = datetime.utcnow()
+        query = (
+            self.db.query(models.Budget)
+            .join(models.Org, models.Org.id == models.Budget.org_id)
+            .filter(
+                and_(
+                    models.Budget.agent_id.is_(None),
+                    _warning_filter(warning_threshold),
+                    models.Budget.period_start <= now,
+                    models.Budget.period_end > now,
+                )
+            )
+            .order_by(models.Budget.org_id)
+            .yield_per(batch_size)
+        )
+
+        warnings: Dict[str, List[dict]] = {}
+        for budget in query:
+            utilization = budget.current_usage_cents / budget.limit_cents
+            warnings.setdefault(budget.org_id, []).append(
+                self._warning_info(budget, utilization)
+            )
         return warnings
 
     def reset_budget_period(self, budget_id: str) -> Optional[models.Budget]:
@@ -219,45 +289,40 @@ class BudgetEnforcementService:
         Returns:
             Updated budget or None if not found
         """
-        budget = (
-            self.db.query(models.Budget).filter(models.Budget.id == budget_id).first()
-        )
-        if not budget:
-            return None
-
-        # Reset usage and status
-        budget.current_usage_cents = 0
-        budget.status = BudgetStatus.ACTIVE.value
-
-        # Update period dates based on budget period
-        from app.services.budget_service import BudgetPeriod
-        from datetime import timedelta
+        from app.services.budget_service import BudgetPeriod, calculate_period_bounds
 
+        # Bounds for every period type; the row's own period picks its pair,
+        # so the reset is a single UPDATE ... RETURNING
         now = datetime.utcnow()
-        if budget.period == BudgetPeriod.DAILY.value:
-            budget.period_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            budget.period_end = budget.period_start + timedelta(days=1)
-        elif budget.period == BudgetPeriod.WEEKLY.value:
-            days_since_monday = now.weekday()
-            budget.period_start = (now - timedelta(days=days_since_monday)).replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
-            budget.period_end = budget.period_start + timedelta(weeks=1)
-        elif budget.period == BudgetPeriod.MONTHLY.value:
-            budget.period_start = now.replace(
-                day=1, hour=0, minute=0, second=0, microsecond=0
+        bounds = [
+            (period.value, calculate_period_bounds(now, period))
+            for period in BudgetPeriod
+        ]
+        stmt = (
+            update(models.Budget)
+            .where(models.Budget.id == budget_id)
+            .values(
+                current_usage_cents=0,
+                status=BudgetStatus.ACTIVE.value,
+                period_start=case(
+                    *[(models.Budget.period == p, start) for p, (start, _) in bounds],
+                    else_=models.Budget.period_start,
+                ),
+                period_end=case(
+                    *[(models.Budget.period == p, end) for p, (_, end) in bounds],
+                    else_=models.Budget.period_end,
+                ),
+                updated_at=now,
             )
-            if budget.period_start.month == 12:
-                budget.period_end = budget.period_start.replace(
-                    year=budget.period_start.year + 1, month=1
-                )
-            else:
-                budget.period_end = budget.period_start.replace(
-                    month=budget.period_start.month + 1
-                )
+            .returning(models.Budget)
+        )
+        budget = self.db.scalars(stmt).first()
+        if not budget:
+            return None
 
-        budget.updated_at = now
+        org_id, agent_id = budget.org_id, budget.agent_id
         self.db.commit()
+        evict_budgets(org_id, agent_id)
 
         logger.info(f"Reset budget period for budget {budget_id}")
         return budget
@@ -281,6 +346,7 @@ class BudgetEnforcementService:
         budget.status = BudgetStatus.DISABLED.value
         budget.updated_at = datetime.utcnow()
         self.db.commit()
+        evict_budgets(budget.org_id, budget.agent_id)
 
         logger.info(f"Disabled budget {budget_id}")
         return budget
@@ -295,9 +361,7 @@ class BudgetEnforcementService:
         Returns:
             Updated budget or None if not found
         """
-        budget = (
-            self.db.query(models.Budget).filter(models.Budget.id == budget_id).first()
-        )
+        budget = self._get_budget_for_update(budget_id)
         if not budget:
             return None
 
@@ -309,31 +373,95 @@ class BudgetEnforcementService:
 
         budget.updated_at = datetime.utcnow()
         self.db.commit()
+        evict_budgets(budget.org_id, budget.agent_id)
 
         logger.info(f"Enabled budget {budget_id}")
         return budget
 
     # Private helper methods
 
+    def _get_budget_for_update(self, budget_id: str) -> Optional[models.Budget]:
+        """
+        Load a budget with its row locked until the caller commits.
+
+        Usage updates add to current_usage_cents in SQL, so holding the lock
+        keeps one from landing between this read and the write that follows.
+        """
+        return (
+            self.db.query(models.Budget)
+            .filter(models.Budget.id == budget_id)
+            .with_for_update()
+            .first()
+        )
+
     def _get_active_budgets(
-        self, org_id: str, agent_id: Optional[str], now: datetime
-    ) -> List[models.Budget]:
-        """Get active budgets for the current period"""
-        query = self.db.query(models.Budget).filter(
-            and_(
-                models.Budget.org_id == org_id,
-                models.Budget.agent_id == agent_id,
-                models.Budget.status.in_(
-                    [BudgetStatus.ACTIVE.value, BudgetStatus.EXCEEDED.value]
-                ),
-                models.Budget.period_start <= now,
-                models.Budget.period_end > now,
-            )
+        self,
+        org_id: str,
+        agent_id: Optional[str],
+        now: datetime,
+        revalidate_hard: bool = False,
+    ) -> List[BudgetSnapshot]:
+        """
+        Get active budgets for the current period, from the cache when possible.
+
+        Args:
+            org_id: Organization ID
+            agent_id: Agent ID; its budgets come before the org-level ones
+            now: Current time
+            revalidate_hard: Re-read the usage of cached hard budgets, so a
+                check sees usage recorded by other workers
+
+        Returns:
+            Snapshots of the active budgets
+        """
+        if not org_has_active_budgets(self.db, org_id, now):
+            return []
+
+        agent_ids = [agent_id, None] if agent_id else [None]
+        budgets = get_cached_budgets(org_id, agent_ids)
+        if budgets is not None:
+            if revalidate_hard:
+                return refresh_hard_budgets(
+                    self.db,
+                    budgets,
+                    [BudgetStatus.ACTIVE.value, BudgetStatus.EXCEEDED.value],
+                )
+            return budgets
+
+        return cache_budgets(
+            org_id, agent_ids, self._load_active_budgets(org_id, agent_ids, now), now
         )
-        return query.all()
+
+    def _load_active_budgets(
+        self, org_id: str, agent_ids: List[Optional[str]], now: datetime
+    ) -> List[Row]:
+        """Load active budgets for the given agents (None for org-level)"""
+        stmt = select(*SNAPSHOT_COLUMNS).where(
+            models.Budget.org_id == org_id,
+            _agent_filter(agent_ids),
+            models.Budget.status.in_(
+                [BudgetStatus.ACTIVE.value, BudgetStatus.EXCEEDED.value]
+            ),
+            models.Budget.period_start <= now,
+            models.Budget.period_end > now,
+        )
+        return self.db.execute(stmt).all()
+
+    def _warning_info(self, budget: models.Budget, utilization: float) -> dict:
+        """Build the warning payload for a budget near its limit"""
+        return {
+            "budget_id": budget.id,
+            "budget_name": f"{'Agent' if budget.agent_id else 'Organization'} {budget.period} budget",
+            "agent_id": budget.agent_id,
+            "utilization_percent": utilization * 100,
+            "current_usage_cents": budget.current_usage_cents,
+            "limit_cents": budget.limit_cents,
+            "remaining_cents": budget.limit_cents - budget.current_usage_cents,
+            "enforcement_mode": budget.enforcement_mode,
+        }
 
     def _would_exceed_budget(
-        self, budget: models.Budget, additional_cost_cents: int
+        self, budget: BudgetSnapshot, additional_cost_cents: int
     ) -> bool:
         """Check if additional cost would exceed budget"""
         return (budget.current_usage_cents + additional_cost_cents) > budget.limit_cents
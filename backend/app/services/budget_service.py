@@ -7,16 +7,30 @@ and alerting for organizations and individual agents.
 
 from typing import Optional, List, Dict, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import func, insert
 from datetime import datetime, timedelta
 from enum import Enum
 
 from app.db import models
+from app.services.budget.budget_cache import evict_budgets
+from app.services.budget.budget_enforcement_service import (  # noqa: F401
+    BudgetEnforcementService,
+    BudgetExceededException,
+    BudgetStatus,
+    EnforcementMode,
+)
 import logging
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# Alert at 50%, 80%, 95% by email; tuples so the shared default can't be mutated
+_DEFAULT_ALERTS_CONFIG = {
+    "thresholds": (50, 80, 95),
+    "channels": ("email",),
+    "enabled": True,
+}
+
 
 class BudgetPeriod(Enum):
     """Budget period types"""
@@ -26,31 +40,38 @@ class BudgetPeriod(Enum):
     MONTHLY = "monthly"
 
 
-class EnforcementMode(Enum):
-    """Budget enforcement modes"""
-
-    SOFT = "soft"  # Warn but allow
-    HARD = "hard"  # Block when exceeded
-
-
-class BudgetStatus(Enum):
-    """Budget status"""
-
-    ACTIVE = "active"
-    EXCEEDED = "exceeded"
-    DISABLED = "disabled"
-
-
-class BudgetExceededException(Exception):
-    """Raised when a hard budget limit is exceeded"""
-
-    def __init__(self, budget_id: str, limit_cents: int, current_usage_cents: int):
-        self.budget_id = budget_id
-        self.limit_cents = limit_cents
-        self.current_usage_cents = current_usage_cents
-        super().__init__(
-            f"Budget {budget_id} exceeded: {current_usage_cents} > {limit_cents} cents"
+def calculate_period_bounds(
+    now: datetime, period: BudgetPeriod
+) -> tuple[datetime, datetime]:
+    """
+    Calculate the start and end of the budget period containing now.
+
+    Args:
+        now: Time within the period
+        period: Budget period (daily, weekly, monthly)
+
+    Returns:
+        Period start (inclusive) and end (exclusive)
+    """
+    if period == BudgetPeriod.DAILY:
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=1)
+    elif period == BudgetPeriod.WEEKLY:
+        days_since_monday = now.weekday()
+        start = (now - timedelta(days=days_since_monday)).replace(
+            hour=0, minute=0, second=0, microsecond=0
         )
+        end = start + timedelta(weeks=1)
+    elif period == BudgetPeriod.MONTHLY:
+        start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        if start.month == 12:
+            end = start.replace(year=start.year + 1, month=1)
+        else:
+            end = start.replace(month=start.month + 1)
+    else:
+        raise ValueError(f"Unsupported period: {period}")
+
+    return start, end
 
 
 class BudgetService:
@@ -58,6 +79,14 @@ class BudgetService:
 
     def __init__(self, db: Session):
         self.db = db
+        self._enforcement: Optional[BudgetEnforcementService] = None
+
+    @property
+    def enforcement(self) -> BudgetEnforcementService:
+        """Enforcement service that owns budget checks and usage counters"""
+        if self._enforcement is None:
+            self._enforcement = BudgetEnforcementService(self.db)
+        return self._enforcement
 
     def create_budget(
         self,
@@ -89,9 +118,9 @@ class BudgetService:
         # Default alerts configuration
         if alerts_config is None:
             alerts_config = {
-                "thresholds": [50, 80, 95],  # Alert at 50%, 80%, 95%
-                "channels": ["email"],  # Alert channels
-                "enabled": True,
+                "thresholds": list(_DEFAULT_ALERTS_CONFIG["thresholds"]),
+                "channels": list(_DEFAULT_ALERTS_CONFIG["channels"]),
+                "enabled": _DEFAULT_ALERTS_CONFIG["enabled"],
             }
 
         budget = models.Budget(
@@ -111,6 +140,7 @@ class BudgetService:
         self.db.add(budget)
         self.db.commit()
         self.db.refresh(budget)
+        evict_budgets(org_id, agent_id)
 
         logger.info(f"Created budget {budget.id} for org {org_id}, agent {agent_id}")
         return budget
@@ -141,6 +171,7 @@ class BudgetService:
         agent_id: Optional[str] = None,
         run_id: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
+        now: Optional[datetime] = None,
     ) -> models.UsageRecord:
         """
         Record usage and update relevant budgets.
@@ -153,6 +184,7 @@ class BudgetService:
             agent_id: Agent ID (if applicable)
             run_id: Run ID (if applicable)
             metadata: Additional metadata
+            now: Time the usage happened (defaults to the current UTC time)
 
         Returns:
             Created UsageRecord
@@ -160,79 +192,100 @@ class BudgetService:
         Raises:
             BudgetExceededException: If hard budget limit is exceeded
         """
-        # Create usage record
-        now = datetime.utcnow()
-        billing_period = now.strftime("%Y-%m")  # YYYY-MM format
-
-        usage_record = models.UsageRecord(
-            id=str(uuid.uuid4()),
+        (usage_record,) = self.record_usages(
             org_id=org_id,
+            usages=[
+                {
+                    "usage_type": usage_type,
+                    "quantity": quantity,
+                    "cost_cents": cost_cents,
+                    "metadata": metadata,
+                }
+            ],
             agent_id=agent_id,
             run_id=run_id,
-            usage_type=usage_type,
-            quantity=quantity,
-            cost_cents=cost_cents,
-            recorded_at=now,
-            billing_period=billing_period,
-            metadata_json=metadata or {},
+            now=now,
         )
+        return usage_record
+
+    def record_usages(
+        self,
+        org_id: str,
+        usages: List[Dict[str, Any]],
+        agent_id: Optional[str] = None,
+        run_id: Optional[str] = None,
+        now: Optional[datetime] = None,
+    ) -> List[models.UsageRecord]:
+        """
+        Record several usage types with one INSERT and one commit.
 
-        self.db.add(usage_record)
+        Args:
+            org_id: Organization ID
+            usages: Dicts with usage_type, quantity, cost_cents and metadata
+            agent_id: Agent ID (if applicable)
+            run_id: Run ID (if applicable)
+            now: Time the usage happened (defaults to the current UTC time)
 
-        # Update relevant budgets
-        self._update_budgets_for_usage(org_id, agent_id, cost_cents, now)
+        Returns:
+            Created UsageRecords, in the order given
+        """
+        if not usages:
+            return []
 
-        self.db.commit()
-        self.db.refresh(usage_record)
+        now = now or datetime.utcnow()
+        billing_period = now.strftime("%Y-%m")  # YYYY-MM format
 
-        logger.info(
-            f"Recorded usage: {usage_type} {quantity} units, ${cost_cents/100:.2f} for org {org_id}"
+        rows = [
+            {
+                "id": str(uuid.uuid4()),
+                "org_id": org_id,
+                "agent_id": agent_id,
+                "run_id": run_id,
+                "usage_type": usage["usage_type"],
+                "quantity": usage["quantity"],
+                "cost_cents": usage["cost_cents"],
+                "recorded_at": now,
+                "billing_period": billing_period,
+                "metadata_json": usage.get("metadata") or {},
+            }
+            for usage in usages
+        ]
+        self.db.execute(insert(models.UsageRecord), rows)
+
+        # Update relevant budgets once for the combined cost
+        total_cost_cents = sum(row["cost_cents"] for row in rows)
+        self.enforcement.update_budgets_for_usage(
+            org_id, total_cost_cents, agent_id, commit=False, now=now
         )
-        return usage_record
+
+        self.db.commit()
+
+        for row in rows:
+            logger.info(
+                f"Recorded usage: {row['usage_type']} {row['quantity']} units, "
+                f"${row['cost_cents']/100:.2f} for org {org_id}"
+            )
+        # Every column is set client-side, so the records need no refresh
+        return [models.UsageRecord(**row) for row in rows]
 
     def check_budget_before_usage(
-        self, org_id: str, estimated_cost_cents: int, agent_id: Optional[str] = None
+        self,
+        org_id: str,
+        estimated_cost_cents: int,
+        agent_id: Optional[str] = None,
+        now: Optional[datetime] = None,
     ) -> bool:
         """
         Check if usage would exceed budget limits.
 
-        Args:
-            org_id: Organization ID
-            estimated_cost_cents: Estimated cost of the operation
-            agent_id: Agent ID (if applicable)
-
-        Returns:
-            True if usage is allowed, False if blocked by hard budget
+        Delegates to BudgetEnforcementService.check_budget_before_usage.
 
         Raises:
             BudgetExceededException: If hard budget would be exceeded
         """
-        now = datetime.utcnow()
-
-        # Check agent-level budget first (if applicable)
-        if agent_id:
-            agent_budgets = self._get_active_budgets(org_id, agent_id, now)
-            for budget in agent_budgets:
-                if self._would_exceed_budget(budget, estimated_cost_cents):
-                    if budget.enforcement_mode == EnforcementMode.HARD.value:
-                        raise BudgetExceededException(
-                            budget.id,
-                            budget.limit_cents,
-                            budget.current_usage_cents + estimated_cost_cents,
-                        )
-
-        # Check org-level budgets
-        org_budgets = self._get_active_budgets(org_id, None, now)
-        for budget in org_budgets:
-            if self._would_exceed_budget(budget, estimated_cost_cents):
-                if budget.enforcement_mode == EnforcementMode.HARD.value:
-                    raise BudgetExceededException(
-                        budget.id,
-                        budget.limit_cents,
-                        budget.current_usage_cents + estimated_cost_cents,
-                    )
-
-        return True
+        return self.enforcement.check_budget_before_usage(
+            org_id, estimated_cost_cents, agent_id, now=now
+        )
 
     def update_budget(
         self,
@@ -257,6 +310,7 @@ class BudgetService:
 
         budget.updated_at = datetime.utcnow()
         self.db.commit()
+        evict_budgets(budget.org_id, budget.agent_id)
 
         logger.info(f"Updated budget {budget_id}")
         return budget
@@ -269,43 +323,44 @@ class BudgetService:
         period_end: Optional[datetime] = None,
     ) -> Dict[str, Any]:
         """Get usage summary for an organization or agent"""
-        query = self.db.query(models.UsageRecord).filter(
-            models.UsageRecord.org_id == org_id
-        )
+        record = models.UsageRecord
+        query = self.db.query(
+            record.usage_type,
+            func.sum(record.quantity),
+            func.sum(record.cost_cents),
+            func.count(record.id),
+        ).filter(record.org_id == org_id)
 
         if agent_id:
-            query = query.filter(models.UsageRecord.agent_id == agent_id)
+            query = query.filter(record.agent_id == agent_id)
 
         if period_start:
-            query = query.filter(models.UsageRecord.recorded_at >= period_start)
+            query = query.filter(record.recorded_at >= period_start)
 
         if period_end:
-            query = query.filter(models.UsageRecord.recorded_at <= period_end)
+            query = query.filter(record.recorded_at <= period_end)
 
-        usage_records = query.all()
+        # Aggregate usage by type in the database
+        rows = query.group_by(record.usage_type).all()
 
-        # Aggregate usage by type
         usage_by_type = {}
         total_cost_cents = 0
+        record_count = 0
 
-        for record in usage_records:
-            if record.usage_type not in usage_by_type:
-                usage_by_type[record.usage_type] = {
-                    "quantity": 0,
-                    "cost_cents": 0,
-                    "count": 0,
-                }
-
-            usage_by_type[record.usage_type]["quantity"] += record.quantity
-            usage_by_type[record.usage_type]["cost_cents"] += record.cost_cents
-            usage_by_type[record.usage_type]["count"] += 1
-            total_cost_cents += record.cost_cents
+        for usage_type, quantity, cost_cents, count in rows:
+            usage_by_type[usage_type] = {
+                "quantity": int(quantity or 0),
+                "cost_cents": int(cost_cents or 0),
+                "count": count,
+            }
+            total_cost_cents += int(cost_cents or 0)
+            record_count += count
 
         return {
             "total_cost_cents": total_cost_cents,
             "total_cost_dollars": total_cost_cents / 100,
             "usage_by_type": usage_by_type,
-            "record_count": len(usage_records),
+            "record_count": record_count,
             "period_start": period_start.isoformat() if period_start else None,
             "period_end": period_end.isoformat() if period_end else None,
         }
@@ -316,62 +371,4 @@ class BudgetService:
         self, now: datetime, period: BudgetPeriod
     ) -> tuple[datetime, datetime]:
         """Calculate period start and end dates"""
-        if period == BudgetPeriod.DAILY:
-            start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            end = start + timedelta(days=1)
-        elif period == BudgetPeriod.WEEKLY:
-            days_since_monday = now.weekday()
-            start = (now - timedelta(days=days_since_monday)).replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
-            end = start + timedelta(weeks=1)
-        elif period == BudgetPeriod.MONTHLY:
-            start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            if start.month == 12:
-                end = start.replace(year=start.year + 1, month=1)
-            else:
-                end = start.replace(month=start.month + 1)
-        else:
-            raise ValueError(f"Unsupported period: {period}")
-
-        return start, end
-
-    def _get_active_budgets(
-        self, org_id: str, agent_id: Optional[str], now: datetime
-    ) -> List[models.Budget]:
-        """Get active budgets for the current period"""
-        query = self.db.query(models.Budget).filter(
-            and_(
-                models.Budget.org_id == org_id,
-                models.Budget.agent_id == agent_id,
-                models.Budget.status == BudgetStatus.ACTIVE.value,
-                models.Budget.period_start <= now,
-                models.Budget.period_end > now,
-            )
-        )
-        return query.all()
-
-    def _would_exceed_budget(
-        self, budget: models.Budget, additional_cost_cents: int
-    ) -> bool:
-        """Check if additional cost would exceed budget"""
-        return (budget.current_usage_cents + additional_cost_cents) > budget.limit_cents
-
-    def _update_budgets_for_usage(
-        self, org_id: str, agent_id: Optional[str], cost_cents: int, now: datetime
-    ):
-        """Update budget usage counters"""
-        # Update agent-level budgets
-        if agent_id:
-            agent_budgets = self._get_active_budgets(org_id, agent_id, now)
-            for budget in agent_budgets:
-                budget.current_usage_cents += cost_cents
-                if budget.current_usage_cents > budget.limit_cents:
-                    budget.status = BudgetStatus.EXCEEDED.value
-
-        # Update org-level budgets
-        org_budgets = self._get_active_budgets(org_id, None, now)
-        for budget in org_budgets:
-            budget.current_usage_cents += cost_cents
-            if budget.current_usage_cents > budget.limit_cents:
-                budget.status = BudgetStatus.EXCEEDED.value
+        return calculate_period_bounds(now, period)
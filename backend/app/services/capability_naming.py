@@ -5,28 +5,24 @@ Canonical capability key format: "tool:{tool_name}:{action}" (lowercase).
 """
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import Literal
 
 
+# Separators dropped from actions in a single translate() pass
+_STRIP_TABLE = str.maketrans("", "", " /\\")
+
+
+@lru_cache(maxsize=1024)
 def normalize_action(action: str) -> str:
-    a = action.strip().lower()
-    # Normalize common HTTP verbs and tool actions
-    mapping = {
-        "get": "get",
-        "post": "post",
-        "put": "put",
-        "delete": "delete",
-        "patch": "patch",
-        "read": "read",
-        "write": "write",
-        "query": "query",
-        "connect": "connect",
-    }
-    # strip punctuation if present
-    a = a.replace(" ", "").replace("/", "").replace("\\", "")
-    return mapping.get(a, a)
+    # Common verbs (get, post, read, query, ...) are already canonical once
+    # lowercased and stripped of separators
+    return action.strip().lower().translate(_STRIP_TABLE)
 
 
+# Sized for every (tool, action) pair a deployment registers; clear with
+# capability_key.cache_clear()
+@lru_cache(maxsize=4096)
 def capability_key(tool_name: str, action: str) -> str:
     return f"tool:{tool_name.strip().lower()}:{normalize_action(action)}"
 
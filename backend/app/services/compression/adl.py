@@ -21,6 +21,7 @@ Notes:
 """
 from __future__ import annotations
 from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import Dict, List, Optional
 import re
 
@@ -36,25 +37,26 @@ class CompressedAgentBrief:
     style: Optional[str] = None
 
     def to_adl(self) -> str:
-        parts: List[str] = [f"A:{_escape(self.agent_id)}"]
-        if self.role:
-            parts.append(f"R:{_escape(self.role)}")
-        if self.capabilities:
-            # deterministic ordering by key
-            caps = ",".join(f"{_escape(k)}:{int(v)}" for k, v in sorted(self.capabilities.items()))
-            parts.append(f"C:{caps}")
-        if self.tools:
-            tools = ",".join(_escape(t) for t in self.tools)
-            parts.append(f"T:{tools}")
-        if self.constraints:
-            xs = ",".join(_escape(x) for x in self.constraints)
-            parts.append(f"X:{xs}")
-        if self.goals:
-            gs = ",".join(_escape(g) for g in self.goals)
-            parts.append(f"G:{gs}")
-        if self.style:
-            parts.append(f"S:{_escape(self.style)}")
-        return "|".join(parts)
+        # Sections in fixed order; empty ones drop out of the join
+        return "|".join(
+            part
+            for part in (
+                f"A:{_escape(self.agent_id)}",
+                self.role and f"R:{_escape(self.role)}",
+                # deterministic ordering by key
+                self.capabilities
+                and "C:"
+                + ",".join(
+                    f"{_escape(k)}:{int(v)}"
+                    for k, v in sorted(self.capabilities.items())
+                ),
+                self.tools and "T:" + ",".join(map(_escape, self.tools)),
+                self.constraints and "X:" + ",".join(map(_escape, self.constraints)),
+                self.goals and "G:" + ",".join(map(_escape, self.goals)),
+                self.style and f"S:{_escape(self.style)}",
+            )
+            if part
+        )
 
     @classmethod
     def from_adl(cls, s: str) -> "CompressedAgentBrief":
@@ -120,63 +122,44 @@ class CompressedAgentBrief:
         )
 
 
+# Basic escaping for reserved delimiters: | , : and backslash
+_ESCAPE_TABLE = str.maketrans({"\\": "\\\\", "|": r"\|", ",": r"\,", ":": r"\:"})
+
+# A backslash escapes the next char (newlines included); a trailing one is kept
+_UNESCAPE_RE = re.compile(r"\\(.)", re.DOTALL)
+
+
 def _escape(text: str) -> str:
-    # Basic escaping for reserved delimiters: | , : and backslash
-    return (
-        text.replace("\\", "\\\\")
-        .replace("|", r"\|")
-        .replace(",", r"\,")
-        .replace(":", r"\:")
-    )
+    return text.translate(_ESCAPE_TABLE)
 
 
 def _unescape(text: str) -> str:
     # Reverse escaping: interpret backslash as escaping the next char
-    out = []
-    it = iter(range(len(text)))
-    i = 0
-    while i < len(text):
-        ch = text[i]
-        if ch == "\\" and i + 1 < len(text):
-            out.append(text[i + 1])
-            i += 2
-        else:
-            out.append(ch)
-            i += 1
-    return "".join(out)
+    return _UNESCAPE_RE.sub(r"\1", text)
+
+
+@lru_cache(maxsize=None)
+def _field_pattern(sep: str) -> re.Pattern[str]:
+    # Escape pairs or plain chars up to the next unescaped sep; a lone
+    # trailing backslash belongs to the field
+    return re.compile(rf"(?:\\.|[^{re.escape(sep)}\\])*\\?", re.DOTALL)
 
 
 def _find_unescaped(s: str, ch: str) -> int:
-    i = 0
-    while i < len(s):
-        if s[i] == "\\":
-            i += 2
-            continue
-        if s[i] == ch:
-            return i
-        i += 1
-    return -1
+    end = _field_pattern(ch).match(s).end()
+    return end if end < len(s) else -1
 
 
 def _split_escaped(s: str, sep: str, preserve_escape: bool = True) -> list[str]:
+    pattern = _field_pattern(sep)
     parts: list[str] = []
-    buf: list[str] = []
-    i = 0
-    while i < len(s):
-        c = s[i]
-        if c == "\\" and i + 1 < len(s):
-            if preserve_escape:
-                buf.append("\\")
-            buf.append(s[i + 1])
-            i += 2
-            continue
-        if c == sep:
-            parts.append("".join(buf))
-            buf = []
-            i += 1
-            continue
-        buf.append(c)
-        i += 1
-    parts.append("".join(buf))
+    pos = 0
+    while True:
+        end = pattern.match(s, pos).end()
+        parts.append(s[pos:end])
+        if end == len(s):
+            break
+        pos = end + 1
+    if not preserve_escape:
+        parts = [_unescape(part) for part in parts]
     return parts
-
@@ -18,9 +18,12 @@ and run pip install -r requirements.txt inside backend venv.
 
 from __future__ import annotations
 
+from collections import OrderedDict, deque
 from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Any, Deque, Dict, List, Optional, Tuple
 import json
+import threading
+from . import tracking
 from .tracking import log_metrics, run as tracking_run
 
 try:
@@ -33,6 +36,21 @@ try:
 except Exception:  # pragma: no cover - optional in scaffolding phase
     zstd = None  # type: ignore
 
+COMPRESS_CACHE_MAX_SIZE = 1024
+
+# Levels 1-5 keep prompt-sized payloads well under a millisecond; pass
+# ZSTD_ARCHIVAL_LEVEL for data that is written once and kept
+ZSTD_LEVEL = 3
+ZSTD_ARCHIVAL_LEVEL = 15
+# Payloads above this size are compressed with worker threads
+ZSTD_THREADED_MIN_BYTES = 128_000
+# Serialized payloads smaller than this are left uncompressed by default
+ZSTD_MIN_COMPRESS_BYTES = 64
+# Formats whose average ratio over the last ZSTD_RATIO_WINDOW compressed
+# payloads is below ZSTD_MIN_USEFUL_RATIO skip zstd
+ZSTD_MIN_USEFUL_RATIO = 1.05
+ZSTD_RATIO_WINDOW = 32
+
 
 @dataclass
 class CompressionResult:
@@ -45,7 +63,9 @@ class BasicCompressionEngine:
     """Minimal engine exposing compress/decompress helpers.
 
     Priority:
-    - If zstd is available and a compressor provided, use zstd over msgpack bytes
+    - If zstd is available and a dictionary is registered for the payload's
+      format, use zstd with that dictionary over msgpack bytes
+    - Else if zstd is available and a compressor provided, use zstd over msgpack bytes
     - Else if msgpack is available, return msgpack bytes
     - Else fall back to JSON bytes with method "noop"
     """
@@ -54,49 +74,231 @@ class BasicCompressionEngine:
         self,
         zstd_compressor: Optional["zstd.ZstdCompressor"] = None,
         zstd_dict: Optional["zstd.ZstdCompressionDict"] = None,
+        dict_by_format: Optional[Dict[str, "zstd.ZstdCompressionDict"]] = None,
+        level: int = ZSTD_LEVEL,
+        threads: int = -1,
+        min_compress_bytes: int = ZSTD_MIN_COMPRESS_BYTES,
     ):
+        """
+        Args:
+            zstd_compressor: Compressor for payloads without a format dictionary
+            zstd_dict: Dictionary zstd_compressor was built with, if any
+            dict_by_format: Dictionaries keyed by payload format ('lsl', 'adl', ...)
+            level: zstd level for the compressors this engine builds
+            threads: zstd worker threads for payloads over
+                ZSTD_THREADED_MIN_BYTES (-1 = one per CPU, 0 = never)
+            min_compress_bytes: Serialized size below which zstd is skipped
+        """
         self._zstd_compressor = zstd_compressor if zstd is not None else None
         self._zstd_dict = zstd_dict if zstd is not None else None
+        self._level = level
+        self._threads = threads
+        self._min_compress_bytes = min_compress_bytes
+        # Recent zstd ratios and skipped calls per format, for adaptive bypass
+        self._ratios: Dict[Optional[str], Deque[float]] = {}
+        self._skipped: Dict[Optional[str], int] = {}
+        self._dict_by_format = dict(dict_by_format or {}) if zstd is not None else {}
+        # Compressors are built once and reused across calls
+        self._compressor_by_format: Dict[str, "zstd.ZstdCompressor"] = {}
+        self._threaded_compressors: Dict[Optional[str], "zstd.ZstdCompressor"] = {}
+        # zstd frames record the ID of the dictionary they were compressed
+        # with, which selects the dictionary again on decompress
+        self._dict_by_id: Dict[int, "zstd.ZstdCompressionDict"] = {}
+        if zstd is not None:
+            for fmt, dictionary in self._dict_by_format.items():
+                self._compressor_by_format[fmt] = zstd.ZstdCompressor(
+                    level=level, dict_data=dictionary
+                )
+                self._dict_by_id[dictionary.dict_id()] = dictionary
+            if self._zstd_dict is not None:
+                self._dict_by_id.setdefault(self._zstd_dict.dict_id(), self._zstd_dict)
+        # Cached compression results; tied to this engine's compressor and
+        # dictionary, so a new engine starts with an empty cache
+        self._cache: "OrderedDict[Tuple[Any, ...], CompressionResult]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # msgpack Packers keep an internal buffer, so each thread reuses its own
+        self._local = threading.local()
+
+    def compress(self, obj: Any, fmt: Optional[str] = None) -> CompressionResult:
+        serialized, method = self._serialize(obj)
+        res = self._compress_serialized([serialized], method, fmt)[0]
+        self._track(len(serialized), len(res.data), res.method)
+        return res
+
+    def compress_cached(self, obj: Any, fmt: Optional[str] = None) -> CompressionResult:
+        """Compress like compress(), reusing the result for a repeated payload."""
+        return self.compress_many([obj], cached=True, fmt=fmt)[0]
+
+    def compress_many(
+        self, objs: List[Any], cached: bool = False, fmt: Optional[str] = None
+    ) -> List[CompressionResult]:
+        """Compress several objects in one batch, logging a single tracking run.
+
+        With zstd, payloads are compressed together through
+        multi_compress_to_buffer so the compression context is set up once.
+
+        With cached=True, results are reused for repeated payloads: text and
+        bytes are looked up before serialization, other objects by their
+        serialized bytes, so a hit skips zstd (and, for text, msgpack). Meant
+        for payloads that recur, such as stable context items; one-off data
+        should not be cached.
+
+        fmt names the payload format ('lsl', 'adl', ...) and picks that
+        format's dictionary when one is registered.
+        """
+        results: List[Optional[CompressionResult]] = [None] * len(objs)
+        pending: List[Tuple[int, Tuple[Any, ...], bytes]] = []
+        method = "msgpack" if msgpack is not None else "noop"
+        for i, obj in enumerate(objs):
+            serialized = None
+            if isinstance(obj, (str, bytes)):
+                key: Tuple[Any, ...] = ("raw", fmt, obj)
+            else:
+                serialized, method = self._serialize(obj)
+                key = ("packed", fmt, serialized)
+            if cached:
+                results[i] = self._cache_get(key)
+            if results[i] is None:
+                if serialized is None:
+                    serialized, method = self._serialize(obj)
+                pending.append((i, key, serialized))
+
+        if pending:
+            compressed = self._compress_serialized(
+                [s for _, _, s in pending], method, fmt
+            )
+            for (i, key, _), res in zip(pending, compressed):
+                results[i] = res
+                if cached:
+                    self._cache_put(key, res)
+            self._track(
+                sum(len(s) for _, _, s in pending),
+                sum(len(res.data) for res in compressed),
+                compressed[0].method,
+            )
+
+        return results  # type: ignore[return-value]
 
-    def compress(self, obj: Any) -> CompressionResult:
+    def _serialize(self, obj: Any) -> Tuple[bytes, str]:
         # Serialize to bytes first (msgpack preferred)
         if msgpack is not None:
-            serialized = msgpack.packb(obj, use_bin_type=True)
-            method = "msgpack"
-        else:
-            serialized = json.dumps(obj, separators=(",", ":")).encode("utf-8")
-            method = "noop"
-
-        # Optionally compress with zstd
-        if self._zstd_compressor is not None:
-            compressed = self._zstd_compressor.compress(serialized)
-            ratio = (len(serialized) / len(compressed)) if len(compressed) else None
-            res = CompressionResult(method="zstd+msgpack", data=compressed, ratio=ratio)
-        else:
-            res = CompressionResult(method=method, data=serialized, ratio=None)
+            packer = getattr(self._local, "packer", None)
+            if packer is None:
+                packer = self._local.packer = msgpack.Packer(use_bin_type=True)
+            return packer.pack(obj), "msgpack"
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8"), "noop"
 
+    def _compress_serialized(
+        self, payloads: List[bytes], method: str, fmt: Optional[str] = None
+    ) -> List[CompressionResult]:
+        # Optionally compress with zstd, preferring the format's dictionary
+        results = [
+            CompressionResult(method=method, data=p, ratio=None) for p in payloads
+        ]
+        compressor = self._compressor_by_format.get(fmt, self._zstd_compressor)
+        if compressor is None:
+            return results
+
+        probing = False
+        ratios = self._ratios.setdefault(fmt, deque(maxlen=ZSTD_RATIO_WINDOW))
+        average = sum(ratios) / len(ratios) if ratios else None
+        if len(ratios) == ZSTD_RATIO_WINDOW and average < ZSTD_MIN_USEFUL_RATIO:
+            # zstd hasn't been paying off for this format; retry it now and
+            # then in case its payloads change
+            skipped = self._skipped.get(fmt, 0) + 1
+            self._skipped[fmt] = skipped % ZSTD_RATIO_WINDOW
+            if skipped < ZSTD_RATIO_WINDOW:
+                return results
+            probing = True
+
+        # Tiny payloads usually grow once zstd adds its frame header
+        indexes = [
+            i for i, p in enumerate(payloads) if len(p) >= self._min_compress_bytes
+        ]
+        if not indexes:
+            return results
+        compressed = self._zstd_compress([payloads[i] for i in indexes], fmt)
+
+        new_ratios = []
+        for i, c in zip(indexes, compressed):
+            ratio = len(payloads[i]) / len(c)
+            new_ratios.append(ratio)
+            # Keep whichever encoding is smaller
+            if len(c) < len(payloads[i]):
+                results[i] = CompressionResult(
+                    method="zstd+msgpack", data=c, ratio=ratio
+                )
+        if probing and sum(new_ratios) / len(new_ratios) >= ZSTD_MIN_USEFUL_RATIO:
+            ratios.clear()
+        ratios.extend(new_ratios)
+        return results
+
+    def _zstd_compress(self, payloads: List[bytes], fmt: Optional[str]) -> List[bytes]:
+        large = self._threads != 0 and any(
+            len(p) > ZSTD_THREADED_MIN_BYTES for p in payloads
+        )
+        if len(payloads) > 1 and not large:
+            compressor = self._compressor_by_format.get(fmt, self._zstd_compressor)
+            try:
+                buffers = compressor.multi_compress_to_buffer(payloads)
+                return [buffers[i].tobytes() for i in range(len(buffers))]
+            except (AttributeError, NotImplementedError):
+                pass  # backend without the batch API (e.g. cffi)
+        return [self._compressor_for(fmt, len(p)).compress(p) for p in payloads]
+
+    def _compressor_for(self, fmt: Optional[str], size: int) -> "zstd.ZstdCompressor":
+        compressor = self._compressor_by_format.get(fmt, self._zstd_compressor)
+        if self._threads == 0 or size <= ZSTD_THREADED_MIN_BYTES:
+            return compressor
+        key = fmt if fmt in self._compressor_by_format else None
+        threaded = self._threaded_compressors.get(key)
+        if threaded is None:
+            dictionary = self._dict_by_format[fmt] if key is not None else self._zstd_dict
+            threaded = zstd.ZstdCompressor(
+                level=self._level, dict_data=dictionary, threads=self._threads
+            )
+            self._threaded_compressors[key] = threaded
+        return threaded
+
+    def _cache_get(self, key: Tuple[Any, ...]) -> Optional[CompressionResult]:
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+            return cached
+
+    def _cache_put(self, key: Tuple[Any, ...], res: CompressionResult) -> None:
+        with self._cache_lock:
+            self._cache[key] = res
+            self._cache.move_to_end(key)
+            while len(self._cache) > COMPRESS_CACHE_MAX_SIZE:
+                self._cache.popitem(last=False)
+
+    def _track(self, input_bytes: int, output_bytes: int, method: str) -> None:
         # Optional MLflow tracking
+        if not tracking._TRACKING_ENABLED:
+            return
         try:
             with tracking_run("compression"):
                 log_metrics({
-                    "input_bytes": float(len(serialized)),
-                    "output_bytes": float(len(res.data)),
-                    "ratio": float((len(serialized) / len(res.data)) if len(res.data) else 1.0),
-                }, tags={"method": res.method})
+                    "input_bytes": float(input_bytes),
+                    "output_bytes": float(output_bytes),
+                    "ratio": float((input_bytes / output_bytes) if output_bytes else 1.0),
+                }, tags={"method": method})
         except Exception:
             pass
 
-        return res
-
     def decompress(self, comp: CompressionResult) -> Any:
         payload = comp.data
 
         if comp.method == "zstd+msgpack":
             if zstd is None:
                 raise RuntimeError("zstandard not available to decompress data")
-            # Use dictionary if available to avoid mismatch
-            if self._zstd_dict is not None:
-                dctx = zstd.ZstdDecompressor(dict_data=self._zstd_dict)
+            # Use the dictionary the frame was compressed with, if known
+            dict_id = zstd.get_frame_parameters(payload).dict_id
+            dictionary = self._dict_by_id.get(dict_id, self._zstd_dict)
+            if dictionary is not None:
+                dctx = zstd.ZstdDecompressor(dict_data=dictionary)
             else:
                 dctx = zstd.ZstdDecompressor()
             payload = dctx.decompress(payload)
@@ -105,7 +307,7 @@ class BasicCompressionEngine:
         # msgpack decode when available
         if msgpack is not None:
             try:
-                return msgpack.unpackb(payload, raw=False)
+                return msgpack.unpackb(payload, raw=False, strict_map_key=False)
             except Exception:
                 # If payload was JSON, fall back below
                 pass
@@ -10,6 +10,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from enum import Enum
+from operator import attrgetter
 from typing import Any, Dict, List, Optional, Tuple
 
 from .basic_engine import BasicCompressionEngine, CompressionResult
@@ -26,6 +27,15 @@ class ContextLayer(Enum):
     LOCAL = 4
 
 
+# Assembly order: layer precedence, then priority desc, then key
+_LAYER_ORDER = {
+    ContextLayer.GLOBAL: 0,
+    ContextLayer.DOMAIN: 1,
+    ContextLayer.SESSION: 2,
+    ContextLayer.LOCAL: 3,
+}
+
+
 @dataclass
 class ContextItem:
     key: str
@@ -34,6 +44,15 @@ class ContextItem:
     format: str  # 'lsl' | 'adl' | 'opl' | 'text' | 'json'
     payload: Any
     _compressed: Optional[CompressionResult] = field(default=None, init=False, repr=False)
+    _sort_key: Tuple[int, int, str] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._sort_key = (_LAYER_ORDER[self.layer], -self.priority, self.key)
+
+
+# Shared when no engine is given, so its compression cache carries over
+# between managers
+_default_engine = BasicCompressionEngine()
 
 
 class HierarchicalContextManager:
@@ -43,7 +62,7 @@ class HierarchicalContextManager:
         total_budget_bytes: int = 20_000,
         per_layer_budget: Optional[Dict[ContextLayer, int]] = None,
     ) -> None:
-        self.engine = engine or BasicCompressionEngine()
+        self.engine = engine or _default_engine
         # Default split: 40/30/20/10
         default = {
             ContextLayer.GLOBAL: int(total_budget_bytes * 0.40),
@@ -64,10 +83,15 @@ class HierarchicalContextManager:
     def preselect_with_retriever(self, query_text: str, retriever, top_k: int = 50, filter_fn=None) -> None:
         """Use a VectorRetriever-like object to prune items before assembly.
 
-        The retriever must support add_item(key, text, metadata) and query(text, top_k, filter_fn).
+        The retriever must support add_item(key, text, metadata) and query(text, top_k, filter_fn);
+        add_items(keys, texts, metadatas) is used instead when available, so all
+        items are embedded in one batch.
         We'll encode payloads to text and keep only items whose keys are returned by the retriever.
         """
         # Build index from current items
+        keys: List[str] = []
+        texts: List[str] = []
+        metas: List[Dict[str, Any]] = []
         for it in self._items:
             text = self._encode_payload(it)
             # Ensure text for vectorization
@@ -76,7 +100,16 @@ class HierarchicalContextManager:
                     text = str(text)
                 except Exception:
                     text = ""
-            retriever.add_item(it.key, text, {"layer": it.layer.name, "format": it.format, "priority": it.priority})
+            keys.append(it.key)
+            texts.append(text)
+            metas.append({"layer": it.layer.name, "format": it.format, "priority": it.priority})
+
+        add_items = getattr(retriever, "add_items", None)
+        if add_items is not None:
+            add_items(keys, texts, metas)
+        else:
+            for key, text, meta in zip(keys, texts, metas):
+                retriever.add_item(key, text, meta)
 
         hits = retriever.query(query_text, top_k=top_k, filter_fn=filter_fn)
         allowed = {k for (k, _, _) in hits}
@@ -99,7 +132,7 @@ class HierarchicalContextManager:
     def _compress_item(self, item: ContextItem) -> CompressionResult:
         if item._compressed is None:
             obj = self._encode_payload(item)
-            item._compressed = self.engine.compress(obj)
+            item._compressed = self.engine.compress_cached(obj, fmt=item.format)
         return item._compressed
 
     def assemble(self, max_total_bytes: Optional[int] = None) -> Dict[str, Any]:
@@ -110,11 +143,19 @@ class HierarchicalContextManager:
         selected: List[Dict[str, Any]] = []
 
         # Sort by layer order then priority desc, then stable by key
-        layer_order = {l: i for i, l in enumerate([ContextLayer.GLOBAL, ContextLayer.DOMAIN, ContextLayer.SESSION, ContextLayer.LOCAL])}
-        sorted_items = sorted(
-            self._items,
-            key=lambda it: (layer_order[it.layer], -it.priority, it.key),
-        )
+        sorted_items = sorted(self._items, key=attrgetter("_sort_key"))
+
+        # Compress everything not yet compressed in one batch per format
+        pending: Dict[str, List[ContextItem]] = {}
+        for it in sorted_items:
+            if it._compressed is None:
+                pending.setdefault(it.format, []).append(it)
+        for fmt, items in pending.items():
+            compressed = self.engine.compress_many(
+                [self._encode_payload(it) for it in items], cached=True, fmt=fmt
+            )
+            for it, comp in zip(items, compressed):
+                it._compressed = comp
 
         for it in sorted_items:
             comp = self._compress_item(it)
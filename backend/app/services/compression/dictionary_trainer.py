@@ -8,7 +8,8 @@ return None, allowing tests to run before dependencies are installed.
 
 from __future__ import annotations
 
-from typing import Iterable, Optional
+from pathlib import Path
+from typing import Iterable, Optional, Union
 
 try:
     import zstandard as zstd  # type: ignore
@@ -29,8 +30,28 @@ class ZstdDictionaryTrainer:
         dict_data = zstd.train_dictionary(self.dict_size, sample_list)
         return dict_data
 
-    def build_compressor(self, dictionary: Optional["zstd.ZstdCompressionDict"]):
+    def build_compressor(
+        self, dictionary: Optional["zstd.ZstdCompressionDict"], level: int = 3
+    ):
         if zstd is None or dictionary is None:
             return None
-        return zstd.ZstdCompressor(dict_data=dictionary)
+        return zstd.ZstdCompressor(level=level, dict_data=dictionary)
+
+    def save(
+        self, dictionary: Optional["zstd.ZstdCompressionDict"], path: Union[str, Path]
+    ) -> bool:
+        """Write a trained dictionary to disk; returns False if there is none."""
+        if zstd is None or dictionary is None:
+            return False
+        Path(path).write_bytes(dictionary.as_bytes())
+        return True
+
+    def load(self, path: Union[str, Path]) -> Optional["zstd.ZstdCompressionDict"]:
+        """Read a dictionary written by save(); None if zstd or the file is missing."""
+        if zstd is None:
+            return None
+        path = Path(path)
+        if not path.is_file():
+            return None
+        return zstd.ZstdCompressionDict(path.read_bytes())
 
@@ -12,6 +12,17 @@ from typing import Dict, Tuple
 import re
 
 
+_LSL_HEADER_RE = re.compile(r"^L(\d+):([^\{]+)\{(.*)\}$")
+
+# One body token: outcome (concept→X:0.85), tests (T:8/10) or error (auth:3);
+# tokens matching none of them are skipped
+_LSL_TOKEN_RE = re.compile(
+    r"([^:\u2192]*)\u2192([LDMFR]):\s*([-+]?(?:\d+(?:\.\d*)?|\.\d+))\s*"
+    r"|T:\s*([-+]?\d+)\s*/\s*([-+]?\d+)\s*"
+    r"|(?!T:)([^:\u2192]*):\s*([-+]?\d+)\s*"
+)
+
+
 class LearningOutcome(Enum):
     LEARNED = "L"
     DISCOVERED = "D"
@@ -29,28 +40,27 @@ class CompressedLearningSession:
     errors: Dict[str, int]
 
     def to_lsl(self) -> str:
-        parts = []
-        # outcomes
-        if self.outcomes:
-            outcomes_str = ",".join(
-                f"{concept}\u2192{code.value}:{confidence:.2f}"
-                for concept, (code, confidence) in self.outcomes.items()
+        # outcomes, tests, errors; empty ones drop out of the join
+        inner = ",".join(
+            part
+            for part in (
+                ",".join(
+                    f"{concept}\u2192{code.value}:{confidence:.2f}"
+                    for concept, (code, confidence) in self.outcomes.items()
+                ),
+                self.tests
+                and self.tests[1] > 0
+                and f"T:{self.tests[0]}/{self.tests[1]}",
+                ",".join(f"{k}:{v}" for k, v in self.errors.items()),
             )
-            parts.append(outcomes_str)
-        # tests
-        if self.tests and self.tests[1] > 0:
-            parts.append(f"T:{self.tests[0]}/{self.tests[1]}")
-        # errors
-        if self.errors:
-            parts.append(",".join(f"{k}:{v}" for k, v in self.errors.items()))
-
-        inner = ",".join(parts)
+            if part
+        )
         return f"L{self.iteration}:{self.system}{{{inner}}}"
 
     @classmethod
     def from_lsl(cls, s: str) -> "CompressedLearningSession":
         # L47:FastAPI{routing→L:0.85,Depends→D:0.87,T:8/10,E:auth:3}
-        m = re.match(r"^L(\d+):([^\{]+)\{(.*)\}$", s)
+        m = _LSL_HEADER_RE.match(s)
         if not m:
             raise ValueError("Invalid LSL string")
         iteration = int(m.group(1))
@@ -61,33 +71,17 @@ class CompressedLearningSession:
         tests = (0, 0)
         errors: Dict[str, int] = {}
 
-        # Split by commas but keep key patterns
-        tokens = [t for t in body.split(",") if t]
-        for tok in tokens:
-            if tok.startswith("T:"):
-                # T:8/10
-                try:
-                    nums = tok.split(":", 1)[1]
-                    p, t = nums.split("/")
-                    tests = (int(p), int(t))
-                except Exception:
-                    continue
-            elif ":" in tok and "\u2192" in tok:
-                # concept→X:0.99
-                try:
-                    left, conf_str = tok.split(":", 1)
-                    concept, code = left.split("\u2192", 1)
-                    code_enum = LearningOutcome(code)
-                    outcomes[concept] = (code_enum, float(conf_str))
-                except Exception:
-                    continue
-            elif ":" in tok:
-                # error pattern like auth:3
-                try:
-                    k, v = tok.split(":", 1)
-                    errors[k] = int(v)
-                except Exception:
-                    continue
+        for tok in body.split(","):
+            m = _LSL_TOKEN_RE.fullmatch(tok)
+            if m is None:
+                continue
+            concept, code, conf, passed, total, name, count = m.groups()
+            if code is not None:
+                outcomes[concept] = (LearningOutcome(code), float(conf))
+            elif passed is not None:
+                tests = (int(passed), int(total))
+            else:
+                errors[name] = int(count)
 
         return cls(iteration=iteration, system=system, outcomes=outcomes, tests=tests, errors=errors)
 
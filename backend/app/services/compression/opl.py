@@ -30,18 +30,18 @@ class CompressedOptimizationTrace:
     notes: Optional[str] = None
 
     def to_opl(self) -> str:
-        parts: List[str] = []
-        if self.heuristics:
-            parts.append("H:" + ",".join(_escape(h) for h in self.heuristics))
-        if self.metrics:
-            parts.append("M:" + ",".join(f"{_escape(k)}:{_escape(str(v))}" for k, v in self.metrics.items()))
-        if self.exemplars:
-            parts.append("E:" + ",".join(_escape(e) for e in self.exemplars))
-        if self.params:
-            parts.append("P:" + ",".join(f"{_escape(k)}:{_escape(str(v))}" for k, v in self.params.items()))
-        if self.notes:
-            parts.append("N:" + _escape(self.notes))
-        return "|".join(parts)
+        # Sections in fixed order; empty ones drop out of the join
+        return "|".join(
+            part
+            for part in (
+                self.heuristics and "H:" + ",".join(map(_escape, self.heuristics)),
+                self.metrics and "M:" + _join_pairs(self.metrics),
+                self.exemplars and "E:" + ",".join(map(_escape, self.exemplars)),
+                self.params and "P:" + _join_pairs(self.params),
+                self.notes and "N:" + _escape(self.notes),
+            )
+            if part
+        )
 
     @classmethod
     def from_opl(cls, s: str) -> "CompressedOptimizationTrace":
@@ -100,3 +100,6 @@ class CompressedOptimizationTrace:
             notes=notes,
         )
 
+
+def _join_pairs(pairs: Dict[str, str]) -> str:
+    return ",".join(f"{_escape(k)}:{_escape(str(v))}" for k, v in pairs.items())
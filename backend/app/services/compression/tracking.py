@@ -4,6 +4,7 @@ SC.1-07: MLflow tracking adapter for compression metrics.
 - Optional enablement via env var COMPRESSION_TRACKING=1
 - Provides decorators/helpers to log compression sizes and ratios
 - Safe if MLflow is unavailable; logs no-op
+- Enablement is read once at import; call reload() after changing it
 """
 from __future__ import annotations
 
@@ -21,19 +22,30 @@ def tracking_enabled() -> bool:
     return os.getenv("COMPRESSION_TRACKING", "0") in ("1", "true", "True") and mlflow is not None
 
 
+# Checked on every compress call, so the env lookup happens once
+_TRACKING_ENABLED = tracking_enabled()
+
+
+def reload() -> bool:
+    """Re-read COMPRESSION_TRACKING (and MLflow availability); returns the new state."""
+    global _TRACKING_ENABLED
+    _TRACKING_ENABLED = tracking_enabled()
+    return _TRACKING_ENABLED
+
+
 @contextmanager
 def run(name: str, tags: Optional[Dict[str, str]] = None):
-    if tracking_enabled():
-        with mlflow.start_run(run_name=name):  # type: ignore[attr-defined]
-            if tags:
-                mlflow.set_tags(tags)  # type: ignore[attr-defined]
-            yield
-    else:
+    if not _TRACKING_ENABLED:
+        yield
+        return
+    with mlflow.start_run(run_name=name):  # type: ignore[attr-defined]
+        if tags:
+            mlflow.set_tags(tags)  # type: ignore[attr-defined]
         yield
 
 
 def log_metrics(metrics: Dict[str, float], step: Optional[int] = None, tags: Optional[Dict[str, str]] = None) -> None:
-    if not tracking_enabled():
+    if not _TRACKING_ENABLED:
         return
     if tags:
         mlflow.set_tags(tags)  # type: ignore[attr-defined]
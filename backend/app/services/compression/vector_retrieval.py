@@ -67,21 +67,36 @@ class VectorRetriever:
             self.index = faiss.IndexFlatIP(self.dim)
 
     def _to_vec(self, text: str) -> np.ndarray:
+        return self._to_vecs([text])[0]
+
+    def _to_vecs(self, texts: List[str]) -> np.ndarray:
         if self._use_simple:
-            v = self.vectorizer.transform([text])[0]
+            X = self.vectorizer.transform(texts)
         else:
-            X = self.vectorizer.transform([text])
-            v = X.toarray().astype(np.float32)[0]
-        # Ensure normalized unit vector
-        norm = np.linalg.norm(v)
-        return v if norm == 0 else (v / norm)
+            X = self.vectorizer.transform(texts).toarray().astype(np.float32)
+        # Ensure normalized unit vectors (all-zero rows stay zero)
+        norms = np.linalg.norm(X, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return X / norms
 
     def add_item(self, key: str, text: str, metadata: Optional[Dict[str, Any]] = None):
-        vec = self._to_vec(text)
-        metadata = metadata or {}
-        self.items.append((key, vec, metadata))
+        self.add_items([key], [text], [metadata])
+
+    def add_items(
+        self,
+        keys: List[str],
+        texts: List[str],
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ):
+        """Add several items, embedding all texts in one vectorizer call."""
+        if not keys:
+            return
+        vecs = self._to_vecs(texts)
+        metadatas = metadatas or [None] * len(keys)
+        for key, vec, metadata in zip(keys, vecs, metadatas):
+            self.items.append((key, vec, metadata or {}))
         if self.use_faiss and self.index is not None:
-            self.index.add(vec.reshape(1, -1))
+            self.index.add(vecs)
 
     def query(self, text: str, top_k: int = 10, filter_fn=None) -> List[Tuple[str, float, Dict[str, Any]]]:
         q = self._to_vec(text)
@@ -8,15 +8,29 @@ Start/stop handled from app.startup lifespan.
 from typing import Optional
 import httpx
 
+try:
+    import h2  # noqa: F401  (installed via httpx[http2])
+
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
 _client: Optional[httpx.AsyncClient] = None
 
 
 def get_http_client() -> httpx.AsyncClient:
     global _client
     if _client is None:
+        # HTTP/2 multiplexes concurrent requests to one host over a single
+        # connection; keep idle connections around long enough to be reused
         _client = httpx.AsyncClient(
+            http2=_HTTP2_AVAILABLE,
             timeout=httpx.Timeout(connect=0.5, read=1.5, write=1.5, pool=2.0),
-            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            limits=httpx.Limits(
+                max_connections=200,
+                max_keepalive_connections=100,
+                keepalive_expiry=60.0,
+            ),
             headers={"User-Agent": "collexa-backend/1.0"},
         )
     return _client
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import hashlib
 import os
 import json
 
@@ -13,6 +14,76 @@ except Exception:  # pragma: no cover
 
 from app.security.jwks import derive_jwks_from_env
 
+# Manifests covered by one signed Merkle root; keeps proofs at <= 6 hashes
+MANIFEST_BATCH_SIZE = 64
+
+# Payload type of a signed batch root, so the verify endpoint can refuse to
+# accept one in place of an agent manifest
+MANIFEST_BATCH_ROOT_TYP = "manifest-batch-root"
+
+# Domain separation so a leaf hash can never be passed off as an inner node
+_LEAF_PREFIX = b"\x00"
+_NODE_PREFIX = b"\x01"
+
+
+def _signing_key() -> Tuple[str, Optional[str]]:
+    key_id = os.environ.get("MANIFEST_KEY_ID") or "dev-key"
+    return key_id, os.environ.get("MANIFEST_PRIVATE_KEY_PEM")
+
+
+def _canonical(manifest: Dict[str, Any]) -> bytes:
+    return json.dumps(manifest, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+def manifest_leaf_hash(manifest: Dict[str, Any]) -> str:
+    return hashlib.sha256(_LEAF_PREFIX + _canonical(manifest)).hexdigest()
+
+
+def _node_hash(left: str, right: str) -> str:
+    return hashlib.sha256(
+        _NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)
+    ).hexdigest()
+
+
+def _merkle_tree(leaves: List[str]) -> Tuple[str, List[List[Dict[str, str]]]]:
+    """Return (root, proofs) where proofs[i] is the audit path of leaf i.
+
+    An unpaired node at the end of a level is carried up unchanged.
+    """
+    proofs: List[List[Dict[str, str]]] = [[] for _ in leaves]
+    # Each entry: (hash, indices of the leaves under it)
+    level = [(leaf, [i]) for i, leaf in enumerate(leaves)]
+    while len(level) > 1:
+        next_level = []
+        for j in range(0, len(level) - 1, 2):
+            (left, left_ids), (right, right_ids) = level[j], level[j + 1]
+            for i in left_ids:
+                proofs[i].append({"side": "right", "hash": right})
+            for i in right_ids:
+                proofs[i].append({"side": "left", "hash": left})
+            next_level.append((_node_hash(left, right), left_ids + right_ids))
+        if len(level) % 2:
+            next_level.append(level[-1])
+        level = next_level
+    return level[0][0], proofs
+
+
+def merkle_root_from_proof(leaf: str, proof: List[Dict[str, str]]) -> str:
+    node = leaf
+    for step in proof:
+        if step["side"] == "left":
+            node = _node_hash(step["hash"], node)
+        else:
+            node = _node_hash(node, step["hash"])
+    return node
+
+
+def verify_manifest_inclusion(
+    manifest: Dict[str, Any], proof: List[Dict[str, str]], root: str
+) -> bool:
+    """Check that a manifest is covered by a batch root (signature checked separately)."""
+    return merkle_root_from_proof(manifest_leaf_hash(manifest), proof) == root
+
 
 def sign_manifest_if_possible(manifest: Dict[str, Any]) -> Dict[str, Any]:
     """Sign manifest using ES256 if MANIFEST_PRIVATE_KEY_PEM is present.
@@ -20,9 +91,7 @@ def sign_manifest_if_possible(manifest: Dict[str, Any]) -> Dict[str, Any]:
     Returns dict: {"manifest", "signature", "key_id", "alg"}
     If signing is not possible, signature is None and alg is None.
     """
-    env = {k: v for k, v in os.environ.items() if k.startswith("MANIFEST_")}
-    key_id = env.get("MANIFEST_KEY_ID") or "dev-key"
-    priv_pem = env.get("MANIFEST_PRIVATE_KEY_PEM")
+    key_id, priv_pem = _signing_key()
 
     if not jws or not priv_pem:
         return {"manifest": manifest, "signature": None, "key_id": key_id, "alg": None}
@@ -39,3 +108,38 @@ def sign_manifest_if_possible(manifest: Dict[str, Any]) -> Dict[str, Any]:
         # Fail safe: return unsigned if signing fails
         return {"manifest": manifest, "signature": None, "key_id": key_id, "alg": None}
 
+
+def sign_manifests_batch(manifests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Sign many manifests with one ES256 signature per Merkle batch.
+
+    Manifests are grouped into batches of MANIFEST_BATCH_SIZE; each batch's
+    Merkle root is signed once, and every manifest gets its inclusion proof.
+
+    Returns one dict per manifest:
+    {"manifest", "root", "proof", "signature", "key_id", "alg"}.
+    The signature is a JWS over {"typ", "merkle_root", "leaf_count"}; it is None
+    (and alg is None) when signing is not possible.
+    """
+    results: List[Dict[str, Any]] = []
+    for start in range(0, len(manifests), MANIFEST_BATCH_SIZE):
+        batch = manifests[start : start + MANIFEST_BATCH_SIZE]
+        root, proofs = _merkle_tree([manifest_leaf_hash(m) for m in batch])
+        signed_root = sign_manifest_if_possible(
+            {
+                "typ": MANIFEST_BATCH_ROOT_TYP,
+                "merkle_root": root,
+                "leaf_count": len(batch),
+            }
+        )
+        for manifest, proof in zip(batch, proofs):
+            results.append(
+                {
+                    "manifest": manifest,
+                    "root": root,
+                    "proof": proof,
+                    "signature": signed_root["signature"],
+                    "key_id": signed_root["key_id"],
+                    "alg": signed_root["alg"],
+                }
+            )
+    return results
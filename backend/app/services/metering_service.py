@@ -73,8 +73,6 @@ class MeteringService:
         Raises:
             BudgetExceededException: If budget limits would be exceeded
         """
-        usage_records = []
-
         # Calculate costs for different usage types
         costs = [
             self._calculate_cost("invocation", 1),
@@ -82,28 +80,33 @@ class MeteringService:
             self._calculate_cost("output_tokens", output_tokens),
         ]
 
-        # Check budget before recording usage
+        # Check budget before recording usage; the same timestamp is reused below
+        now = datetime.utcnow()
         total_cost_cents = sum(cost.cost_cents for cost in costs)
         self.budget_service.check_budget_before_usage(
-            org_id, total_cost_cents, agent_id
+            org_id, total_cost_cents, agent_id, now=now
         )
 
-        # Record each usage type
-        for cost in costs:
-            if cost.quantity > 0:  # Only record non-zero usage
-                usage_record = self.budget_service.record_usage(
-                    org_id=org_id,
-                    usage_type=cost.usage_type,
-                    quantity=cost.quantity,
-                    cost_cents=cost.cost_cents,
-                    agent_id=agent_id,
-                    run_id=run_id,
-                    metadata={
+        # Record every non-zero usage type together
+        usage_records = self.budget_service.record_usages(
+            org_id=org_id,
+            usages=[
+                {
+                    "usage_type": cost.usage_type,
+                    "quantity": cost.quantity,
+                    "cost_cents": cost.cost_cents,
+                    "metadata": {
                         **(metadata or {}),
                         "rate_cents_per_unit": cost.rate_cents_per_unit,
                     },
-                )
-                usage_records.append(usage_record)
+                }
+                for cost in costs
+                if cost.quantity > 0
+            ],
+            agent_id=agent_id,
+            run_id=run_id,
+            now=now,
+        )
 
         # Report usage to payment provider (async)
         asyncio.create_task(self._report_usage_to_provider(org_id, total_cost_cents))
@@ -126,7 +129,10 @@ class MeteringService:
         )  # Convert to centihours
 
         # Check budget
-        self.budget_service.check_budget_before_usage(org_id, cost.cost_cents, agent_id)
+        now = datetime.utcnow()
+        self.budget_service.check_budget_before_usage(
+            org_id, cost.cost_cents, agent_id, now=now
+        )
 
         # Record usage
         usage_record = self.budget_service.record_usage(
@@ -140,6 +146,7 @@ class MeteringService:
                 "learning_hours": learning_hours,
                 "rate_cents_per_unit": cost.rate_cents_per_unit,
             },
+            now=now,
         )
 
         # Report to payment provider
@@ -161,7 +168,10 @@ class MeteringService:
         cost = self._calculate_cost("storage_mb", storage_mb)
 
         # Check budget
-        self.budget_service.check_budget_before_usage(org_id, cost.cost_cents, agent_id)
+        now = datetime.utcnow()
+        self.budget_service.check_budget_before_usage(
+            org_id, cost.cost_cents, agent_id, now=now
+        )
 
         # Record usage
         usage_record = self.budget_service.record_usage(
@@ -175,6 +185,7 @@ class MeteringService:
                 "storage_mb": storage_mb,
                 "rate_cents_per_unit": cost.rate_cents_per_unit,
             },
+            now=now,
         )
 
         # Report to payment provider
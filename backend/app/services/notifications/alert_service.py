@@ -117,7 +117,7 @@ class AlertService:
             body += f"\n🏢 Organization: {org_id}"
 
             # Send notification
-            success = self.apobj.notify(title=title, body=body)
+            success = await self._notify(title=title, body=body)
 
             if success:
                 logger.info(f"Budget violation alert sent for org {org_id}")
@@ -170,7 +170,7 @@ class AlertService:
             body += f"\n📅 Alert generated at: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}"
             body += f"\n🏢 Organization: {org_id}"
 
-            success = self.apobj.notify(title=title, body=body)
+            success = await self._notify(title=title, body=body)
 
             if success:
                 logger.info(f"Budget warning alert sent for org {org_id}")
@@ -225,7 +225,7 @@ class AlertService:
             # Add timestamp
             body += f"\n📅 Generated at: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}"
 
-            success = self.apobj.notify(title=full_title, body=body)
+            success = await self._notify(title=full_title, body=body)
 
             if success:
                 logger.info(f"System alert sent: {title}")
@@ -300,7 +300,7 @@ class AlertService:
             body += f"\n📅 Report Period: {report_data.get('period', {}).get('start', 'N/A')} to {report_data.get('period', {}).get('end', 'N/A')}"
             body += f"\n🏢 Organization: {org_id}"
 
-            success = self.apobj.notify(title=title, body=body)
+            success = await self._notify(title=title, body=body)
 
             if success:
                 logger.info(f"Monthly report notification sent for org {org_id}")
@@ -344,6 +344,12 @@ class AlertService:
 
         return body
 
+    async def _notify(self, title: str, body: str) -> bool:
+        """Deliver to all configured channels concurrently"""
+        # async_notify fans out to every destination at once, so latency is
+        # the slowest channel rather than the sum of all of them
+        return await self.apobj.async_notify(title=title, body=body)
+
     def get_configured_channels(self) -> List[str]:
         """Get list of configured notification channels"""
         channels = []
@@ -366,7 +372,7 @@ class AlertService:
         test_title = "🧪 Test Notification - Collexa Billing System"
         test_message = "This is a test notification to verify your alert channels are working correctly."
 
-        success = self.apobj.notify(title=test_title, body=test_message)
+        success = await self._notify(title=test_title, body=test_message)
 
         return {
             "success": success,
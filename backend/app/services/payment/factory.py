@@ -6,6 +6,7 @@ allowing the application to switch between different payment systems
 through configuration.
 """
 
+from functools import lru_cache
 from typing import Dict, Type, List
 from app.services.payment.protocol import PaymentProvider, PaymentProviderConfigError
 from app.core.config import settings
@@ -98,6 +99,7 @@ class PaymentProviderFactory:
     def clear_instances(cls):
         """Clear all cached provider instances (useful for testing)"""
         cls._instances.clear()
+        get_payment_provider.cache_clear()
         logger.debug("Cleared all payment provider instances")
 
 
@@ -143,10 +145,14 @@ _register_available_providers()
 
 
 # Convenience function for getting the default provider
+@lru_cache(maxsize=1)
 def get_payment_provider() -> PaymentProvider:
     """
     Get the default payment provider instance.
 
+    Memoized so services constructed per request skip the settings and
+    registry lookup; PaymentProviderFactory.clear_instances() resets it.
+
     Returns:
         PaymentProvider instance based on current configuration
     """
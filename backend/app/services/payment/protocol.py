@@ -6,7 +6,7 @@ along with common data models used across the payment system.
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
@@ -141,6 +141,29 @@ class PaymentProvider(ABC):
     ) -> CheckoutSession:
         """Create a checkout session for subscription signup"""
 
+    async def create_checkout_session_for_new_customer(
+        self,
+        email: str,
+        plan_id: str,
+        success_url: str,
+        cancel_url: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> CheckoutSession:
+        """Create a subscription checkout for someone who is not a customer yet.
+
+        The default creates the customer first. Providers whose checkout can
+        create the customer on completion should override this to skip that
+        round trip.
+        """
+        customer = await self.create_customer(email=email, metadata=metadata)
+        return await self.create_checkout_session(
+            customer_id=customer.id,
+            plan_id=plan_id,
+            success_url=success_url,
+            cancel_url=cancel_url,
+            metadata=metadata,
+        )
+
     @abstractmethod
     async def get_subscription(self, subscription_id: str) -> Optional[Subscription]:
         """Get subscription by provider-specific ID"""
@@ -165,6 +188,22 @@ class PaymentProvider(ABC):
     ) -> WebhookEvent:
         """Verify webhook signature and parse event"""
 
+    def verify_webhook_signatures(
+        self, items: List[Tuple[bytes, str]], secret: str
+    ) -> List[Optional[WebhookEvent]]:
+        """Verify a batch of (payload, signature) pairs.
+
+        Returns one entry per item, None where verification failed. Providers
+        can override this to share per-secret setup across the batch.
+        """
+        events: List[Optional[WebhookEvent]] = []
+        for payload, signature in items:
+            try:
+                events.append(self.verify_webhook_signature(payload, signature, secret))
+            except WebhookVerificationError:
+                events.append(None)
+        return events
+
     @abstractmethod
     def get_provider_name(self) -> str:
         """Get provider name for logging/debugging"""
@@ -173,6 +212,14 @@ class PaymentProvider(ABC):
     def get_dashboard_url(self, customer_id: str) -> Optional[str]:
         """Get URL to customer dashboard (if supported)"""
 
+    def is_configured(self) -> bool:
+        """Whether the provider has the credentials it needs.
+
+        Cheap enough for health checks; providers with required settings
+        should override it.
+        """
+        return True
+
 
 class PaymentProviderError(Exception):
     """Base exception for payment provider errors"""
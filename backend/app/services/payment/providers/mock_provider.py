@@ -150,7 +150,7 @@ class MockProvider(PaymentProvider):
             data = json.loads(payload.decode())
 
             return WebhookEvent(
-                id=f"mock_evt_{uuid.uuid4().hex[:12]}",
+                id=data.get("id") or f"mock_evt_{uuid.uuid4().hex[:12]}",
                 type=data.get("type", "test.event"),
                 data=data.get("data", {}),
                 created=int(time.time()),
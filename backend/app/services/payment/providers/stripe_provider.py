@@ -5,8 +5,14 @@ This module implements the PaymentProvider interface for Stripe,
 handling all Stripe-specific API interactions and data transformations.
 """
 
+import asyncio
+import hmac
+import json
+import time
 import stripe
-from typing import Dict, Any, Optional, List
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import hmac as crypto_hmac
+from typing import Dict, Any, Optional, List, Tuple, Union
 from app.services.payment.protocol import (
     PaymentProvider,
     Customer,
@@ -27,6 +33,23 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Same tolerance stripe.Webhook.construct_event applies by default
+WEBHOOK_TOLERANCE_SECONDS = 300
+
+# secret -> HMAC-SHA256 keyed with it; copied per verification so the
+# key schedule (inner/outer pad hashing) runs once per secret
+_hmac_templates: Dict[Union[str, bytes], crypto_hmac.HMAC] = {}
+
+
+def _hmac_template(secret: Union[str, bytes]) -> crypto_hmac.HMAC:
+    # cryptography's HMAC runs in OpenSSL (SHA-NI where the CPU has it)
+    template = _hmac_templates.get(secret)
+    if template is None:
+        key = secret if isinstance(secret, bytes) else secret.encode("utf-8")
+        template = crypto_hmac.HMAC(key, hashes.SHA256())
+        _hmac_templates[secret] = template
+    return template
+
 
 class StripeProvider(PaymentProvider):
     """Stripe implementation of the PaymentProvider interface"""
@@ -37,6 +60,8 @@ class StripeProvider(PaymentProvider):
 
         stripe.api_key = settings.STRIPE_SECRET_KEY
         self._webhook_secret = settings.STRIPE_WEBHOOK_SECRET
+        # Keyed once here; the configured secret is what nearly every event uses
+        self._webhook_template = _hmac_template(self._webhook_secret or "")
 
     async def create_customer(
         self,
@@ -46,8 +71,9 @@ class StripeProvider(PaymentProvider):
     ) -> Customer:
         """Create a new Stripe customer"""
         try:
-            stripe_customer = stripe.Customer.create(
-                email=email, name=name, metadata=metadata or {}
+            # The SDK is blocking; keep its HTTP round trip off the event loop
+            stripe_customer = await asyncio.to_thread(
+                stripe.Customer.create, email=email, name=name, metadata=metadata or {}
             )
             return self._convert_stripe_customer(stripe_customer)
         except stripe.error.StripeError as e:
@@ -59,7 +85,9 @@ class StripeProvider(PaymentProvider):
     async def get_customer(self, customer_id: str) -> Optional[Customer]:
         """Get Stripe customer by ID"""
         try:
-            stripe_customer = stripe.Customer.retrieve(customer_id)
+            stripe_customer = await asyncio.to_thread(
+                stripe.Customer.retrieve, customer_id
+            )
             if stripe_customer.deleted:
                 return None
             return self._convert_stripe_customer(stripe_customer)
@@ -86,7 +114,9 @@ class StripeProvider(PaymentProvider):
             if metadata is not None:
                 update_data["metadata"] = metadata
 
-            stripe_customer = stripe.Customer.modify(customer_id, **update_data)
+            stripe_customer = await asyncio.to_thread(
+                stripe.Customer.modify, customer_id, **update_data
+            )
             return self._convert_stripe_customer(stripe_customer)
         except stripe.error.InvalidRequestError as e:
             raise CustomerNotFoundError(
@@ -108,7 +138,8 @@ class StripeProvider(PaymentProvider):
     ) -> CheckoutSession:
         """Create Stripe checkout session"""
         try:
-            session = stripe.checkout.Session.create(
+            session = await asyncio.to_thread(
+                stripe.checkout.Session.create,
                 customer=customer_id,
                 payment_method_types=["card"],
                 line_items=[
@@ -135,10 +166,50 @@ class StripeProvider(PaymentProvider):
                 f"Failed to create checkout session: {str(e)}", "stripe", e
             )
 
+    async def create_checkout_session_for_new_customer(
+        self,
+        email: str,
+        plan_id: str,
+        success_url: str,
+        cancel_url: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> CheckoutSession:
+        """Create Stripe checkout that creates the customer on completion"""
+        try:
+            session = await asyncio.to_thread(
+                stripe.checkout.Session.create,
+                customer_email=email,
+                payment_method_types=["card"],
+                line_items=[
+                    {
+                        "price": plan_id,
+                        "quantity": 1,
+                    }
+                ],
+                mode="subscription",
+                success_url=success_url,
+                cancel_url=cancel_url,
+                metadata=metadata or {},
+            )
+
+            return CheckoutSession(
+                id=session.id,
+                url=session.url,
+                customer_id=session.customer,
+                metadata=session.metadata,
+            )
+        except stripe.error.StripeError as e:
+            logger.error(f"Failed to create Stripe checkout session: {e}")
+            raise PaymentProviderError(
+                f"Failed to create checkout session: {str(e)}", "stripe", e
+            )
+
     async def get_subscription(self, subscription_id: str) -> Optional[Subscription]:
         """Get Stripe subscription by ID"""
         try:
-            stripe_sub = stripe.Subscription.retrieve(subscription_id)
+            stripe_sub = await asyncio.to_thread(
+                stripe.Subscription.retrieve, subscription_id
+            )
             return self._convert_stripe_subscription(stripe_sub)
         except stripe.error.InvalidRequestError:
             return None
@@ -151,7 +222,9 @@ class StripeProvider(PaymentProvider):
     async def cancel_subscription(self, subscription_id: str) -> Subscription:
         """Cancel Stripe subscription"""
         try:
-            stripe_sub = stripe.Subscription.delete(subscription_id)
+            stripe_sub = await asyncio.to_thread(
+                stripe.Subscription.delete, subscription_id
+            )
             return self._convert_stripe_subscription(stripe_sub)
         except stripe.error.InvalidRequestError as e:
             raise SubscriptionNotFoundError(
@@ -172,8 +245,10 @@ class StripeProvider(PaymentProvider):
             if timestamp:
                 usage_record_data["timestamp"] = timestamp
 
-            stripe.UsageRecord.create(
-                subscription_item=subscription_item_id, **usage_record_data
+            await asyncio.to_thread(
+                stripe.UsageRecord.create,
+                subscription_item=subscription_item_id,
+                **usage_record_data,
             )
             return True
         except stripe.error.StripeError as e:
@@ -185,21 +260,81 @@ class StripeProvider(PaymentProvider):
     async def get_invoices(self, customer_id: str, limit: int = 10) -> List[Invoice]:
         """Get Stripe customer invoices"""
         try:
-            stripe_invoices = stripe.Invoice.list(customer=customer_id, limit=limit)
+            stripe_invoices = await asyncio.to_thread(
+                stripe.Invoice.list, customer=customer_id, limit=limit
+            )
             return [self._convert_stripe_invoice(inv) for inv in stripe_invoices.data]
         except stripe.error.StripeError as e:
             logger.error(f"Failed to get Stripe invoices for {customer_id}: {e}")
             raise PaymentProviderError(f"Failed to get invoices: {str(e)}", "stripe", e)
 
     def verify_webhook_signature(
-        self, payload: bytes, signature: str, secret: str
+        self, payload: bytes, signature: str, secret: Union[str, bytes]
     ) -> WebhookEvent:
         """Verify Stripe webhook signature and parse event"""
-        try:
-            event = stripe.Webhook.construct_event(
-                payload, signature, secret or self._webhook_secret
-            )
+        template = self._template_for(secret)
+        return self._verify_with_template(
+            template, payload, signature, int(time.time())
+        )
+
+    def verify_webhook_signatures(
+        self, items: List[Tuple[bytes, str]], secret: Union[str, bytes]
+    ) -> List[Optional[WebhookEvent]]:
+        """Verify a burst of Stripe webhooks sharing one HMAC key schedule"""
+        template = self._template_for(secret)
+        now = int(time.time())
+
+        events: List[Optional[WebhookEvent]] = []
+        for payload, signature in items:
+            try:
+                events.append(
+                    self._verify_with_template(template, payload, signature, now)
+                )
+            except WebhookVerificationError as e:
+                logger.warning(f"Stripe webhook in batch failed verification: {e}")
+                events.append(None)
+        return events
+
+    def get_provider_name(self) -> str:
+        """Get provider name"""
+        return "stripe"
+
+    def is_configured(self) -> bool:
+        """Stripe is usable once an API key is set"""
+        return bool(stripe.api_key)
 
+    def get_dashboard_url(self, customer_id: str) -> Optional[str]:
+        """Get Stripe customer dashboard URL"""
+        return f"https://dashboard.stripe.com/customers/{customer_id}"
+
+    # Helper methods for webhook verification
+
+    def _template_for(self, secret: Union[str, bytes]) -> crypto_hmac.HMAC:
+        """HMAC template for a secret (str or pre-encoded bytes)"""
+        if not secret or secret == self._webhook_secret:
+            return self._webhook_template
+        return _hmac_template(secret)
+
+    def _verify_with_template(
+        self, template: crypto_hmac.HMAC, payload: bytes, signature: str, now: int
+    ) -> WebhookEvent:
+        """Check a Stripe-Signature header using a pre-keyed HMAC template"""
+        timestamp, candidates = self._parse_signature_header(signature)
+        if timestamp is None or not candidates:
+            raise WebhookVerificationError("Invalid signature header", "stripe")
+        if abs(now - timestamp) > WEBHOOK_TOLERANCE_SECONDS:
+            raise WebhookVerificationError("Timestamp outside tolerance", "stripe")
+
+        mac = template.copy()
+        mac.update(str(timestamp).encode("ascii"))
+        mac.update(b".")
+        mac.update(payload)
+        expected = mac.finalize().hex().encode("ascii")
+        if not any(hmac.compare_digest(expected, c) for c in candidates):
+            raise WebhookVerificationError("Invalid signature", "stripe")
+
+        try:
+            event = json.loads(payload)
             return WebhookEvent(
                 id=event["id"],
                 type=event["type"],
@@ -207,18 +342,27 @@ class StripeProvider(PaymentProvider):
                 created=event["created"],
                 provider="stripe",
             )
-        except ValueError as e:
+        except (ValueError, KeyError, TypeError) as e:
             raise WebhookVerificationError("Invalid payload", "stripe", e)
-        except stripe.error.SignatureVerificationError as e:
-            raise WebhookVerificationError("Invalid signature", "stripe", e)
-
-    def get_provider_name(self) -> str:
-        """Get provider name"""
-        return "stripe"
 
-    def get_dashboard_url(self, customer_id: str) -> Optional[str]:
-        """Get Stripe customer dashboard URL"""
-        return f"https://dashboard.stripe.com/customers/{customer_id}"
+    @staticmethod
+    def _parse_signature_header(
+        signature: str,
+    ) -> Tuple[Optional[int], List[bytes]]:
+        """Split "t=...,v1=...,v1=..." into the timestamp and v1 signatures"""
+        timestamp: Optional[int] = None
+        # Bytes, so compare_digest never raises on non-ASCII header junk
+        candidates: List[bytes] = []
+        for part in (signature or "").split(","):
+            name, _, value = part.strip().partition("=")
+            if name == "t":
+                try:
+                    timestamp = int(value)
+                except ValueError:
+                    return None, []
+            elif name == "v1":
+                candidates.append(value.encode("utf-8", "replace"))
+        return timestamp, candidates
 
     # Helper methods for data conversion
 
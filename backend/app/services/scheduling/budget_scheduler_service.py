@@ -265,7 +265,7 @@ class BudgetSchedulerService:
             for org in orgs:
                 try:
                     # Generate report
-                    report = await usage_orchestrator.generate_usage_report(
+                    report = usage_orchestrator.generate_usage_report(
                         org.id, start_date, end_date
                     )
 
@@ -5,7 +5,8 @@ This service coordinates usage tracking, cost calculation, budget enforcement,
 and reporting by orchestrating multiple smaller services.
 """
 
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
 from datetime import datetime
 import asyncio
@@ -75,32 +76,37 @@ class UsageOrchestrator:
             input_tokens=input_tokens, output_tokens=output_tokens, org_id=org_id
         )
 
-        # Check budget before recording usage
+        # Check budget before recording usage; the same timestamp is reused below
+        now = datetime.utcnow()
         total_cost_cents = self.cost_calculator.calculate_total_cost(usage_costs)
         self.budget_enforcement.check_budget_before_usage(
-            org_id, total_cost_cents, agent_id
+            org_id, total_cost_cents, agent_id, now=now
         )
 
-        # Record each usage type
-        usage_records = []
-        for cost in usage_costs:
-            if cost.quantity > 0:  # Only record non-zero usage
-                usage_record = self._create_usage_record(
-                    org_id=org_id,
-                    agent_id=agent_id,
-                    run_id=run_id,
-                    usage_cost=cost,
-                    metadata={
+        # Record each non-zero usage type in a single INSERT
+        usage_records = self._create_usage_records(
+            org_id=org_id,
+            agent_id=agent_id,
+            run_id=run_id,
+            usage_costs=[
+                (
+                    cost,
+                    {
                         **(metadata or {}),
                         "rate_cents_per_unit": cost.rate_cents_per_unit,
                     },
                 )
-                usage_records.append(usage_record)
+                for cost in usage_costs
+                if cost.quantity > 0
+            ],
+            now=now,
+        )
 
-        # Update budgets
+        # Update budgets; one commit covers them and the usage records
         self.budget_enforcement.update_budgets_for_usage(
-            org_id, total_cost_cents, agent_id
+            org_id, total_cost_cents, agent_id, commit=False, now=now
         )
+        self.db.commit()
 
         # Report usage to payment provider (async)
         asyncio.create_task(self._report_usage_to_provider(org_id, total_cost_cents))
@@ -123,8 +129,9 @@ class UsageOrchestrator:
         cost = self.cost_calculator.calculate_cost("learning_hour", quantity, org_id)
 
         # Check budget
+        now = datetime.utcnow()
         self.budget_enforcement.check_budget_before_usage(
-            org_id, cost.cost_cents, agent_id
+            org_id, cost.cost_cents, agent_id, now=now
         )
 
         # Record usage
@@ -138,12 +145,14 @@ class UsageOrchestrator:
                 "learning_hours": learning_hours,
                 "rate_cents_per_unit": cost.rate_cents_per_unit,
             },
+            now=now,
         )
 
-        # Update budgets
+        # Update budgets; one commit covers them and the usage record
         self.budget_enforcement.update_budgets_for_usage(
-            org_id, cost.cost_cents, agent_id
+            org_id, cost.cost_cents, agent_id, commit=False, now=now
         )
+        self.db.commit()
 
         # Report to payment provider
         asyncio.create_task(self._report_usage_to_provider(org_id, cost.cost_cents))
@@ -164,8 +173,9 @@ class UsageOrchestrator:
         cost = self.cost_calculator.calculate_cost("storage_mb", storage_mb, org_id)
 
         # Check budget
+        now = datetime.utcnow()
         self.budget_enforcement.check_budget_before_usage(
-            org_id, cost.cost_cents, agent_id
+            org_id, cost.cost_cents, agent_id, now=now
         )
 
         # Record usage
@@ -179,12 +189,14 @@ class UsageOrchestrator:
                 "storage_mb": storage_mb,
                 "rate_cents_per_unit": cost.rate_cents_per_unit,
             },
+            now=now,
         )
 
-        # Update budgets
+        # Update budgets; one commit covers them and the usage record
         self.budget_enforcement.update_budgets_for_usage(
-            org_id, cost.cost_cents, agent_id
+            org_id, cost.cost_cents, agent_id, commit=False, now=now
         )
+        self.db.commit()
 
         # Report to payment provider
         asyncio.create_task(self._report_usage_to_provider(org_id, cost.cost_cents))
@@ -234,45 +246,96 @@ class UsageOrchestrator:
         period_end: Optional[datetime] = None,
     ) -> Dict[str, Any]:
         """Get usage summary for an organization or agent"""
-        query = self.db.query(models.UsageRecord).filter(
-            models.UsageRecord.org_id == org_id
-        )
+        record = models.UsageRecord
+        query = self.db.query(
+            record.usage_type,
+            func.sum(record.quantity),
+            func.sum(record.cost_cents),
+            func.count(record.id),
+        ).filter(record.org_id == org_id)
 
         if agent_id:
-            query = query.filter(models.UsageRecord.agent_id == agent_id)
+            query = query.filter(record.agent_id == agent_id)
 
         if period_start:
-            query = query.filter(models.UsageRecord.recorded_at >= period_start)
+            query = query.filter(record.recorded_at >= period_start)
 
         if period_end:
-            query = query.filter(models.UsageRecord.recorded_at <= period_end)
+            query = query.filter(record.recorded_at <= period_end)
 
-        usage_records = query.all()
+        # One row per usage type comes back instead of every record
+        rows = query.group_by(record.usage_type).all()
+        return self._summarize_usage(rows, period_start, period_end)
 
-        # Aggregate usage by type
-        usage_by_type = {}
-        total_cost_cents = 0
+    def generate_usage_report(
+        self, org_id: str, start_date: datetime, end_date: datetime
+    ) -> Dict[str, Any]:
+        """
+        Generate a usage report for an organization.
 
-        for record in usage_records:
-            if record.usage_type not in usage_by_type:
-                usage_by_type[record.usage_type] = {
-                    "quantity": 0,
-                    "cost_cents": 0,
-                    "count": 0,
-                }
+        Totals are aggregated in the database (GROUP BY usage type, and by
+        agent and usage type), so only one row per group is transferred.
 
-            usage_by_type[record.usage_type]["quantity"] += record.quantity
-            usage_by_type[record.usage_type]["cost_cents"] += record.cost_cents
-            usage_by_type[record.usage_type]["count"] += 1
-            total_cost_cents += record.cost_cents
+        Args:
+            org_id: Organization ID
+            start_date: Report period start (inclusive)
+            end_date: Report period end (inclusive)
+
+        Returns:
+            Report with org summary, per-agent usage and budget status
+        """
+        record = models.UsageRecord
+        totals = (
+            func.sum(record.quantity),
+            func.sum(record.cost_cents),
+            func.count(record.id),
+        )
+        in_period = (
+            record.org_id == org_id,
+            record.recorded_at >= start_date,
+            record.recorded_at <= end_date,
+        )
+
+        summary_rows = (
+            self.db.query(record.usage_type, *totals)
+            .filter(*in_period)
+            .group_by(record.usage_type)
+            .all()
+        )
+
+        agent_rows = (
+            self.db.query(
+                record.agent_id, models.Agent.display_name, record.usage_type, *totals
+            )
+            .join(models.Agent, models.Agent.id == record.agent_id)
+            .filter(*in_period, models.Agent.org_id == org_id)
+            .group_by(record.agent_id, models.Agent.display_name, record.usage_type)
+            .all()
+        )
+
+        rows_by_agent: Dict[str, List[Tuple]] = {}
+        agent_names: Dict[str, Optional[str]] = {}
+        for agent_id, display_name, usage_type, quantity, cost, count in agent_rows:
+            rows_by_agent.setdefault(agent_id, []).append(
+                (usage_type, quantity, cost, count)
+            )
+            agent_names[agent_id] = display_name
+
+        agent_usage = {
+            agent_id: {
+                "agent_name": agent_names[agent_id],
+                **self._summarize_usage(rows, start_date, end_date),
+            }
+            for agent_id, rows in rows_by_agent.items()
+        }
 
         return {
-            "total_cost_cents": total_cost_cents,
-            "total_cost_dollars": total_cost_cents / 100,
-            "usage_by_type": usage_by_type,
-            "record_count": len(usage_records),
-            "period_start": period_start.isoformat() if period_start else None,
-            "period_end": period_end.isoformat() if period_end else None,
+            "org_id": org_id,
+            "period": {"start": start_date.isoformat(), "end": end_date.isoformat()},
+            "summary": self._summarize_usage(summary_rows, start_date, end_date),
+            "agent_usage": agent_usage,
+            "budget_status": self.get_budget_status(org_id),
+            "generated_at": datetime.utcnow().isoformat(),
         }
 
     def get_budget_status(self, org_id: str) -> Dict[str, Any]:
@@ -302,6 +365,35 @@ class UsageOrchestrator:
 
     # Private helper methods
 
+    @staticmethod
+    def _summarize_usage(
+        rows: Iterable[Tuple[str, int, int, int]],
+        period_start: Optional[datetime],
+        period_end: Optional[datetime],
+    ) -> Dict[str, Any]:
+        """Shape (usage_type, quantity, cost_cents, count) rows into a summary"""
+        usage_by_type = {}
+        total_cost_cents = 0
+        record_count = 0
+
+        for usage_type, quantity, cost_cents, count in rows:
+            usage_by_type[usage_type] = {
+                "quantity": int(quantity or 0),
+                "cost_cents": int(cost_cents or 0),
+                "count": count,
+            }
+            total_cost_cents += int(cost_cents or 0)
+            record_count += count
+
+        return {
+            "total_cost_cents": total_cost_cents,
+            "total_cost_dollars": total_cost_cents / 100,
+            "usage_by_type": usage_by_type,
+            "record_count": record_count,
+            "period_start": period_start.isoformat() if period_start else None,
+            "period_end": period_end.isoformat() if period_end else None,
+        }
+
     def _create_usage_record(
         self,
         org_id: str,
@@ -309,29 +401,64 @@ class UsageOrchestrator:
         agent_id: Optional[str] = None,
         run_id: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
+        now: Optional[datetime] = None,
     ) -> models.UsageRecord:
-        """Create and save a usage record"""
-        now = datetime.utcnow()
-        billing_period = now.strftime("%Y-%m")  # YYYY-MM format
-
-        usage_record = models.UsageRecord(
-            id=str(uuid.uuid4()),
+        """Create a usage record; the caller commits"""
+        (usage_record,) = self._create_usage_records(
             org_id=org_id,
             agent_id=agent_id,
             run_id=run_id,
-            usage_type=usage_cost.usage_type,
-            quantity=usage_cost.quantity,
-            cost_cents=usage_cost.cost_cents,
-            recorded_at=now,
-            billing_period=billing_period,
-            metadata=metadata or {},
+            usage_costs=[(usage_cost, metadata)],
+            now=now,
         )
+        return usage_record
 
-        self.db.add(usage_record)
-        self.db.commit()
-        self.db.refresh(usage_record)
+    def _create_usage_records(
+        self,
+        org_id: str,
+        usage_costs: List[Tuple[UsageCost, Optional[Dict[str, Any]]]],
+        agent_id: Optional[str] = None,
+        run_id: Optional[str] = None,
+        now: Optional[datetime] = None,
+    ) -> List[models.UsageRecord]:
+        """
+        Insert usage records in one statement without committing.
 
-        return usage_record
+        Args:
+            org_id: Organization ID
+            usage_costs: Cost of each usage type with its metadata
+            agent_id: Agent ID (if applicable)
+            run_id: Run ID (if applicable)
+            now: Time to record the usage at (defaults to the current UTC time)
+
+        Returns:
+            The inserted records, built from the same values
+        """
+        if not usage_costs:
+            return []
+
+        now = now or datetime.utcnow()
+        billing_period = now.strftime("%Y-%m")  # YYYY-MM format
+
+        rows = [
+            {
+                "id": str(uuid.uuid4()),
+                "org_id": org_id,
+                "agent_id": agent_id,
+                "run_id": run_id,
+                "usage_type": usage_cost.usage_type,
+                "quantity": usage_cost.quantity,
+                "cost_cents": usage_cost.cost_cents,
+                "recorded_at": now,
+                "billing_period": billing_period,
+                "metadata_json": metadata or {},
+            }
+            for usage_cost, metadata in usage_costs
+        ]
+        self.db.execute(insert(models.UsageRecord), rows)
+
+        # Every column is set client-side, so no refresh round-trip is needed
+        return [models.UsageRecord(**row) for row in rows]
 
     async def _report_usage_to_provider(self, org_id: str, cost_cents: int):
         """Report usage to payment provider for billing"""
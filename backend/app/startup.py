@@ -12,6 +12,10 @@ from contextlib import asynccontextmanager
 from app.services.scheduling.budget_scheduler_service import budget_scheduler
 from app.services.notifications.alert_service import alert_service
 from app.services.http_client import close_http_client
+from app.services.billing.webhook_service import (
+    start_billing_event_writer,
+    stop_billing_event_writer,
+)
 from app.services.compression.dictionary_trainer import ZstdDictionaryTrainer
 from app.services.compression.basic_engine import BasicCompressionEngine
 
@@ -33,6 +37,9 @@ async def lifespan(app):
         await budget_scheduler.start()
         logger.info("Budget scheduler started successfully")
 
+        # Batch webhook audit-log inserts instead of one INSERT per event
+        start_billing_event_writer()
+
         # Train a small zstd dictionary from a seed corpus and attach engine to app.state
         try:
             seed_samples = [
@@ -89,7 +96,14 @@ async def lifespan(app):
             # Do not block startup if OPA/tool wiring is not available
             pass
 
-            logger.warning(f"Compression engine initialized without dictionary: {e}")
+        # Warm the Stack Auth JWKS cache so the first request can verify locally
+        try:
+            from app.security import stack_auth
+
+            if stack_auth.STACK_AUTH_LOCAL_VERIFY and stack_auth.STACK_PROJECT_ID:
+                await asyncio.to_thread(stack_auth.get_stack_jwks)
+        except Exception as e:
+            logger.warning(f"Failed to prefetch Stack Auth JWKS: {e}")
 
         # Test notification channels
         channels = alert_service.get_configured_channels()
@@ -138,6 +152,9 @@ async def lifespan(app):
         await budget_scheduler.stop()
         logger.info("Budget scheduler stopped successfully")
 
+        # Flush queued billing events before the process exits
+        await stop_billing_event_writer()
+
         # Close shared HTTP client
         await close_http_client()
         logger.info("HTTP client closed")
@@ -16,6 +16,7 @@ from app.services.budget_service import (
     EnforcementMode,
     BudgetExceededException,
 )
+from app.services.budget.budget_cache import clear_budget_cache
 from app.services.metering_service import MeteringService
 from app.services.payment.providers.mock_provider import MockProvider
 from app.db import models
@@ -28,6 +29,7 @@ class TestBillingIntegration:
         """Setup test environment"""
         self.mock_db = Mock(spec=Session)
         self.mock_provider = MockProvider()
+        clear_budget_cache()
 
         # Test data
         self.org_id = "test-org-123"
@@ -109,7 +111,7 @@ class TestBillingIntegration:
         )
 
         # Mock active budgets to include our budget
-        self.mock_db.query.return_value.filter.return_value.all.return_value = [budget]
+        self.mock_db.execute.return_value.all.return_value = [budget]
 
         # Also mock org-level query path
         def query_side_effect(model):
@@ -152,6 +154,7 @@ class TestBillingIntegration:
         self.mock_db.query.return_value.filter.return_value.first.return_value = (
             subscription
         )
+        self.mock_db.scalars.return_value.first.return_value = subscription
 
         # Record usage
         usage_records = await metering_service.record_agent_invocation(
@@ -184,10 +187,10 @@ class TestBillingIntegration:
             email="test@example.com",
         )
 
-        # Mock customer retrieval
-        self.mock_db.query.return_value.filter.return_value.first.return_value = (
-            billing_customer
-        )
+        # Mock customer retrieval; the subscription does not exist yet
+        self.mock_db.scalars.return_value.first.side_effect = [billing_customer, None]
+        # Event has not been logged before
+        self.mock_db.scalar.return_value = None
 
         # Create webhook payload
         import json
@@ -246,13 +249,15 @@ class TestBillingIntegration:
             ),
         ]
 
-        # Configure chained mocks to return our list
+        # Configure chained mocks to return the per-type aggregate rows
         mock_query = self.mock_db.query.return_value
         mock_filter = mock_query.filter.return_value
         # Support chained filters
         mock_filter.filter.return_value = mock_filter
-        mock_filter.all.return_value = usage_records[:]
-        mock_filter.all.side_effect = None
+        mock_filter.group_by.return_value.all.return_value = [
+            (record.usage_type, record.quantity, record.cost_cents, 1)
+            for record in usage_records
+        ]
 
         # Generate summary
         summary = budget_service.get_usage_summary(
@@ -281,9 +286,7 @@ class TestBillingIntegration:
             email="test@example.com",
         )
 
-        self.mock_db.query.return_value.filter.return_value.first.return_value = (
-            billing_customer
-        )
+        self.mock_db.scalars.return_value.first.return_value = billing_customer
 
         # Ensure provider has the customer
         self.mock_provider._customers[
@@ -326,6 +329,7 @@ class TestBillingIntegration:
         mock_query.filter.return_value = mock_filter
         mock_filter.first.return_value = self.mock_org
         mock_filter.all.return_value = []
+        self.mock_db.execute.return_value.all.return_value = []  # No budgets
 
         # Setup specific mocks for different queries
         def query_side_effect(model):
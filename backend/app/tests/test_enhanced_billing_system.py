@@ -11,7 +11,7 @@ from app.services.billing.async_webhook_service import (
 from app.services.notifications.alert_service import AlertService, AlertSeverity
 from app.services.scheduling.budget_scheduler_service import BudgetSchedulerService
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 from datetime import datetime, timedelta
 
 # Skip this suite if optional deps not installed
@@ -82,7 +82,10 @@ class TestEnhancedBillingSystem:
 
         # Mock the apprise notify method
         with patch.object(
-            alert_service.apobj, "notify", return_value=True
+            alert_service.apobj,
+            "async_notify",
+            new_callable=AsyncMock,
+            return_value=True,
         ) as mock_notify:
             success = await alert_service.send_budget_violation_alert(
                 org_id=self.org_id,
@@ -91,7 +94,7 @@ class TestEnhancedBillingSystem:
             )
 
             assert success is True
-            mock_notify.assert_called_once()
+            mock_notify.assert_awaited_once()
 
             # Check the call arguments
             call_args = mock_notify.call_args
@@ -118,14 +121,17 @@ class TestEnhancedBillingSystem:
         ]
 
         with patch.object(
-            alert_service.apobj, "notify", return_value=True
+            alert_service.apobj,
+            "async_notify",
+            new_callable=AsyncMock,
+            return_value=True,
         ) as mock_notify:
             success = await alert_service.send_budget_warning_alert(
                 org_id=self.org_id, warnings=warnings, severity=AlertSeverity.WARNING
             )
 
             assert success is True
-            mock_notify.assert_called_once()
+            mock_notify.assert_awaited_once()
 
             call_args = mock_notify.call_args
             assert "Budget Warning" in call_args.kwargs["title"]
@@ -146,7 +152,10 @@ class TestEnhancedBillingSystem:
         }
 
         with patch.object(
-            alert_service.apobj, "notify", return_value=True
+            alert_service.apobj,
+            "async_notify",
+            new_callable=AsyncMock,
+            return_value=True,
         ) as mock_notify:
             success = await alert_service.send_system_alert(
                 title="System Test",
@@ -156,7 +165,7 @@ class TestEnhancedBillingSystem:
             )
 
             assert success is True
-            mock_notify.assert_called_once()
+            mock_notify.assert_awaited_once()
 
             call_args = mock_notify.call_args
             assert "System Test" in call_args.kwargs["title"]
@@ -204,7 +213,7 @@ class TestEnhancedBillingSystem:
 
             # This would normally be called by Celery, but we'll test the function
             # directly
-            with patch("app.services.billing.async_webhook_service.get_db"):
+            with patch("app.services.billing.async_webhook_service.WorkerSession"):
                 # First call should fail and trigger retry logic
                 try:
                     result = process_webhook_async(
@@ -246,14 +255,17 @@ class TestEnhancedBillingSystem:
         }
 
         with patch.object(
-            alert_service.apobj, "notify", return_value=True
+            alert_service.apobj,
+            "async_notify",
+            new_callable=AsyncMock,
+            return_value=True,
         ) as mock_notify:
             success = await alert_service.send_monthly_report_notification(
                 org_id=self.org_id, report_data=report_data
             )
 
             assert success is True
-            mock_notify.assert_called_once()
+            mock_notify.assert_awaited_once()
 
             call_args = mock_notify.call_args
             assert "Monthly Usage Report" in call_args.kwargs["title"]
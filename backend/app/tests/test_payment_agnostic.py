@@ -6,7 +6,7 @@ payment providers without changing business logic.
 """
 
 import pytest
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock, patch
 from sqlalchemy.orm import Session
 
 from app.services.billing_service import BillingService
@@ -43,6 +43,7 @@ class TestPaymentAgnosticBilling:
         )
         self.mock_db.add = Mock()
         self.mock_db.commit = Mock()
+        self.mock_db.scalar.return_value = None
         self.mock_db.refresh = Mock()
 
         # Act
@@ -77,9 +78,7 @@ class TestPaymentAgnosticBilling:
         )
 
         # Mock database operations
-        self.mock_db.query.return_value.filter.return_value.first.return_value = (
-            mock_billing_customer
-        )
+        self.mock_db.scalars.return_value.first.return_value = mock_billing_customer
 
         # Ensure provider has the customer registered
         self.mock_db.add = Mock()
@@ -175,6 +174,7 @@ class TestPaymentAgnosticBilling:
         # Mock database operations for event logging
         self.mock_db.add = Mock()
         self.mock_db.commit = Mock()
+        self.mock_db.scalar.return_value = None  # Event not yet recorded
 
         # Create test webhook payload
         import json
@@ -193,14 +193,19 @@ class TestPaymentAgnosticBilling:
             }
         ).encode()
 
+        handler = AsyncMock(wraps=BillingService._HANDLERS["customer.subscription"])
+
         # Act
-        success = await billing_service.handle_webhook_event(
-            payload=webhook_payload, signature="mock_signature"
-        )
+        with patch.dict(BillingService._HANDLERS, {"customer.subscription": handler}):
+            success = await billing_service.handle_webhook_event(
+                payload=webhook_payload, signature="mock_signature"
+            )
 
         # Assert
         assert success is True
-        self.mock_db.add.assert_called()  # Event was logged
+        self.mock_db.execute.assert_called()  # Event was logged
+        handler.assert_awaited_once()
+        assert handler.await_args.args[1].type == "customer.subscription.created"
         self.mock_db.commit.assert_called()
 
 
@@ -0,0 +1,105 @@
+"""
+Tests for Stripe webhook signature verification.
+
+These tests sign payloads the same way Stripe does and check both the
+single and batched verification paths.
+"""
+
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+
+from app.core.config import settings
+
+pytest.importorskip("stripe", reason="Stripe SDK not installed")
+
+SECRET = "whsec_test_secret"
+
+
+def _signed(event_id: str, secret: str = SECRET, timestamp: int = None):
+    payload = json.dumps(
+        {
+            "id": event_id,
+            "type": "invoice.created",
+            "data": {"object": {"id": "in_1"}},
+            "created": 1700000000,
+        }
+    ).encode()
+    timestamp = timestamp or int(time.time())
+    digest = hmac.new(
+        secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256
+    ).hexdigest()
+    return payload, f"t={timestamp},v1={digest}"
+
+
+class TestStripeWebhookVerification:
+    """Test Stripe webhook signature checks"""
+
+    def setup_method(self):
+        from app.services.payment.providers.stripe_provider import StripeProvider
+
+        self._old_key = settings.STRIPE_SECRET_KEY
+        settings.STRIPE_SECRET_KEY = "sk_test_123"
+        self.provider = StripeProvider()
+
+    def teardown_method(self):
+        settings.STRIPE_SECRET_KEY = self._old_key
+
+    def test_batch_verification_isolates_bad_items(self):
+        """Valid items verify; tampered or stale ones come back as None"""
+        good_payload, good_sig = _signed("evt_good")
+        bad_payload, _ = _signed("evt_bad")
+        _, other_sig = _signed("evt_other", secret="whsec_wrong")
+        stale_payload, stale_sig = _signed("evt_stale", timestamp=1000)
+
+        events = self.provider.verify_webhook_signatures(
+            [
+                (good_payload, good_sig),
+                (bad_payload, other_sig),
+                (stale_payload, stale_sig),
+            ],
+            SECRET,
+        )
+
+        assert [e.id if e else None for e in events] == ["evt_good", None, None]
+        assert events[0].type == "invoice.created"
+        assert events[0].provider == "stripe"
+
+    def test_matches_stripe_sdk_verification(self):
+        """Single and batch paths agree with stripe.Webhook.construct_event"""
+        import stripe
+
+        payload, signature = _signed("evt_same")
+
+        reference = stripe.Webhook.construct_event(payload, signature, SECRET)
+        single = self.provider.verify_webhook_signature(payload, signature, SECRET)
+        (batched,) = self.provider.verify_webhook_signatures(
+            [(payload, signature)], SECRET
+        )
+
+        for event in (single, batched):
+            assert event.id == reference["id"]
+            assert event.type == reference["type"]
+            assert event.created == reference["created"]
+
+    def test_single_verification_rejects_wrong_secret(self):
+        """A signature made with another secret raises WebhookVerificationError"""
+        from app.services.payment.protocol import WebhookVerificationError
+
+        payload, signature = _signed("evt_x", secret="whsec_wrong")
+
+        with pytest.raises(WebhookVerificationError):
+            self.provider.verify_webhook_signature(payload, signature, SECRET)
+
+    def test_non_ascii_signature_is_rejected_cleanly(self):
+        """A garbled v1 value fails verification instead of raising TypeError"""
+        from app.services.payment.protocol import WebhookVerificationError
+
+        payload, _ = _signed("evt_garbled")
+        signature = f"t={int(time.time())},v1=\u00e9\u00e9"
+
+        with pytest.raises(WebhookVerificationError):
+            self.provider.verify_webhook_signature(payload, signature, SECRET)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Celery worker startup script for budget alert delivery.
+
+This script starts a Celery worker dedicated to the budget-alerts queue,
+which the periodic budget scan fans alert tasks out to.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.billing.async_webhook_service import (
+    BUDGET_ALERT_QUEUE,
+    celery_app,
+)
+
+if __name__ == "__main__":
+    # Start Celery worker
+    celery_app.start(
+        [
+            "worker",
+            "--loglevel=info",
+            "--concurrency=8",
+            "--prefetch-multiplier=1",
+            f"--queues={BUDGET_ALERT_QUEUE}",
+            "--hostname=budget-alert-worker@%h",
+        ]
+    )
@@ -1,4 +1,5 @@
 # Ensure 'app' package is importable when running pytest from backend/
+import contextlib
 import os
 import sys
 import pytest
@@ -25,6 +26,32 @@ def _ensure_tables():
             pass
 
 
+@pytest.fixture
+def capture_statements():
+    """Record the SQL sent to the test engine inside a with-block.
+
+    with capture_statements() as statements:
+        ...  # statements fills with each statement string, in order
+    """
+    from sqlalchemy import event
+    from app.db.session import engine
+
+    @contextlib.contextmanager
+    def _capture():
+        statements = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+
+    return _capture
+
+
 @pytest.fixture
 def mock_auth():
     """Mock authentication that returns valid org/user info."""
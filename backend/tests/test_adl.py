@@ -46,3 +46,15 @@ def test_adl_parsing_and_escaping():
     assert parsed2.agent_id == parsed.agent_id
     assert parsed2.tools == parsed.tools
 
+
+def test_adl_escaping_round_trips_backslashes():
+    brief = CompressedAgentBrief(
+        agent_id="dev\\ops",
+        tools=["C:\\tools\\", "a|b,c"],
+        style="line one\nline two\\",
+    )
+    parsed = CompressedAgentBrief.from_adl(brief.to_adl())
+
+    assert parsed.agent_id == "dev\\ops"
+    assert parsed.tools == ["C:\\tools\\", "a|b,c"]
+    assert parsed.style == "line one\nline two\\"
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+from app.db.session import SessionLocal
+from app.db import models
+from app.services.budget.budget_enforcement_service import BudgetEnforcementService
+
+
+def _budget(
+    budget_id: str, org_id: str, usage: int, limit: int, status: str, agent_id=None
+):
+    now = datetime.utcnow()
+    return models.Budget(
+        id=budget_id,
+        org_id=org_id,
+        agent_id=agent_id,
+        period="monthly",
+        limit_cents=limit,
+        current_usage_cents=usage,
+        period_start=now - timedelta(days=1),
+        period_end=now + timedelta(days=1),
+        enforcement_mode="soft",
+        status=status,
+    )
+
+
+def _seed(db):
+    db.add_all(
+        [
+            models.Org(id="org-a", name="A"),
+            models.Org(id="org-b", name="B"),
+            models.Agent(id="agent-a", org_id="org-a"),
+        ]
+    )
+    db.flush()
+    db.add_all(
+        [
+            _budget("b-a-over", "org-a", 150, 100, "exceeded"),
+            _budget("b-a-near", "org-a", 90, 100, "active"),
+            _budget("b-a-agent", "org-a", 95, 100, "active", agent_id="agent-a"),
+            _budget("b-b-low", "org-b", 10, 100, "active"),
+            _budget("b-b-over", "org-b", 300, 100, "exceeded", agent_id=None),
+        ]
+    )
+    db.commit()
+
+
+def test_bulk_queries_match_per_org_results():
+    db = SessionLocal()
+    try:
+        _seed(db)
+        svc = BudgetEnforcementService(db)
+
+        violations = svc.get_all_budget_violations()
+        warnings = svc.get_all_budget_warnings(warning_threshold=0.8)
+
+        for org_id in ("org-a", "org-b"):
+            assert sorted(b.id for b in violations.get(org_id, [])) == sorted(
+                b.id for b in svc.get_budget_violations(org_id)
+            )
+            assert sorted(w["budget_id"] for w in warnings.get(org_id, [])) == sorted(
+                w["budget_id"]
+                for w in svc.get_budget_warnings(org_id, warning_threshold=0.8)
+            )
+
+        assert [w["budget_id"] for w in warnings["org-a"]] == ["b-a-near"]
+        assert "org-b" not in warnings
+    finally:
+        db.close()
+
+
+def test_budget_warnings_apply_threshold_in_query():
+    db = SessionLocal()
+    try:
+        _seed(db)
+        svc = BudgetEnforcementService(db)
+
+        assert svc.get_budget_warnings("org-a", warning_threshold=0.95) == []
+        (warning,) = svc.get_budget_warnings(
+            "org-a", warning_threshold=0.95, agent_id="agent-a"
+        )
+        assert warning["budget_id"] == "b-a-agent"
+        assert warning["utilization_percent"] == 95
+        assert warning["remaining_cents"] == 5
+    finally:
+        db.close()
+
+
+def test_reset_budget_period_is_one_update(capture_statements):
+    db = SessionLocal()
+    try:
+        _seed(db)
+        svc = BudgetEnforcementService(db)
+        assert db.get(models.Budget, "b-a-over").status == "exceeded"
+
+        with capture_statements() as statements:
+            budget = svc.reset_budget_period("b-a-over")
+
+        assert len(statements) == 1 and statements[0].startswith("UPDATE budgets")
+        now = datetime.utcnow()
+        assert (budget.current_usage_cents, budget.status) == (0, "active")
+        assert budget.period_start == now.replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+        assert budget.period_end > now
+        assert svc.reset_budget_period("missing") is None
+    finally:
+        db.close()
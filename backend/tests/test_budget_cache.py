@@ -0,0 +1,255 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.db.session import SessionLocal
+from app.db import models
+from app.services.budget.budget_cache import (
+    cache_budgets,
+    clear_budget_cache,
+    get_cached_budgets,
+)
+from app.services.budget.budget_enforcement_service import (
+    BudgetEnforcementService,
+    BudgetExceededException,
+)
+from app.services import budget_service as legacy_budget
+
+
+def _seed(db, mode="hard", usage=0):
+    now = datetime.utcnow()
+    db.add(models.Org(id="org-bc", name="Budget cache"))
+    db.flush()
+    db.add(
+        models.Budget(
+            id="budget-bc",
+            org_id="org-bc",
+            agent_id=None,
+            period="monthly",
+            limit_cents=100,
+            current_usage_cents=usage,
+            period_start=now - timedelta(days=1),
+            period_end=now + timedelta(days=1),
+            enforcement_mode=mode,
+            status="active",
+        )
+    )
+    db.commit()
+
+
+def test_repeat_budget_checks_skip_the_database(capture_statements):
+    clear_budget_cache()
+    db = SessionLocal()
+    try:
+        _seed(db, mode="soft")
+        svc = BudgetEnforcementService(db)
+
+        with capture_statements() as first:
+            svc.check_budget_before_usage("org-bc", 10)
+        with capture_statements() as repeat:
+            svc.check_budget_before_usage("org-bc", 10)
+        assert first and repeat == []
+
+        # Recording usage is a single UPDATE against the cached budget ids
+        with capture_statements() as statements:
+            svc.update_budgets_for_usage("org-bc", 40)
+        assert [s for s in statements if s.startswith("SELECT")] == []
+        assert sum(s.startswith("UPDATE budgets") for s in statements) == 1
+
+        db.expire_all()
+        assert db.get(models.Budget, "budget-bc").current_usage_cents == 40
+    finally:
+        db.close()
+        clear_budget_cache()
+
+
+def test_hard_budget_checks_see_usage_from_other_workers(capture_statements):
+    clear_budget_cache()
+    db = SessionLocal()
+    try:
+        _seed(db)
+        svc = BudgetEnforcementService(db)
+        svc.check_budget_before_usage("org-bc", 10)
+
+        # Cached hard budgets are re-read by primary key only
+        with capture_statements() as statements:
+            svc.check_budget_before_usage("org-bc", 10)
+        assert len(statements) == 1
+        assert "WHERE budgets.id IN" in statements[0]
+
+        # Another worker spends most of the budget behind this cache's back
+        other = SessionLocal()
+        try:
+            other.get(models.Budget, "budget-bc").current_usage_cents = 90
+            other.commit()
+        finally:
+            other.close()
+
+        # Even a small check sees the usage the snapshot missed
+        svc.check_budget_before_usage("org-bc", 10)
+        with pytest.raises(BudgetExceededException):
+            svc.check_budget_before_usage("org-bc", 11)
+    finally:
+        db.close()
+        clear_budget_cache()
+
+
+def test_budget_changes_evict_cached_budgets():
+    clear_budget_cache()
+    db = SessionLocal()
+    try:
+        _seed(db, usage=95)
+        enforcement = BudgetEnforcementService(db)
+        budget_service = legacy_budget.BudgetService(db)
+
+        with pytest.raises(legacy_budget.BudgetExceededException):
+            budget_service.check_budget_before_usage("org-bc", 10)
+
+        enforcement.disable_budget("budget-bc")
+        assert budget_service.check_budget_before_usage("org-bc", 10) is True
+    finally:
+        db.close()
+        clear_budget_cache()
+
+
+def test_agent_and_org_budgets_load_in_one_select(capture_statements):
+    clear_budget_cache()
+    db = SessionLocal()
+    try:
+        _seed(db, mode="soft")
+        db.add(models.Agent(id="agent-bc", org_id="org-bc"))
+        db.flush()
+        now = datetime.utcnow()
+        db.add(
+            models.Budget(
+                id="budget-bc-agent",
+                org_id="org-bc",
+                agent_id="agent-bc",
+                period="monthly",
+                limit_cents=50,
+                current_usage_cents=0,
+                period_start=now - timedelta(days=1),
+                period_end=now + timedelta(days=1),
+                enforcement_mode="soft",
+                status="active",
+            )
+        )
+        db.commit()
+        svc = BudgetEnforcementService(db)
+        svc.check_budget_before_usage("org-bc", 10)
+
+        with capture_statements() as statements:
+            svc.check_budget_before_usage("org-bc", 10, agent_id="agent-bc")
+        assert len(statements) == 1
+
+        updated = svc.update_budgets_for_usage("org-bc", 10, agent_id="agent-bc")
+        assert [budget.id for budget in updated] == ["budget-bc-agent", "budget-bc"]
+    finally:
+        db.close()
+        clear_budget_cache()
+
+
+def test_usage_update_flips_status_in_sql():
+    clear_budget_cache()
+    db = SessionLocal()
+    try:
+        _seed(db, mode="soft", usage=80)
+        svc = BudgetEnforcementService(db)
+        svc.check_budget_before_usage("org-bc", 10)
+
+        # Disabled elsewhere after the snapshot was cached: the UPDATE skips it
+        other = SessionLocal()
+        try:
+            other.get(models.Budget, "budget-bc").status = "disabled"
+            other.commit()
+        finally:
+            other.close()
+        svc.update_budgets_for_usage("org-bc", 30)
+        db.expire_all()
+        assert db.get(models.Budget, "budget-bc").current_usage_cents == 80
+
+        db.get(models.Budget, "budget-bc").status = "active"
+        db.commit()
+        svc.update_budgets_for_usage("org-bc", 30)
+        db.expire_all()
+        budget = db.get(models.Budget, "budget-bc")
+        assert (budget.current_usage_cents, budget.status) == (110, "exceeded")
+    finally:
+        db.close()
+        clear_budget_cache()
+
+
+def test_orgs_without_budgets_skip_lookups_for_every_agent(capture_statements):
+    clear_budget_cache()
+    db = SessionLocal()
+    try:
+        db.add(models.Org(id="org-free", name="No budgets"))
+        db.commit()
+        svc = BudgetEnforcementService(db)
+
+        with capture_statements() as statements:
+            svc.check_budget_before_usage("org-free", 10)
+        assert len(statements) == 1
+        for agent_id in ("agent-1", "agent-2"):
+            with capture_statements() as statements:
+                svc.check_budget_before_usage("org-free", 10, agent_id=agent_id)
+            assert statements == []
+
+        # A new budget is picked up straight away by the worker that made it
+        legacy_budget.BudgetService(db).create_budget(
+            "org-free",
+            legacy_budget.BudgetPeriod.MONTHLY,
+            5,
+            enforcement_mode=legacy_budget.EnforcementMode.HARD,
+        )
+        with pytest.raises(BudgetExceededException):
+            svc.check_budget_before_usage("org-free", 10)
+    finally:
+        db.close()
+        clear_budget_cache()
+
+
+def test_check_then_record_loads_budgets_once(capture_statements):
+    clear_budget_cache()
+    db = SessionLocal()
+    try:
+        _seed(db, mode="soft")
+        svc = legacy_budget.BudgetService(db)
+
+        with capture_statements() as statements:
+            svc.check_budget_before_usage("org-bc", 10)
+            svc.record_usage("org-bc", "invocation", 1, 10)
+        budget_selects = [
+            s for s in statements if s.startswith("SELECT") and "FROM budgets" in s
+        ]
+        # One probe for the org, one load; the update reuses the snapshot
+        assert len(budget_selects) == 2
+        db.expire_all()
+        assert db.get(models.Budget, "budget-bc").current_usage_cents == 10
+    finally:
+        db.close()
+        clear_budget_cache()
+
+
+def test_cache_budgets_accepts_timezone_aware_period_end():
+    # Postgres returns DateTime(timezone=True) columns as aware values
+    clear_budget_cache()
+    now = datetime.utcnow()
+    row = SimpleNamespace(
+        id="budget-aware",
+        org_id="org-aware",
+        agent_id=None,
+        period="monthly",
+        limit_cents=100,
+        current_usage_cents=0,
+        enforcement_mode="hard",
+        status="active",
+        period_end=(now + timedelta(days=1)).replace(tzinfo=timezone.utc),
+    )
+
+    snapshots = cache_budgets("org-aware", [None], [row], now)
+
+    assert [snapshot.id for snapshot in snapshots] == ["budget-aware"]
+    assert [b.id for b in get_cached_budgets("org-aware", [None])] == ["budget-aware"]
+    clear_budget_cache()
@@ -11,3 +11,10 @@ def test_capability_key_normalization():
 def test_normalize_action_passthrough():
     assert normalize_action("custom") == "custom"
 
+
+def test_capability_key_is_memoized():
+    capability_key.cache_clear()
+    capability_key("HTTP", "GET")
+    capability_key("HTTP", "GET")
+    info = capability_key.cache_info()
+    assert (info.hits, info.misses, info.maxsize) == (1, 1, 4096)
@@ -1,4 +1,8 @@
 import json
+import os
+
+import pytest
+
 from app.services.compression.basic_engine import BasicCompressionEngine
 from app.services.compression.dictionary_trainer import ZstdDictionaryTrainer
 
@@ -39,3 +43,73 @@ def test_zstd_dictionary_improves_ratio_when_available():
         # When dictionary is used, compressed len should be <= no-dict payload
         assert len(res_with_dict.data) <= len(res_no_dict.data)
 
+
+def test_format_dictionaries_persist_and_round_trip(tmp_path):
+    pytest.importorskip("zstandard")
+    from app.services.compression.context_manager import (
+        ContextLayer,
+        HierarchicalContextManager,
+    )
+
+    trainer = ZstdDictionaryTrainer(dict_size=1024)
+    adl_samples = [
+        f"A:agent_{i}|R:frontend|C:react:5,typescript:{i % 5 + 1}|T:github,slack".encode()
+        for i in range(200)
+    ]
+    path = tmp_path / "adl.dict"
+    assert trainer.save(trainer.train(adl_samples), path)
+    adl_dict = trainer.load(path)
+    assert trainer.load(tmp_path / "missing.dict") is None
+
+    engine = BasicCompressionEngine(dict_by_format={"adl": adl_dict})
+    payload = "|".join(
+        f"A:agent_{i}|R:frontend|C:react:5,typescript:3|T:github,slack" for i in range(3)
+    )
+    res = engine.compress(payload, fmt="adl")
+    assert res.method == "zstd+msgpack"
+    assert engine.decompress(res) == payload
+    # Formats without a dictionary are left as plain msgpack
+    assert engine.compress(payload, fmt="text").method != "zstd+msgpack"
+
+    mgr = HierarchicalContextManager(engine=engine)
+    mgr.add_item("brief", ContextLayer.GLOBAL, payload, fmt="adl")
+    (entry,) = mgr.assemble()["entries"]
+    assert entry["encoding"] == "zstd+msgpack"
+
+
+def test_large_payloads_use_threaded_compressor():
+    zstd = pytest.importorskip("zstandard")
+    from app.services.compression.basic_engine import ZSTD_THREADED_MIN_BYTES
+
+    engine = BasicCompressionEngine(zstd_compressor=zstd.ZstdCompressor(level=3))
+    small, large = "x" * 100, "y" * (ZSTD_THREADED_MIN_BYTES + 1)
+    results = engine.compress_many([small, large])
+
+    assert [engine.decompress(r) for r in results] == [small, large]
+    # One worker-enabled compressor is built lazily and then reused
+    assert list(engine._threaded_compressors) == [None]
+    engine.compress(large)
+    assert len(engine._threaded_compressors) == 1
+
+
+def test_engine_skips_zstd_when_it_does_not_shrink_payloads():
+    zstd = pytest.importorskip("zstandard")
+    pytest.importorskip("msgpack")
+    from app.services.compression.basic_engine import ZSTD_RATIO_WINDOW
+
+    engine = BasicCompressionEngine(zstd_compressor=zstd.ZstdCompressor(level=3))
+    # Below the size gate nothing is compressed
+    assert engine.compress("tiny").method != "zstd+msgpack"
+
+    # Random bytes never shrink; once the window is full zstd is bypassed
+    noise = [os.urandom(256) for _ in range(ZSTD_RATIO_WINDOW)]
+    results = engine.compress_many(noise)
+    assert all(r.method != "zstd+msgpack" for r in results)
+    assert len(engine._ratios[None]) == ZSTD_RATIO_WINDOW
+
+    # Compressible data after the bypass window is picked up again on a probe
+    text = "routing dependencies " * 20
+    methods = [engine.compress(text).method for _ in range(ZSTD_RATIO_WINDOW)]
+    assert methods[:-1] == [methods[0]] * (ZSTD_RATIO_WINDOW - 1)
+    assert methods[0] != "zstd+msgpack" and methods[-1] == "zstd+msgpack"
+    assert engine.compress(text).method == "zstd+msgpack"
@@ -72,3 +72,30 @@ def test_context_manager_respects_layer_budgets():
     # Ensure none exceeds per-layer budget in sum
     assert sum(e["size"] for e in local_entries) <= 100
 
+
+def test_context_manager_reuses_compression_across_assemblies():
+    from app.services.compression.basic_engine import BasicCompressionEngine
+
+    engine = BasicCompressionEngine()
+    brief = CompressedAgentBrief(agent_id="fs_dev", role="frontend")
+    results = []
+    for _ in range(3):
+        mgr = HierarchicalContextManager(engine=engine, total_budget_bytes=2000)
+        mgr.add_item("agent_brief", ContextLayer.GLOBAL, brief, fmt="adl")
+        mgr.add_item("notes", ContextLayer.LOCAL, {"n": "x"}, fmt="json")
+        results.append(mgr.assemble())
+
+    first, last = results[0]["entries"], results[2]["entries"]
+    assert [e["key"] for e in last] == ["agent_brief", "notes"]
+    # Cache hits hand back the very same compressed bytes
+    assert all(a["data"] is b["data"] for a, b in zip(first, last))
+
+
+def test_engine_compress_many_matches_compress():
+    from app.services.compression.basic_engine import BasicCompressionEngine
+
+    engine = BasicCompressionEngine()
+    objs = ["A:fs_dev|R:frontend", {"n": "x" * 20}, [1, 2, 3]]
+    batch = engine.compress_many(objs)
+    assert [r.data for r in batch] == [engine.compress(o).data for o in objs]
+    assert [engine.decompress(r) for r in batch] == objs
@@ -93,3 +93,69 @@ def test_manifest_verify_endpoint_integration(monkeypatch):
     assert r2.status_code == 200
     assert r2.json()["valid"] is True
 
+
+def test_batch_signing_proofs_cover_each_manifest(monkeypatch):
+    from app.services.manifest_signing import (
+        sign_manifests_batch,
+        verify_manifest_inclusion,
+    )
+
+    monkeypatch.delenv("MANIFEST_PRIVATE_KEY_PEM", raising=False)
+    manifests = [
+        {"agent_id": f"a{i}", "capabilities": ["tool:http:get"]} for i in range(5)
+    ]
+
+    results = sign_manifests_batch(manifests)
+
+    assert len(results) == 5
+    assert len({r["root"] for r in results}) == 1
+    for manifest, result in zip(manifests, results):
+        assert verify_manifest_inclusion(manifest, result["proof"], result["root"])
+    tampered = {**manifests[0], "capabilities": ["tool:fs:write"]}
+    assert not verify_manifest_inclusion(
+        tampered, results[0]["proof"], results[0]["root"]
+    )
+
+
+def test_batch_signing_signs_root_once(monkeypatch):
+    pem = _gen_ec_p256_private_pem()
+    if not pem:
+        return
+    monkeypatch.setenv("MANIFEST_PRIVATE_KEY_PEM", pem)
+    monkeypatch.setenv("MANIFEST_KEY_ID", "batch-key")
+    from app.services.manifest_signing import sign_manifests_batch
+
+    results = sign_manifests_batch([{"agent_id": "a1"}, {"agent_id": "a2"}])
+    if not results[0]["signature"]:
+        return
+    assert results[0]["signature"] == results[1]["signature"]
+
+    jwks = derive_jwks_from_env(
+        {"MANIFEST_PRIVATE_KEY_PEM": pem, "MANIFEST_KEY_ID": "batch-key"}
+    )
+    pub_pem = ec_p256_jwk_to_public_pem(jwks["keys"][0])
+    from jose import jws as _jws
+    from jose.constants import ALGORITHMS as _ALG
+
+    payload_json = _jws.verify(results[0]["signature"], pub_pem, algorithms=[_ALG.ES256])
+    assert results[0]["root"] in payload_json
+
+
+def test_verify_endpoint_rejects_batch_root_signature(monkeypatch):
+    client = TestClient(app)
+    pem = _gen_ec_p256_private_pem()
+    if not pem:
+        return
+    monkeypatch.setenv("MANIFEST_PRIVATE_KEY_PEM", pem)
+    monkeypatch.setenv("MANIFEST_KEY_ID", "batch-key")
+    from app.services.manifest_signing import sign_manifests_batch
+
+    results = sign_manifests_batch([{"agent_id": "a1"}])
+    if not results[0]["signature"]:
+        return
+
+    r = client.post(
+        "/v1/agents/a1/manifests/verify",
+        json={"signature": results[0]["signature"]},
+    )
+    assert r.status_code == 400
@@ -0,0 +1,100 @@
+import hashlib
+import time
+
+import pytest
+
+pytest.importorskip("jose")
+pytest.importorskip("cryptography")
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from jose import jwt as jose_jwt
+
+from app.security import stack_auth
+from app.security.jwks import derive_ec_p256_jwk_from_pem
+
+
+@pytest.fixture
+def signing_key(monkeypatch):
+    priv = ec.generate_private_key(ec.SECP256R1())
+    pem = priv.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode("utf-8")
+    jwk = derive_ec_p256_jwk_from_pem(private_pem=pem, kid="stack-test")
+
+    monkeypatch.setattr(stack_auth, "STACK_PROJECT_ID", "proj-1")
+    monkeypatch.setattr(stack_auth, "STACK_SECRET_SERVER_KEY", "ssk")
+    monkeypatch.setattr(stack_auth, "STACK_AUTH_LOCAL_VERIFY", True)
+    monkeypatch.setattr(stack_auth, "_jwks_cache", {"keys": [jwk]})
+    monkeypatch.setattr(stack_auth, "_jwks_fetched_at", time.monotonic())
+    monkeypatch.setattr(stack_auth, "_claims_cache", {})
+    return pem
+
+
+def _token(pem: str, **overrides) -> str:
+    claims = {
+        "sub": "user-1",
+        "aud": "proj-1",
+        "jti": "jti-1",
+        "exp": int(time.time()) + 300,
+        "selected_team_id": "team-9",
+        **overrides,
+    }
+    return jose_jwt.encode(
+        claims, pem, algorithm="ES256", headers={"kid": "stack-test"}
+    )
+
+
+def test_local_verify_skips_remote_call(signing_key, monkeypatch):
+    def _no_remote(*args, **kwargs):
+        raise AssertionError("remote /users/me should not be called")
+
+    monkeypatch.setattr(stack_auth.requests, "get", _no_remote)
+
+    token = _token(signing_key)
+    profile = stack_auth.verify_stack_access_token(token)
+    assert profile["id"] == "user-1"
+    assert profile["selectedTeamId"] == "team-9"
+    assert list(stack_auth._claims_cache) == [
+        hashlib.sha256(token.encode("utf-8")).hexdigest()
+    ]
+
+
+def test_local_verify_falls_back_on_bad_audience(signing_key, monkeypatch):
+    calls = []
+
+    class _Resp:
+        status_code = 200
+
+        def json(self):
+            return {"id": "remote-user"}
+
+    def _remote(url, headers=None, timeout=None):
+        calls.append(url)
+        return _Resp()
+
+    monkeypatch.setattr(stack_auth.requests, "get", _remote)
+
+    profile = stack_auth.verify_stack_access_token(
+        _token(signing_key, aud="other-project", jti="jti-2")
+    )
+    assert profile["id"] == "remote-user"
+    assert calls and calls[0].endswith("/users/me")
+
+
+def test_forged_token_reusing_cached_jti_is_not_served_from_cache(
+    signing_key, monkeypatch
+):
+    monkeypatch.setattr(stack_auth.requests, "get", None)
+    stack_auth.verify_stack_access_token(_token(signing_key))
+
+    # Same claims, signed with a key that is not in the project JWKS
+    other = ec.generate_private_key(ec.SECP256R1()).private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    forged = _token(other.decode("utf-8"), sub="attacker")
+    assert stack_auth._verify_locally(forged) is None
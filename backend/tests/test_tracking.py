@@ -1,9 +1,19 @@
 import os
 from unittest.mock import patch
 
+import pytest
+
+from app.services.compression import tracking
 from app.services.compression.tracking import tracking_enabled, run, log_metrics
 
 
+@pytest.fixture(autouse=True)
+def _reload_tracking():
+    yield
+    # Tests change the env/MLflow the cached flag was read from
+    tracking.reload()
+
+
 def test_tracking_disabled_by_default(monkeypatch):
     monkeypatch.delenv("COMPRESSION_TRACKING", raising=False)
     assert tracking_enabled() is False
@@ -13,6 +23,7 @@ def test_tracking_noop_without_mlflow(monkeypatch):
     monkeypatch.setenv("COMPRESSION_TRACKING", "1")
     with patch("app.services.compression.tracking.mlflow", None):
         assert tracking_enabled() is False
+        assert tracking.reload() is False
         # Should not raise
         with run("test"):
             log_metrics({"a": 1.0})
@@ -41,9 +52,21 @@ def test_tracking_with_mlflow_mock(monkeypatch):
     monkeypatch.setenv("COMPRESSION_TRACKING", "true")
     with patch("app.services.compression.tracking.mlflow", dummy):
         assert tracking_enabled() is True
+        assert tracking.reload() is True
         with run("r1", tags={"k": "v"}):
             log_metrics({"ratio": 2.0}, tags={"phase": "unit"})
         assert dummy.started is True
         assert dummy.tags.get("k") == "v"
         assert any("ratio" in m for m in dummy.metrics)
 
+
+def test_tracking_flag_is_cached_until_reload(monkeypatch):
+    monkeypatch.setenv("COMPRESSION_TRACKING", "1")
+    with patch("app.services.compression.tracking.mlflow", object()):
+        assert tracking.reload() is True
+    monkeypatch.delenv("COMPRESSION_TRACKING")
+    assert tracking._TRACKING_ENABLED is True
+    assert tracking.reload() is False
+    # Disabled: no MLflow calls are attempted
+    with run("noop"):
+        log_metrics({"a": 1.0})
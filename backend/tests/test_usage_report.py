@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+
+from app.db.session import SessionLocal
+from app.db import models
+from app.services.usage_orchestrator import UsageOrchestrator
+
+
+def _record(record_id, org_id, usage_type, quantity, cost, recorded_at, agent_id=None):
+    return models.UsageRecord(
+        id=record_id,
+        org_id=org_id,
+        agent_id=agent_id,
+        usage_type=usage_type,
+        quantity=quantity,
+        cost_cents=cost,
+        recorded_at=recorded_at,
+        billing_period=recorded_at.strftime("%Y-%m"),
+    )
+
+
+def test_usage_report_aggregates_in_sql():
+    db = SessionLocal()
+    try:
+        start = datetime(2025, 3, 1)
+        end = datetime(2025, 4, 1)
+        db.add_all(
+            [
+                models.Org(id="org-rep", name="Report"),
+                models.Org(id="org-other", name="Other"),
+                models.Agent(id="agent-rep", org_id="org-rep", display_name="Rep"),
+            ]
+        )
+        db.flush()
+        day1, day2 = start + timedelta(days=1), start + timedelta(days=2)
+        after = end + timedelta(days=1)
+        db.add_all(
+            [
+                _record("u1", "org-rep", "invocation", 1, 5, day1, "agent-rep"),
+                _record("u2", "org-rep", "invocation", 1, 5, day2, "agent-rep"),
+                _record("u3", "org-rep", "input_tokens", 1000, 3, day2, "agent-rep"),
+                _record("u4", "org-rep", "storage", 10, 7, day2),
+                _record("u5", "org-rep", "invocation", 1, 5, after, "agent-rep"),
+                _record("u6", "org-other", "invocation", 1, 5, day1),
+            ]
+        )
+        db.commit()
+
+        report = UsageOrchestrator(db, payment_provider=object()).generate_usage_report(
+            "org-rep", start, end
+        )
+
+        summary = report["summary"]
+        assert summary["record_count"] == 4
+        assert summary["total_cost_cents"] == 20
+        assert summary["usage_by_type"]["invocation"] == {
+            "quantity": 2,
+            "cost_cents": 10,
+            "count": 2,
+        }
+
+        agent = report["agent_usage"]["agent-rep"]
+        assert agent["agent_name"] == "Rep"
+        assert agent["record_count"] == 3
+        assert agent["total_cost_cents"] == 13
+        assert set(report["agent_usage"]) == {"agent-rep"}
+
+        from app.services.budget_service import BudgetService
+
+        for service in (
+            UsageOrchestrator(db, payment_provider=object()),
+            BudgetService(db),
+        ):
+            assert service.get_usage_summary("org-rep", None, start, end) == summary
+            agent_summary = service.get_usage_summary(
+                "org-rep", "agent-rep", start, end
+            )
+            assert agent_summary["usage_by_type"] == agent["usage_by_type"]
+    finally:
+        db.close()
+
+
+def test_invocation_usage_is_one_insert_and_one_commit(capture_statements):
+    import asyncio
+
+    from sqlalchemy import event
+
+    from app.services.budget.budget_cache import clear_budget_cache
+    from app.services.payment.providers.mock_provider import MockProvider
+
+    clear_budget_cache()
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        db.add(models.Org(id="org-inv", name="Invoke"))
+        db.flush()
+        db.add_all(
+            [
+                models.Agent(id="agent-inv", org_id="org-inv", display_name="Inv"),
+                models.Budget(
+                    id="budget-inv",
+                    org_id="org-inv",
+                    period="monthly",
+                    limit_cents=1000,
+                    current_usage_cents=0,
+                    period_start=now - timedelta(days=1),
+                    period_end=now + timedelta(days=1),
+                    enforcement_mode="soft",
+                    status="active",
+                ),
+            ]
+        )
+        db.commit()
+        orchestrator = UsageOrchestrator(db, MockProvider())
+        commits = []
+        event.listen(db, "after_commit", lambda session: commits.append(session))
+
+        async def _invoke():
+            return await orchestrator.record_agent_invocation(
+                "org-inv", "agent-inv", None, input_tokens=1000, output_tokens=500
+            )
+
+        with capture_statements() as statements:
+            records = asyncio.run(_invoke())
+
+        assert [r.usage_type for r in records] == [
+            "invocation",
+            "input_tokens",
+            "output_tokens",
+        ]
+        assert sum(s.startswith("INSERT INTO usage_records") for s in statements) == 1
+        assert len(commits) == 1
+        assert db.query(models.UsageRecord).count() == 3
+        assert db.get(models.Budget, "budget-inv").current_usage_cents == sum(
+            r.cost_cents for r in records
+        )
+    finally:
+        db.close()
+        clear_budget_cache()
@@ -21,3 +21,13 @@ def test_vector_retriever_filter_and_topk():
     assert len(res) <= 5
     assert all(m.get("mod") == 1 for (_, _, m) in res)
 
+
+def test_vector_retriever_bulk_add_matches_single_adds():
+    texts = ["FastAPI routing async dependencies", "React TypeScript frontend components", ""]
+    single = VectorRetriever(n_features=128, use_faiss=False)
+    for i, text in enumerate(texts):
+        single.add_item(f"k{i}", text, {"i": i})
+    bulk = VectorRetriever(n_features=128, use_faiss=False)
+    bulk.add_items([f"k{i}" for i in range(3)], texts, [{"i": i} for i in range(3)])
+
+    assert single.query("frontend react", top_k=3) == bulk.query("frontend react", top_k=3)
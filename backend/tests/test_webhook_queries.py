@@ -0,0 +1,571 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from app.db.session import SessionLocal
+from app.db import models
+from app.services.billing.webhook_service import WebhookService
+from app.services.payment.protocol import WebhookEvent
+from app.services.payment.providers.mock_provider import MockProvider
+
+
+def _seed(db):
+    db.add(models.Org(id="org-wh", name="Webhook"))
+    db.flush()
+    db.add(
+        models.BillingCustomer(
+            id="cust-wh",
+            org_id="org-wh",
+            provider="mock",
+            external_customer_id="cus_ext",
+            email="billing@example.com",
+        )
+    )
+    db.flush()
+    db.add(
+        models.BillingSubscription(
+            id="sub-wh",
+            customer_id="cust-wh",
+            external_subscription_id="sub_ext",
+            plan_id="price_1",
+            status="trialing",
+        )
+    )
+    db.commit()
+
+
+def test_subscription_webhook_resolves_records_in_one_select(capture_statements):
+    db = SessionLocal()
+    try:
+        _seed(db)
+        service = WebhookService(db, MockProvider())
+        webhook = WebhookEvent(
+            id="evt_1",
+            type="customer.subscription.updated",
+            data={
+                "object": {
+                    "id": "sub_ext",
+                    "customer": "cus_ext",
+                    "status": "active",
+                    "current_period_start": 1700000000,
+                    "current_period_end": 1702592000,
+                }
+            },
+            created=1700000000,
+            provider="mock",
+        )
+
+        with capture_statements() as statements:
+            assert asyncio.run(service.process_verified_event(webhook)) is True
+
+        # One joined lookup, and no reloads between intermediate commits
+        selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+        assert len(selects) == 1
+        assert "JOIN billing_subscriptions" in selects[0]
+        assert "billing_customers.metadata" not in selects[0]
+        db.expire_all()
+        assert db.get(models.BillingSubscription, "sub-wh").status == "active"
+        logged = db.query(models.BillingEvent).one()
+        assert logged.org_id == "org-wh"
+    finally:
+        db.close()
+
+
+def test_failed_handler_keeps_event_log_only():
+    db = SessionLocal()
+    try:
+        _seed(db)
+        service = WebhookService(db, MockProvider())
+        webhook = WebhookEvent(
+            id="evt_2",
+            type="customer.subscription.updated",
+            data={
+                "object": {
+                    "id": "sub_ext",
+                    "customer": "cus_unknown",
+                    "metadata": {"org_id": "org-wh"},
+                }
+            },
+            created=1700000000,
+            provider="mock",
+        )
+
+        assert asyncio.run(service.process_verified_event(webhook)) is False
+
+        assert db.query(models.BillingEvent).count() == 1
+        assert db.get(models.BillingSubscription, "sub-wh").status == "trialing"
+    finally:
+        db.close()
+
+
+def test_repeat_external_id_lookup_loads_by_primary_key(capture_statements):
+    from app.services.billing.customer_service import CustomerService
+
+    db = SessionLocal()
+    try:
+        _seed(db)
+        first = asyncio.run(
+            CustomerService(db, MockProvider()).get_customer_by_external_id("cus_ext")
+        )
+        assert first.id == "cust-wh"
+    finally:
+        db.close()
+
+    db = SessionLocal()
+    try:
+        with capture_statements() as selects:
+            again = asyncio.run(
+                CustomerService(db, MockProvider()).get_customer_by_external_id(
+                    "cus_ext"
+                )
+            )
+    finally:
+        db.close()
+
+    assert again.id == "cust-wh"
+    assert len(selects) == 1
+    assert "WHERE billing_customers.id = ?" in selects[0]
+
+
+class _Background:
+    def __init__(self):
+        self.tasks = []
+
+    def add_task(self, func, *args, **kwargs):
+        self.tasks.append((func, args, kwargs))
+
+
+def test_background_tasks_defer_event_log():
+    db = SessionLocal()
+    try:
+        _seed(db)
+        service = WebhookService(db, MockProvider())
+        webhook = WebhookEvent(
+            id="evt_3",
+            type="customer.subscription.deleted",
+            data={"object": {"id": "sub_ext", "customer": "cus_ext"}},
+            created=1700000000,
+            provider="mock",
+        )
+        background = _Background()
+
+        assert asyncio.run(service.process_verified_event(webhook, background)) is True
+        assert db.query(models.BillingEvent).count() == 0
+        assert db.get(models.BillingSubscription, "sub-wh").status == "canceled"
+
+        for func, args, kwargs in background.tasks:
+            asyncio.run(func(*args, **kwargs))
+
+        logged = db.query(models.BillingEvent).one()
+        assert logged.org_id == "org-wh"
+    finally:
+        db.close()
+
+
+def test_billing_event_writer_batches_queued_rows(capture_statements):
+    from app.services.billing import webhook_service
+
+    db = SessionLocal()
+    try:
+        _seed(db)
+    finally:
+        db.close()
+
+    async def _run():
+        webhook_service.start_billing_event_writer()
+        service = WebhookService(None, MockProvider())
+        for i in range(5):
+            webhook = WebhookEvent(
+                id=f"evt_batch_{i}",
+                type="invoice.created",
+                data={"object": {"id": f"in_{i}", "amount_due": 100}},
+                created=1700000000,
+                provider="mock",
+            )
+            await service._log_billing_event_detached(webhook, "org-wh")
+        await webhook_service.stop_billing_event_writer()
+
+    with capture_statements() as statements:
+        asyncio.run(_run())
+
+    db = SessionLocal()
+    try:
+        assert db.query(models.BillingEvent).count() == 5
+        assert db.query(models.BillingEvent).first().amount_cents == 100
+    finally:
+        db.close()
+    assert sum(s.startswith("INSERT INTO billing_events") for s in statements) == 1
+
+
+def test_subscription_for_org_is_one_joined_select(capture_statements):
+    from app.services.billing.subscription_service import SubscriptionService
+
+    db = SessionLocal()
+    try:
+        _seed(db)
+        db.expire_all()
+        with capture_statements() as selects:
+            subscription = asyncio.run(
+                SubscriptionService(db, MockProvider()).get_subscription_for_org(
+                    "org-wh"
+                )
+            )
+    finally:
+        db.close()
+
+    assert subscription.id == "sub-wh"
+    assert len(selects) == 1
+    assert "JOIN billing_customers" in selects[0]
+
+
+def test_get_or_create_customer_loads_org_and_customer_together(capture_statements):
+    from app.services.billing.customer_service import CustomerService
+
+    db = SessionLocal()
+    try:
+        db.add(models.Org(id="org-new", name="New Org"))
+        db.commit()
+        db.expire_all()
+        with capture_statements() as statements:
+            customer = asyncio.run(
+                CustomerService(db, MockProvider()).get_or_create_customer_for_org(
+                    "org-new"
+                )
+            )
+    finally:
+        db.close()
+
+    assert customer.email == "billing@neworg.com"
+    # Org and customer come from one query before the new customer is inserted
+    assert "LEFT OUTER JOIN billing_customers" in statements[0]
+    assert statements[1].startswith("INSERT INTO billing_customers")
+
+
+def test_subscription_metadata_updates_are_persisted():
+    from app.services.billing.subscription_service import SubscriptionService
+
+    db = SessionLocal()
+    try:
+        _seed(db)
+        service = SubscriptionService(db, MockProvider())
+        asyncio.run(
+            service.update_subscription_status(
+                "sub_ext", "active", metadata={"metered_item_id": "si_1"}
+            )
+        )
+        subscription = db.get(models.BillingSubscription, "sub-wh")
+        subscription.metadata_json["note"] = "in place"
+        db.commit()
+        db.expire_all()
+
+        stored = db.get(models.BillingSubscription, "sub-wh").metadata_json
+        assert stored == {"metered_item_id": "si_1", "note": "in place"}
+    finally:
+        db.close()
+
+
+def test_redelivered_subscription_payload_skips_update(capture_statements):
+    from app.services.billing.subscription_service import SubscriptionService
+
+    db = SessionLocal()
+    payload = {"id": "sub_ext", "status": "active", "current_period_end": 1702592000}
+    try:
+        _seed(db)
+        service = SubscriptionService(db, MockProvider())
+        with capture_statements() as statements:
+            for _ in range(2):
+                asyncio.run(service.create_or_update_subscription("cust-wh", payload))
+    finally:
+        db.close()
+
+    assert sum(s.startswith("UPDATE billing_subscriptions") for s in statements) == 1
+
+
+def test_legacy_subscription_for_org_is_one_joined_select(capture_statements):
+    from app.services.billing_service import BillingService
+
+    db = SessionLocal()
+    try:
+        _seed(db)
+        db.expire_all()
+        with capture_statements() as selects:
+            subscription = asyncio.run(
+                BillingService(db, MockProvider()).get_subscription_for_org("org-wh")
+            )
+    finally:
+        db.close()
+
+    assert subscription.id == "sub-wh"
+    assert len(selects) == 1
+    assert "JOIN billing_customers" in selects[0]
+
+
+def test_legacy_webhook_redelivery_is_skipped():
+    import json
+
+    from app.services.billing_service import BillingService
+
+    db = SessionLocal()
+    try:
+        _seed(db)
+        service = BillingService(db, MockProvider())
+        payload = json.dumps(
+            {
+                "id": "evt_legacy",
+                "type": "customer.subscription.deleted",
+                "data": {
+                    "object": {
+                        "id": "sub_ext",
+                        "customer": "cus_ext",
+                        "metadata": {"org_id": "org-wh"},
+                    }
+                },
+            }
+        ).encode()
+
+        commits = []
+        event.listen(db, "after_commit", lambda session: commits.append(session))
+        assert asyncio.run(service.handle_webhook_event(payload, "sig")) is True
+        subscription = db.get(models.BillingSubscription, "sub-wh")
+        assert subscription.status == "canceled"
+        # Audit row and subscription change share one transaction
+        assert len(commits) == 1
+
+        subscription.status = "active"
+        db.commit()
+        assert asyncio.run(service.handle_webhook_event(payload, "sig")) is True
+
+        db.expire_all()
+        assert db.get(models.BillingSubscription, "sub-wh").status == "active"
+        assert db.query(models.BillingEvent).count() == 1
+    finally:
+        db.close()
+
+
+def test_create_customer_commits_once():
+    from app.services.billing.customer_service import CustomerService
+
+    db = SessionLocal()
+    commits = []
+    try:
+        db.add(models.Org(id="org-once", name="Once"))
+        db.commit()
+        event.listen(db, "after_commit", lambda session: commits.append(session))
+        customer = asyncio.run(
+            CustomerService(db, MockProvider()).create_customer_for_org(
+                "org-once", "billing@once.example.com"
+            )
+        )
+        assert customer.org_id == "org-once"
+    finally:
+        db.close()
+
+    assert len(commits) == 1
+
+
+def test_legacy_subscription_webhook_updates_through_service():
+    import json
+
+    from app.services.billing_service import BillingService
+
+    db = SessionLocal()
+    try:
+        _seed(db)
+        payload = json.dumps(
+            {
+                "id": "evt_legacy_update",
+                "type": "customer.subscription.updated",
+                "data": {
+                    "object": {
+                        "id": "sub_ext",
+                        "customer": "cus_ext",
+                        "status": "past_due",
+                        "current_period_end": 1702592000,
+                        "metadata": {"org_id": "org-wh"},
+                    }
+                },
+            }
+        ).encode()
+
+        service = BillingService(db, MockProvider())
+        assert asyncio.run(service.handle_webhook_event(payload, "sig")) is True
+
+        db.expire_all()
+        subscription = db.get(models.BillingSubscription, "sub-wh")
+        assert subscription.status == "past_due"
+        assert subscription.payload_hash is not None
+    finally:
+        db.close()
+
+
+def test_record_usage_reuses_metered_item_until_subscription_changes(
+    capture_statements,
+):
+    from app.services.billing_service import BillingService, _evict_usage_item
+
+    db = SessionLocal()
+    try:
+        _seed(db)
+        subscription = db.get(models.BillingSubscription, "sub-wh")
+        subscription.metadata_json = {"metered_item_id": "si_1"}
+        db.commit()
+        _evict_usage_item("org-wh")
+
+        service = BillingService(db, MockProvider())
+        with capture_statements() as statements:
+            for _ in range(3):
+                assert asyncio.run(service.record_usage("org-wh", 1)) is True
+        assert sum(s.lstrip().upper().startswith("SELECT") for s in statements) == 1
+
+        asyncio.run(
+            service._cancel_subscription(
+                db.get(models.BillingCustomer, "cust-wh"), {"id": "sub_ext"}
+            )
+        )
+        db.commit()
+        assert asyncio.run(service.record_usage("org-wh", 1)) is False
+    finally:
+        _evict_usage_item("org-wh")
+        db.close()
+
+
+def test_billing_status_loads_customer_and_subscription_together(
+    capture_statements,
+):
+    from app.services.billing_orchestrator import BillingOrchestrator
+
+    db = SessionLocal()
+    try:
+        _seed(db)
+        db.expire_all()
+        orchestrator = BillingOrchestrator(db, MockProvider())
+        with capture_statements() as selects:
+            status = asyncio.run(orchestrator.get_organization_billing_status("org-wh"))
+    finally:
+        db.close()
+
+    assert status["customer"]["id"] == "cust-wh"
+    assert status["subscription"]["id"] == "sub-wh"
+    assert len(selects) == 1
+
+
+def test_unknown_customer_lookup_is_negatively_cached(capture_statements):
+    from app.services.billing import customer_service
+    from app.services.billing.customer_service import CustomerService
+
+    db = SessionLocal()
+    try:
+        service = CustomerService(db, MockProvider())
+        with capture_statements() as selects:
+            for _ in range(3):
+                found = asyncio.run(service.get_customer_by_external_id("cus_gone"))
+                assert found is None
+    finally:
+        customer_service._evict_customer_id(("mock", "cus_gone"))
+        db.close()
+
+    assert len(selects) == 1
+
+
+def test_signup_checkout_records_customer_on_completion():
+    from app.services.billing_orchestrator import BillingOrchestrator
+
+    db = SessionLocal()
+    try:
+        db.add(models.Org(id="org-signup", name="Signup"))
+        db.commit()
+        provider = MockProvider()
+        orchestrator = BillingOrchestrator(db, provider)
+
+        session = asyncio.run(
+            orchestrator.signup_and_checkout(
+                "org-signup", "owner@signup.example.com", "price_1", "/ok", "/no"
+            )
+        )
+        assert db.query(models.BillingCustomer).count() == 0
+
+        webhook = WebhookEvent(
+            id="evt_checkout",
+            type="checkout.session.completed",
+            data={
+                "object": {
+                    "id": session.id,
+                    "customer": session.customer_id,
+                    "customer_details": {"email": "owner@signup.example.com"},
+                    "metadata": session.metadata,
+                }
+            },
+            created=1700000000,
+            provider="mock",
+        )
+        service = orchestrator.webhook_service
+        assert asyncio.run(service.process_verified_event(webhook)) is True
+
+        customer = db.query(models.BillingCustomer).one()
+        assert customer.org_id == "org-signup"
+        assert customer.external_customer_id == session.customer_id
+    finally:
+        db.close()
+
+
+def test_postgres_subscription_webhook_upserts_on_conflict(monkeypatch):
+    from app.services.billing.subscription_service import SubscriptionService
+
+    db = SessionLocal()
+    upserts = []
+    try:
+        _seed(db)
+        monkeypatch.setattr(
+            SubscriptionService, "_supports_on_conflict", lambda s: True
+        )
+
+        def _upsert_returning(self, customer_id, subscription_data):
+            upserts.append((customer_id, subscription_data["id"]))
+            return db.get(models.BillingSubscription, "sub-wh")
+
+        monkeypatch.setattr(SubscriptionService, "_upsert_returning", _upsert_returning)
+        service = WebhookService(db, MockProvider())
+        webhook = WebhookEvent(
+            id="evt_pg",
+            type="customer.subscription.created",
+            data={"object": {"id": "sub_ext", "customer": "cus_ext"}},
+            created=1700000000,
+            provider="mock",
+        )
+
+        assert asyncio.run(service.process_verified_event(webhook)) is True
+    finally:
+        db.close()
+
+    assert upserts == [("cust-wh", "sub_ext")]
+
+
+def test_permanently_failed_payload_is_kept_without_expiry(monkeypatch):
+    pytest.importorskip("celery")
+    from app.services.billing import async_webhook_service as aws
+
+    class _Pipeline:
+        def __init__(self, store):
+            self.store, self.ops = store, []
+
+        def rename(self, src, dst):
+            self.ops.append(lambda: self.store.__setitem__(dst, self.store.pop(src)))
+
+        def persist(self, key):
+            self.ops.append(lambda: self.store[key].update(ttl=None))
+
+        def execute(self):
+            for op in self.ops:
+                op()
+
+    store = {"wh:abc": {"value": b"{}", "ttl": 3600}}
+    monkeypatch.setattr(
+        aws, "get_redis", lambda: SimpleNamespace(pipeline=lambda: _Pipeline(store))
+    )
+
+    dead_key = aws._dead_letter_webhook_payload("wh:abc")
+
+    assert dead_key == "wh:dead:abc"
+    assert store == {"wh:dead:abc": {"value": b"{}", "ttl": None}}